@@ -0,0 +1,55 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import transaction
+
+User = get_user_model()
+
+PROFILE_CACHE_TIMEOUT = 60 * 15
+
+PROFILE_FIELDS = (
+    'id', 'username', 'email', 'first_name', 'last_name', 'avatar', 'bio', 'preferences', 'timezone',
+)
+
+
+def profile_cache_key(user_id):
+    return f'profile:{user_id}'
+
+
+def invalidate_profile_cache(user_id):
+    """
+    Drop the cached profile once the current transaction commits, so a read
+    racing the write cannot cache the old row again after the delete.
+    """
+    key = profile_cache_key(user_id)
+    transaction.on_commit(lambda: cache.delete(key))
+
+
+def get_profile_data(user_id, fields=None, context=None):
+    """
+    Return the serialized profile for ``user_id``, limited to ``fields``.
+
+    The cache holds the full row, serialized without a request so the
+    avatar is stored as its media URL; it is made absolute with the current
+    request on the way out. A miss loads and caches the full row, so a
+    sparse read (e.g. ``username`` and ``avatar``) is answered from the cache
+    after the first one.
+    """
+    from accounts.serializers import UserProfileSerializer
+
+    fields = list(fields or PROFILE_FIELDS)
+    context = dict(context or {})
+    request = context.pop('request', None)
+    key = profile_cache_key(user_id)
+    data = cache.get(key)
+
+    if data is None:
+        user = User.objects.select_related('profile').get(pk=user_id)
+        loaded = UserProfileSerializer(user, context=context).data
+        # Fields skipped by the serializer (no profile row) are cached as None.
+        data = {field: loaded.get(field) for field in PROFILE_FIELDS}
+        cache.set(key, data, PROFILE_CACHE_TIMEOUT)
+
+    data = {field: data[field] for field in fields}
+    if data.get('avatar') and request is not None:
+        data['avatar'] = request.build_absolute_uri(data['avatar'])
+    return data
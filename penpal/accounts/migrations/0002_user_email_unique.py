@@ -0,0 +1,47 @@
+from django.conf import settings
+from django.db import migrations
+from django.db.models import Count
+from django.db.models.functions import Lower
+
+
+def check_duplicate_emails(apps, schema_editor):
+    """
+    Abort before the index is built if existing accounts share an email
+    differing only in case; they must be merged or changed by hand.
+    """
+    User = apps.get_model(settings.AUTH_USER_MODEL)
+    duplicates = list(
+        User.objects.using(schema_editor.connection.alias).exclude(email='')
+        .annotate(normalized=Lower('email')).values('normalized')
+        .annotate(count=Count('pk')).filter(count__gt=1)
+        .order_by('normalized').values_list('normalized', flat=True)
+    )
+    if duplicates:
+        shown = ', '.join(duplicates[:20]) + (f' (and {len(duplicates) - 20} more)' if len(duplicates) > 20 else '')
+        raise RuntimeError(
+            f"Cannot enforce unique emails: {len(duplicates)} addresses are used by more than one "
+            f"account ignoring case: {shown}. Resolve them, then run migrate again."
+        )
+
+
+class Migration(migrations.Migration):
+    """
+    Enforce case-insensitive email uniqueness on the default User table.
+
+    Registration relies on this index instead of an ``exists()`` pre-check.
+    Blank emails (allowed by the stock User model) are excluded.
+    """
+
+    dependencies = [
+        ('accounts', '0001_initial'),
+        ('auth', '0012_alter_user_first_name_max_length'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(check_duplicate_emails, migrations.RunPython.noop),
+        migrations.RunSQL(
+            sql="CREATE UNIQUE INDEX auth_user_email_uniq ON auth_user (LOWER(email)) WHERE email <> ''",
+            reverse_sql="DROP INDEX auth_user_email_uniq",
+        ),
+    ]
@@ -1,8 +1,8 @@
 from django.contrib.auth import get_user_model
 from django.db import models
-from django.db.models.signals import post_save
+from django.db.models.signals import post_delete, post_save
 
-from accounts.signals import post_save_user_profile
+from accounts.signals import invalidate_user_profile_cache, post_save_user_profile
 
 User = get_user_model()
 
@@ -21,3 +21,6 @@ class Profile(models.Model):
 
 
 post_save.connect(post_save_user_profile, sender=User)
+post_save.connect(invalidate_user_profile_cache, sender=User)
+post_save.connect(invalidate_user_profile_cache, sender=Profile)
+post_delete.connect(invalidate_user_profile_cache, sender=Profile)
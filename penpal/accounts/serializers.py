@@ -1,8 +1,20 @@
 from rest_framework import serializers
 from django.contrib.auth.models import User
+from django.contrib.auth.validators import UnicodeUsernameValidator
+from django.db import IntegrityError, transaction
 from django.contrib.auth.password_validation import validate_password
 from django.contrib.auth import authenticate
+from accounts.cache import invalidate_profile_cache
 from accounts.models import Profile
+from document.models import UserDocumentStats
+from document.stats import STATUS_FIELDS, TYPE_FIELDS
+
+
+def unique_violation_error(exc):
+    """Map a unique-index IntegrityError on auth_user to a field error."""
+    if 'email' in str(exc):
+        return serializers.ValidationError({"email": "A user with this email already exists."})
+    return serializers.ValidationError({"username": "A user with that username already exists."})
 
 
 class UserLoginSerializer(serializers.Serializer):
@@ -53,6 +65,9 @@ class UserRegistrationSerializer(serializers.ModelSerializer):
         extra_kwargs = {
             'first_name': {'required': False},
             'last_name': {'required': False},
+            'email': {'required': True, 'allow_blank': False},
+            # Uniqueness is enforced by the database; skip the UniqueValidator query.
+            'username': {'validators': [UnicodeUsernameValidator()]},
         }
 
     def validate(self, attrs):
@@ -61,19 +76,25 @@ class UserRegistrationSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError(
                 {"password": "Password fields didn't match."}
             )
-        if User.objects.filter(email=attrs['email']).exists():
-            raise serializers.ValidationError(
-                {"email": "A user with this email already exists."}
-            )
         return attrs
 
     def create(self, validated_data):
-        """Create and return a new user"""
+        """
+        Create the user with a pre-hashed password in a single INSERT.
+
+        The profile is created by the post_save signal inside the same
+        transaction, and duplicate usernames/emails surface as IntegrityError
+        from the unique indexes rather than from pre-check queries.
+        """
         validated_data.pop('password2')
         password = validated_data.pop('password')
-        user = User.objects.create(**validated_data)
+        user = User(**validated_data)
         user.set_password(password)
-        user.save()
+        try:
+            with transaction.atomic():
+                user.save(force_insert=True)
+        except IntegrityError as e:
+            raise unique_violation_error(e)
         return user
 
 
@@ -92,6 +113,13 @@ class UserProfileSerializer(serializers.ModelSerializer):
         )
         read_only_fields = ('id', 'username',)
 
+    def __init__(self, *args, fields=None, **kwargs):
+        """Accept an optional ``fields`` list to serialize a sparse subset."""
+        super().__init__(*args, **kwargs)
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+
     def update(self, instance, validated_data):
         """
         Optimize DB operations by updating the related Profile in a single save.
@@ -119,9 +147,34 @@ class UserProfileSerializer(serializers.ModelSerializer):
 
         # Save only if changed
         if user_updated:
-            instance.save(update_fields=list(validated_data.keys()))
+            try:
+                with transaction.atomic():
+                    instance.save(update_fields=list(validated_data.keys()))
+            except IntegrityError as e:
+                raise unique_violation_error(e)
         if profile_updated:
             profile.save(update_fields=list(profile_data.keys()))
+        if user_updated or profile_updated:
+            invalidate_profile_cache(instance.pk)
 
         return instance
 
+
+class UserDocumentStatsSerializer(serializers.ModelSerializer):
+    """Dashboard totals for the current user, read from one precomputed row"""
+    by_status = serializers.SerializerMethodField()
+    by_type = serializers.SerializerMethodField()
+    comments = serializers.SerializerMethodField()
+
+    class Meta:
+        model = UserDocumentStats
+        fields = ('documents', 'by_status', 'by_type', 'word_count', 'comments', 'updated_at')
+
+    def get_by_status(self, obj):
+        return {value: getattr(obj, field) for value, field in STATUS_FIELDS.items()}
+
+    def get_by_type(self, obj):
+        return {value: getattr(obj, field) for value, field in TYPE_FIELDS.items()}
+
+    def get_comments(self, obj):
+        return {'received': obj.comments_received, 'written': obj.comments_written}
@@ -3,4 +3,12 @@ def post_save_user_profile(sender, instance, created, **kwargs):
     from accounts.models import Profile
 
     if created:
-        Profile.objects.create(user=instance)
\ No newline at end of file
+        Profile.objects.create(user=instance)
+
+
+def invalidate_user_profile_cache(sender, instance, **kwargs):
+    from accounts.cache import invalidate_profile_cache
+    from accounts.models import Profile
+
+    user_id = instance.user_id if isinstance(instance, Profile) else instance.pk
+    invalidate_profile_cache(user_id)
@@ -1,3 +1,90 @@
-from django.test import TestCase
+from importlib import import_module
+from types import SimpleNamespace
 
-# Create your tests here.
+from django.apps import apps
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import IntegrityError, connection, transaction
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from accounts.cache import PROFILE_FIELDS, get_profile_data, profile_cache_key
+
+
+email_migration = import_module('accounts.migrations.0002_user_email_unique')
+
+
+class EmailUniquenessTests(TestCase):
+    # The check only reads the connection alias from the schema editor.
+    schema_editor = SimpleNamespace(connection=connection)
+
+    def test_index_rejects_case_variant_duplicates(self):
+        User.objects.create_user('alice', email='Alice@example.com')
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            User.objects.create_user('alice2', email='alice@EXAMPLE.com')
+
+    def test_blank_emails_are_not_unique(self):
+        User.objects.create_user('a', email='')
+        User.objects.create_user('b', email='')
+
+    def test_migration_aborts_on_existing_duplicates(self):
+        with connection.cursor() as cursor:
+            cursor.execute('DROP INDEX auth_user_email_uniq')
+        User.objects.create_user('bob', email='Bob@example.com')
+        User.objects.create_user('bob2', email='bob@example.com')
+        with self.assertRaisesMessage(RuntimeError, 'bob@example.com'):
+            email_migration.check_duplicate_emails(apps, self.schema_editor)
+
+    def test_migration_passes_without_duplicates(self):
+        User.objects.create_user('carol', email='carol@example.com')
+        email_migration.check_duplicate_emails(apps, self.schema_editor)
+
+
+@override_settings(ALLOWED_HOSTS=['a.example', 'b.example', 'testserver'])
+class ProfileCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('dana', email='dana@example.com')
+        self.user.profile.avatar = 'avatars/dana.png'
+        self.user.profile.bio = 'First'
+        self.user.profile.save()
+        self.url = reverse('profile')
+        self.client.force_login(self.user)
+
+    def test_sparse_read_caches_the_full_row(self):
+        response = self.client.get(self.url, {'fields': 'username,bio'})
+        self.assertEqual(response.json(), {'username': 'dana', 'bio': 'First'})
+        self.assertEqual(set(cache.get(profile_cache_key(self.user.pk))), set(PROFILE_FIELDS))
+        with self.assertNumQueries(0):
+            data = get_profile_data(self.user.pk)
+        self.assertEqual(data['email'], 'dana@example.com')
+        self.assertIsNone(data['preferences'])
+
+    def test_avatar_is_cached_relative_and_served_for_the_requesting_host(self):
+        first = self.client.get(self.url, {'fields': 'avatar'}, HTTP_HOST='a.example')
+        self.assertEqual(first.json()['avatar'], 'http://a.example/media/avatars/dana.png')
+        self.assertEqual(cache.get(profile_cache_key(self.user.pk))['avatar'], '/media/avatars/dana.png')
+        second = self.client.get(self.url, {'fields': 'avatar'}, HTTP_HOST='b.example')
+        self.assertEqual(second.json()['avatar'], 'http://b.example/media/avatars/dana.png')
+
+    def test_invalidation_waits_for_the_commit(self):
+        get_profile_data(self.user.pk)
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.user.profile.bio = 'Second'
+            self.user.profile.save()
+            # Until the commit, reads are still served the cached row...
+            self.assertEqual(get_profile_data(self.user.pk, ['bio']), {'bio': 'First'})
+        self.assertIsNotNone(cache.get(profile_cache_key(self.user.pk)))
+        # ...which the delete on commit then drops.
+        for callback in callbacks:
+            callback()
+        self.assertEqual(get_profile_data(self.user.pk, ['bio']), {'bio': 'Second'})
+
+    def test_update_is_visible_to_the_next_read(self):
+        self.client.get(self.url)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.patch(self.url, {'bio': 'Updated', 'first_name': 'Dana'},
+                                         content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        data = self.client.get(self.url).json()
+        self.assertEqual((data['bio'], data['first_name']), ('Updated', 'Dana'))
@@ -3,7 +3,7 @@ from rest_framework_simplejwt.views import (
     TokenObtainPairView,
     TokenRefreshView,
 )
-from .views import UserRegistrationView, UserProfileView
+from .views import UserRegistrationView, UserProfileView, UserDocumentStatsView
 from .views import LoginView
 
 urlpatterns = [
@@ -11,4 +11,5 @@ urlpatterns = [
     path('login/', LoginView.as_view(), name='token_obtain_pair'),
     path('refresh/', TokenRefreshView.as_view(), name='token_refresh'),
     path('profile/', UserProfileView.as_view(), name='profile'),
+    path('profile/stats/', UserDocumentStatsView.as_view(), name='profile-stats'),
 ]
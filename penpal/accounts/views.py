@@ -2,7 +2,10 @@ from rest_framework import status, generics
 from rest_framework.response import Response
 from rest_framework.permissions import AllowAny, IsAuthenticated
 from django.contrib.auth import get_user_model
-from .serializers import UserRegistrationSerializer, UserProfileSerializer, UserLoginSerializer
+from document.stats import get_stats
+from .cache import PROFILE_FIELDS, get_profile_data
+from .serializers import UserRegistrationSerializer, UserProfileSerializer, UserLoginSerializer, \
+    UserDocumentStatsSerializer
 from rest_framework_simplejwt.tokens import RefreshToken
 
 User = get_user_model()
@@ -14,6 +17,7 @@ class LoginView(generics.CreateAPIView):
     """
     permission_classes = [AllowAny]
     serializer_class = UserLoginSerializer
+    throttle_scope = 'login'
 
     def post(self, request, *args, **kwargs):
         serializer = self.get_serializer(data=request.data)
@@ -56,7 +60,7 @@ class UserRegistrationView(generics.CreateAPIView):
 class UserProfileView(generics.RetrieveUpdateAPIView):
     """
     User profile endpoint
-    GET /api/users/profile/ - Get profile
+    GET /api/users/profile/ - Get profile (cached; ?fields=username,avatar for a sparse read)
     PUT /api/users/profile/ - Update profile
     PATCH /api/users/profile/ - Partial update profile
     """
@@ -67,3 +71,32 @@ class UserProfileView(generics.RetrieveUpdateAPIView):
         return User.objects.select_related('profile').get(
             pk=self.request.user.pk
         )
+
+    def get_requested_fields(self):
+        requested = self.request.query_params.get('fields')
+        if not requested:
+            return None
+        fields = [f.strip() for f in requested.split(',') if f.strip() in PROFILE_FIELDS]
+        return fields or None
+
+    def retrieve(self, request, *args, **kwargs):
+        data = get_profile_data(
+            request.user.pk,
+            fields=self.get_requested_fields(),
+            context=self.get_serializer_context(),
+        )
+        return Response(data)
+
+
+class UserDocumentStatsView(generics.RetrieveAPIView):
+    """
+    Document dashboard statistics for the current user: live documents by
+    status and type, total word count and comment totals. A single-row read;
+    the row is kept current on every write (see document/stats.py).
+    GET /api/users/profile/stats/
+    """
+    permission_classes = [IsAuthenticated]
+    serializer_class = UserDocumentStatsSerializer
+
+    def get_object(self):
+        return get_stats(self.request.user.pk)
@@ -1,3 +1,11 @@
 from django.contrib import admin
 
-# Register your models here.
+from .models import AuditLog
+
+
+@admin.register(AuditLog)
+class AuditLogAdmin(admin.ModelAdmin):
+    list_display = ('timestamp', 'verb', 'actor', 'target_type', 'target_id', 'ip')
+    list_filter = ('verb', 'target_type')
+    search_fields = ('target_id', 'actor__username')
+    readonly_fields = [field.name for field in AuditLog._meta.fields]
@@ -0,0 +1,40 @@
+# Generated by Django 5.2.18 on 2026-10-19 15:32
+
+import django.db.models.deletion
+import uuid
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('contenttypes', '0002_remove_content_type_name'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AuditLog',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('verb', models.CharField(choices=[('create', 'Create'), ('update', 'Update'), ('delete', 'Delete'), ('publish', 'Publish'), ('login', 'Login'), ('logout', 'Logout'), ('restore', 'Restore'), ('other', 'Other')], help_text='Type of action performed.', max_length=50)),
+                ('target_id', models.CharField(help_text='Primary key of the affected object.', max_length=64)),
+                ('diff', models.JSONField(blank=True, default=dict, help_text='Changed fields (before/after snapshot).')),
+                ('ip', models.GenericIPAddressField(blank=True, null=True)),
+                ('user_agent', models.TextField(blank=True, help_text='User agent string from the request.')),
+                ('timestamp', models.DateTimeField(auto_now_add=True)),
+                ('actor', models.ForeignKey(blank=True, help_text='User who performed the action (if available).', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='audit_logs', to=settings.AUTH_USER_MODEL)),
+                ('target_type', models.ForeignKey(help_text='Django ContentType of the affected object.', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='audit_logs', to='contenttypes.contenttype')),
+            ],
+            options={
+                'verbose_name': 'Audit Log',
+                'verbose_name_plural': 'Audit Logs',
+                'db_table': 'audit_logs',
+                'ordering': ['-timestamp'],
+                'indexes': [models.Index(fields=['actor'], name='audit_logs_actor_i_0badd2_idx'), models.Index(fields=['verb'], name='audit_logs_verb_b3e641_idx'), models.Index(fields=['timestamp'], name='audit_logs_timesta_423be6_idx'), models.Index(fields=['target_type', 'target_id'], name='audit_logs_target__7814da_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,28 @@
+from django.contrib.contenttypes.models import ContentType
+
+from audit_log.models import AuditLog
+
+
+def client_ip(request):
+    forwarded = request.META.get('HTTP_X_FORWARDED_FOR')
+    if forwarded:
+        return forwarded.split(',')[0].strip()
+    return request.META.get('REMOTE_ADDR')
+
+
+def log_action(actor, verb, model, target_id, diff=None, request=None):
+    """
+    Write a single AuditLog entry.
+
+    For batch operations pass ``target_id='batch'`` and list the affected
+    primary keys in ``diff``.
+    """
+    return AuditLog.objects.create(
+        actor=actor if actor is not None and actor.is_authenticated else None,
+        verb=verb,
+        target_type=ContentType.objects.get_for_model(model),
+        target_id=str(target_id),
+        diff=diff or {},
+        ip=client_ip(request) if request is not None else None,
+        user_agent=request.META.get('HTTP_USER_AGENT', '') if request is not None else '',
+    )
@@ -4,9 +4,13 @@ from document.models import Document
 # Register your models here.
 class DocumentAdmin(admin.ModelAdmin):
     list_display = ('title', 'author', 'document_type', 'status', 'created_at', 'updated_at')
-    list_filter = ('document_type', 'status', 'author')
-    search_fields = ('title', 'description', 'content')
+    list_filter = ('document_type', 'status', 'soft_delete', 'author')
+    search_fields = ('title', 'description', 'plain_text')
     ordering = ('-updated_at',)
 
+    def get_queryset(self, request):
+        # Include soft-deleted documents so they can be inspected and restored.
+        return Document.all_objects.select_related('author')
+
 
 admin.site.register(Document, DocumentAdmin)
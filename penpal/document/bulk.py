@@ -0,0 +1,213 @@
+"""
+Set-based operations over many documents at once.
+
+Each operation runs a handful of ``UPDATE``/``INSERT``/``DELETE`` statements
+inside one transaction and writes a single audit entry for the whole batch;
+no model instances are loaded or saved, so derived fields and revisions are
+not recomputed; author statistics are adjusted per chunk (document/stats.py)
+and documents entering or leaving the public feed are queued for its refresh
+(document/feed.py).
+Ownership is enforced by one ``author=user`` filter.
+
+Id lists are processed in chunks of ``CHUNK_SIZE`` to stay under database
+parameter limits.
+"""
+from django.db import transaction
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+
+from audit_log.utils import log_action
+
+from . import feed, stats
+from .conditional import comments_scope, document_scopes, touch
+from .events import DELETED, RESTORED, STATUS_CHANGED, publish_document_event
+from .models import Comment, Document, MediaAsset
+
+
+MAX_BATCH_SIZE = 5000
+CHUNK_SIZE = 500
+
+CASCADE_MODELS = (Comment, MediaAsset)
+
+# Plain columns that can be changed in bulk; content fields are excluded
+# because they feed derived fields and revisions.
+BULK_UPDATE_FIELDS = ('status', 'is_public', 'allow_comments', 'allow_sharing', 'allow_editing')
+
+# Per-id results: changed, or skipped because the user does not own a live
+# (or, for restores, soft-deleted) document with that id.
+UPDATED = 'updated'
+SKIPPED = 'skipped'
+
+
+def chunked(values, size=CHUNK_SIZE):
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
+
+
+def normalize_ids(ids):
+    return list(dict.fromkeys(str(pk) for pk in ids))
+
+
+def owned_ids(user, ids, **filters):
+    """
+    Return the subset of ``ids`` owned by ``user`` that match ``filters``,
+    locking the rows for the rest of the transaction.
+    """
+    found = []
+    for chunk in chunked(ids):
+        queryset = Document.all_objects.filter(author=user, pk__in=chunk, **filters)
+        found.extend(str(pk) for pk in queryset.select_for_update().values_list('pk', flat=True))
+    return found
+
+
+def results_for(ids, changed):
+    changed = set(changed)
+    return {pk: UPDATED if pk in changed else SKIPPED for pk in ids}
+
+
+def touch_owned(user, changed, public=False):
+    """
+    Bump the change stamps of the user's ``changed`` documents: their
+    author's scope, and the public one if any of them is public.
+    """
+    public = public or Document.all_objects.filter(pk__in=changed, is_public=True).exists()
+    touch(document_scopes(user.pk, public))
+
+
+def set_soft_deleted(user, ids, deleted, request=None):
+    """
+    Soft-delete (or restore) the given documents owned by ``user`` together
+    with their comments and media assets.
+
+    Cascaded rows are stamped with the document's ``updated_at`` so a restore
+    only brings back what the delete took down; comments deleted on their
+    own beforehand stay deleted. Background text refreshes leave
+    ``updated_at`` alone on soft-deleted documents, so the stamp survives
+    until the restore.
+
+    Returns ``(changed_ids, skipped_ids)``.
+    """
+    ids = normalize_ids(ids)
+    now = timezone.now()
+
+    with transaction.atomic():
+        changed = owned_ids(user, ids, soft_delete=not deleted)
+        for chunk in chunked(changed):
+            deltas = stats.new_deltas()
+            if deleted:
+                published = feed.published_ids(chunk)
+                stats.add_documents(deltas, chunk, -1)
+                stats.add_comments(deltas, chunk, -1)
+            for model in CASCADE_MODELS:
+                related = model.all_objects.filter(document_id__in=chunk, soft_delete=not deleted)
+                if not deleted:
+                    related = related.filter(Exists(Document.all_objects.filter(
+                        pk=OuterRef('document_id'), updated_at=OuterRef('updated_at'),
+                    )))
+                related.update(soft_delete=deleted, updated_at=now)
+            Document.all_objects.filter(pk__in=chunk).update(soft_delete=deleted, updated_at=now)
+            if not deleted:
+                published = feed.published_ids(chunk)
+                stats.add_documents(deltas, chunk)
+                stats.add_comments(deltas, chunk)
+            stats.apply(deltas)
+            feed.queue_refresh(published)
+        if changed:
+            log_action(
+                user,
+                'delete' if deleted else 'restore',
+                Document,
+                'batch',
+                diff={'ids': changed, 'count': len(changed)},
+                request=request,
+            )
+        if changed:
+            touch_owned(user, changed)
+            touch(comments_scope(pk) for pk in changed)
+        for pk in changed:
+            publish_document_event(pk, DELETED if deleted else RESTORED)
+
+    changed_set = set(changed)
+    return changed, [pk for pk in ids if pk not in changed_set]
+
+
+def update_fields(user, ids, changes, request=None):
+    """
+    Apply ``changes`` (a subset of ``BULK_UPDATE_FIELDS``) to the user's live
+    documents. Returns a ``{id: result}`` dict.
+    """
+    ids = normalize_ids(ids)
+    now = timezone.now()
+
+    with transaction.atomic():
+        changed = owned_ids(user, ids, soft_delete=False)
+        for chunk in chunked(changed):
+            deltas = stats.new_deltas()
+            stats.add_documents(deltas, chunk, -1)
+            published = feed.published_ids(chunk)
+            Document.objects.filter(pk__in=chunk).update(updated_at=now, **changes)
+            stats.add_documents(deltas, chunk)
+            stats.apply(deltas)
+            feed.queue_refresh(dict.fromkeys(published + feed.published_ids(chunk)))
+        if changed:
+            log_action(user, 'update', Document, 'batch',
+                       diff={'ids': changed, 'count': len(changed), 'fields': changes},
+                       request=request)
+            touch_owned(user, changed, public='is_public' in changes)
+        for pk in changed:
+            publish_document_event(pk, STATUS_CHANGED, changes)
+    return results_for(ids, changed)
+
+
+def add_tags(user, ids, tag_ids, request=None):
+    """
+    Attach ``tag_ids`` to the user's live documents with one bulk insert per
+    chunk; existing links are left alone.
+    """
+    ids = normalize_ids(ids)
+    tag_ids = normalize_ids(tag_ids)
+    through = Document.tags.through
+    now = timezone.now()
+
+    with transaction.atomic():
+        changed = owned_ids(user, ids, soft_delete=False)
+        for chunk in chunked(changed):
+            through.objects.bulk_create(
+                [through(document_id=pk, tag_id=tag_id) for pk in chunk for tag_id in tag_ids],
+                ignore_conflicts=True,
+                batch_size=CHUNK_SIZE,
+            )
+            Document.objects.filter(pk__in=chunk).update(updated_at=now)
+            feed.queue_refresh(feed.published_ids(chunk))
+        if changed:
+            log_action(user, 'update', Document, 'batch',
+                       diff={'ids': changed, 'count': len(changed), 'tags_added': tag_ids},
+                       request=request)
+            touch_owned(user, changed)
+    return results_for(ids, changed)
+
+
+def remove_tags(user, ids, tag_ids, request=None):
+    """
+    Detach ``tag_ids`` from the user's live documents with one delete per chunk.
+    """
+    ids = normalize_ids(ids)
+    tag_ids = normalize_ids(tag_ids)
+    through = Document.tags.through
+    now = timezone.now()
+
+    with transaction.atomic():
+        changed = owned_ids(user, ids, soft_delete=False)
+        for chunk in chunked(changed):
+            through.objects.filter(document_id__in=chunk, tag_id__in=tag_ids).delete()
+            Document.objects.filter(pk__in=chunk).update(updated_at=now)
+            published = feed.published_ids(chunk)
+            if published:
+                feed.drop_tag_feeds(tag_ids)
+            feed.queue_refresh(published)
+        if changed:
+            log_action(user, 'update', Document, 'batch',
+                       diff={'ids': changed, 'count': len(changed), 'tags_removed': tag_ids},
+                       request=request)
+            touch_owned(user, changed)
+    return results_for(ids, changed)
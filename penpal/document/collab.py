@@ -0,0 +1,430 @@
+"""
+Operational-transform sync engine for the editor JSON fields
+(``content_json`` for TipTap, ``block_note_content`` for BlockNote).
+
+Clients submit operations against the server version they last saw. The
+server transforms them against everything applied since, applies them to an
+in-memory copy of the field and returns the transformed operations with the
+new version; other editors receive them through the change feed
+(``document.ops`` events).
+
+Operations (``p`` is a path of object keys and list indexes):
+
+    {'p': [..., index], 'li': value}   insert ``value`` into a list
+    {'p': [..., index], 'ld': value}   delete the list item at ``index``
+    {'p': [..., key], 'oi': value}     set an object key
+    {'p': [..., key], 'od': True}      remove an object key
+    {'p': [..., offset], 'si': text}   insert text into a string
+    {'p': [..., offset], 'sd': text}   delete ``text`` from a string
+
+Ties go to the operation the server applied first. Inserted values are
+copied into the state, and published operations and snapshots are copies,
+so nothing a client or subscriber holds aliases the session state.
+
+Sessions are kept per process, so all editors of a document must reach the
+same worker. State is written back to the ``Document`` row every
+``COLLAB_CHECKPOINT_SECONDS`` or ``COLLAB_CHECKPOINT_OPS`` operations and
+when an idle session is evicted.
+"""
+import copy
+import logging
+import threading
+import time
+from collections import deque
+
+from django.conf import settings
+from django.db import close_old_connections
+
+from .events import publish_document_event
+
+
+logger = logging.getLogger(__name__)
+
+COLLAB_FIELDS = ('content_json', 'block_note_content')
+
+OPS_APPLIED = 'document.ops'
+
+OP_KEYS = ('li', 'ld', 'oi', 'od', 'si', 'sd')
+
+
+class OperationError(ValueError):
+    """
+    An operation is malformed or does not fit the current state.
+    """
+
+
+class StaleVersion(Exception):
+    """
+    The client's base version is older than the retained history.
+    """
+
+
+# ----------------------------
+# OPERATIONS
+# ----------------------------
+def op_kind(op):
+    for key in OP_KEYS:
+        if key in op:
+            return key
+    raise OperationError(f"Unknown operation: {op!r}")
+
+
+def validate_op(op):
+    if not isinstance(op, dict) or not isinstance(op.get('p'), list) or not op['p']:
+        raise OperationError("Each operation needs a non-empty path 'p'.")
+    kind = op_kind(op)
+    last = op['p'][-1]
+    if kind in ('li', 'ld', 'si', 'sd') and (not isinstance(last, int) or last < 0):
+        raise OperationError(f"'{kind}' paths must end with a non-negative index.")
+    if kind in ('oi', 'od') and not isinstance(last, str):
+        raise OperationError(f"'{kind}' paths must end with an object key.")
+    if kind in ('si', 'sd') and not isinstance(op[kind], str):
+        raise OperationError(f"'{kind}' takes a string.")
+    for step in op['p'][:-1]:
+        if not isinstance(step, (int, str)) or isinstance(step, bool):
+            raise OperationError("Path elements must be keys or indexes.")
+    return kind
+
+
+def _resolve(state, path):
+    node = state
+    for step in path:
+        try:
+            node = node[step]
+        except (KeyError, IndexError, TypeError):
+            raise OperationError(f"Path {path!r} does not exist.")
+    return node
+
+
+def apply_op(state, op):
+    """
+    Apply ``op`` to ``state`` in place; return ``(state, inverse_op)``.
+
+    Raises OperationError without modifying ``state``.
+    """
+    kind = validate_op(op)
+    path, last = op['p'], op['p'][-1]
+
+    if kind in ('si', 'sd'):
+        parent = _resolve(state, path[:-2])
+        key = path[-2]
+        try:
+            text = parent[key]
+        except (KeyError, IndexError, TypeError):
+            raise OperationError(f"Path {path!r} does not exist.")
+        if not isinstance(text, str) or last > len(text):
+            raise OperationError(f"Path {path!r} is not a string offset.")
+        if kind == 'si':
+            parent[key] = text[:last] + op['si'] + text[last:]
+            return state, {'p': path, 'sd': op['si']}
+        if text[last:last + len(op['sd'])] != op['sd']:
+            raise OperationError(f"Text at {path!r} does not match the deletion.")
+        parent[key] = text[:last] + text[last + len(op['sd']):]
+        return state, {'p': path, 'si': op['sd']}
+
+    parent = _resolve(state, path[:-1])
+    if kind in ('li', 'ld'):
+        if not isinstance(parent, list):
+            raise OperationError(f"Path {path!r} is not a list index.")
+        if kind == 'li':
+            if last > len(parent):
+                raise OperationError(f"Index {last} is out of range.")
+            parent.insert(last, copy.deepcopy(op['li']))
+            return state, {'p': path, 'ld': op['li']}
+        if last >= len(parent):
+            raise OperationError(f"Index {last} is out of range.")
+        removed = parent.pop(last)
+        return state, {'p': path, 'li': removed}
+
+    if not isinstance(parent, dict):
+        raise OperationError(f"Path {path!r} is not an object key.")
+    missing = last not in parent
+    previous = parent.get(last)
+    if kind == 'oi':
+        parent[last] = copy.deepcopy(op['oi'])
+    elif missing:
+        raise OperationError(f"Key {last!r} does not exist.")
+    else:
+        del parent[last]
+    if missing:
+        return state, {'p': path, 'od': True}
+    return state, {'p': path, 'oi': previous}
+
+
+def apply_ops(state, ops):
+    """
+    Apply a batch atomically: on error, undo what was applied and re-raise.
+    """
+    inverses = []
+    try:
+        for op in ops:
+            state, inverse = apply_op(state, op)
+            inverses.append(inverse)
+    except OperationError:
+        for inverse in reversed(inverses):
+            state, _ = apply_op(state, inverse)
+        raise
+    return state
+
+
+def _is_prefix(prefix, path):
+    return len(prefix) <= len(path) and path[:len(prefix)] == prefix
+
+
+def transform(op, other, side):
+    """
+    Rewrite ``op`` so it applies after ``other`` (both made against the same
+    state). ``side`` is ``'left'`` if ``op`` wins ties, ``'right'`` otherwise.
+    Returns a list of zero, one or two operations.
+    """
+    kind, other_kind = op_kind(op), op_kind(other)
+    path, other_path = op['p'], other['p']
+    depth = len(other_path) - 1
+
+    if other_kind in ('si', 'sd'):
+        if kind not in ('si', 'sd') or path[:-1] != other_path[:-1]:
+            return [op]
+        offset, other_offset = path[-1], other_path[-1]
+        if other_kind == 'si':
+            shift = len(other['si'])
+            if kind == 'si':
+                if offset > other_offset or (offset == other_offset and side == 'right'):
+                    offset += shift
+                return [dict(op, p=path[:-1] + [offset])]
+            end = offset + len(op['sd'])
+            if other_offset <= offset:
+                return [dict(op, p=path[:-1] + [offset + shift])]
+            if other_offset >= end:
+                return [op]
+            # The insertion landed inside the deleted range: delete around it.
+            split = other_offset - offset
+            return [
+                {'p': path[:-1] + [offset], 'sd': op['sd'][:split]},
+                {'p': path[:-1] + [offset + shift], 'sd': op['sd'][split:]},
+            ]
+        start, stop = other_offset, other_offset + len(other['sd'])
+        if kind == 'si':
+            if offset >= stop:
+                offset -= stop - start
+            elif offset > start:
+                offset = start
+            return [dict(op, p=path[:-1] + [offset])]
+        text = op['sd'][:max(0, start - offset)] + op['sd'][max(0, stop - offset):]
+        if offset >= stop:
+            offset -= stop - start
+        elif offset > start:
+            offset = start
+        if not text:
+            return []
+        return [{'p': path[:-1] + [offset], 'sd': text}]
+
+    if other_kind in ('li', 'ld'):
+        if len(path) <= depth or path[:depth] != other_path[:depth] or not isinstance(path[depth], int):
+            return [op]
+        index, other_index = path[depth], other_path[depth]
+        if other_kind == 'li':
+            if index > other_index or (index == other_index and (len(path) > len(other_path) or side == 'right'
+                                                                 or kind != 'li')):
+                index += 1
+            return [dict(op, p=path[:depth] + [index] + path[depth + 1:])]
+        if index > other_index:
+            return [dict(op, p=path[:depth] + [index - 1] + path[depth + 1:])]
+        if index == other_index:
+            if len(path) == len(other_path) and kind == 'li':
+                return [op]
+            # Targets the removed item or something inside it.
+            return []
+        return [op]
+
+    # oi / od replace a subtree.
+    if _is_prefix(other_path, path) and len(path) > len(other_path):
+        return []
+    if path == other_path and kind in ('oi', 'od'):
+        # Same key: the later write wins and deleting twice is a no-op.
+        if side == 'left' or (kind == 'od' and other_kind == 'od'):
+            return []
+    return [op]
+
+
+def xform(ops, others):
+    """
+    Transform two operation lists made against the same state.
+
+    Returns ``(ops', others')``: ``ops'`` applies after ``others`` and
+    ``others'`` after ``ops``; ``others`` wins ties.
+    """
+    result = []
+    for op in ops:
+        current = [op]
+        shifted = []
+        for other in others:
+            if len(current) == 1:
+                single = current[0]
+                current = transform(single, other, 'right')
+                shifted.extend(transform(other, single, 'left'))
+            else:
+                # Only after a delete was split in two.
+                current, after = xform(current, [other])
+                shifted.extend(after)
+        result.extend(current)
+        others = shifted
+    return result, others
+
+
+def transform_ops(ops, applied):
+    """
+    Transform a client batch against operations the server already applied.
+    """
+    return xform(ops, applied)[0]
+
+
+# ----------------------------
+# SESSIONS
+# ----------------------------
+class CollabSession:
+    """
+    In-memory state of one editor field of one open document.
+    """
+
+    def __init__(self, document_id, field, state):
+        self.document_id = document_id
+        self.field = field
+        self.state = state
+        self.version = 0
+        self.history = deque(maxlen=settings.COLLAB_HISTORY_LIMIT)
+        self.lock = threading.Lock()
+        self.checkpoint_lock = threading.Lock()
+        self.pending = 0
+        self.last_checkpoint = time.monotonic()
+        self.last_active = time.monotonic()
+
+    def submit(self, base_version, ops, client=None):
+        """
+        Transform ``ops`` (made against ``base_version``), apply them and
+        return ``(new_version, applied_ops)``.
+        """
+        for op in ops:
+            validate_op(op)
+        with self.lock:
+            if base_version > self.version:
+                raise OperationError("Base version is ahead of the server.")
+            missed = self.version - base_version
+            if missed > len(self.history):
+                raise StaleVersion()
+            if missed:
+                concurrent = [op for batch in list(self.history)[-missed:] for op in batch]
+                ops = transform_ops(ops, concurrent)
+            self.state = apply_ops(self.state, ops)
+            self.version += 1
+            self.history.append(ops)
+            self.pending += len(ops)
+            self.last_active = time.monotonic()
+            version = self.version
+            due = self.checkpoint_due()
+        publish_document_event(self.document_id, OPS_APPLIED, {
+            'field': self.field, 'version': version, 'ops': copy.deepcopy(ops), 'client': client,
+        })
+        if due:
+            self.checkpoint()
+        return version, ops
+
+    def snapshot(self):
+        with self.lock:
+            return self.version, copy.deepcopy(self.state)
+
+    def checkpoint_due(self):
+        return self.pending and (
+            self.pending >= settings.COLLAB_CHECKPOINT_OPS
+            or time.monotonic() - self.last_checkpoint >= settings.COLLAB_CHECKPOINT_SECONDS
+        )
+
+    def checkpoint(self):
+        """
+        Write the current state through ``Document.save()`` so derived fields
+        and a revision are recorded once per checkpoint.
+        """
+        from .models import Document
+
+        with self.checkpoint_lock:
+            with self.lock:
+                if not self.pending:
+                    return False
+                # Copy so submissions can continue while the row is written.
+                state, self.pending = copy.deepcopy(self.state), 0
+                self.last_checkpoint = time.monotonic()
+            document = Document.objects.filter(pk=self.document_id).first()
+            if document is None:
+                return False
+            setattr(document, self.field, state)
+            document.save()
+        return True
+
+
+class SessionRegistry:
+    def __init__(self):
+        self._sessions = {}
+        self._lock = threading.Lock()
+
+    def get(self, document, field):
+        key = (str(document.pk), field)
+        with self._lock:
+            session = self._sessions.get(key)
+            if session is None:
+                session = CollabSession(document.pk, field, getattr(document, field))
+                self._sessions[key] = session
+        start_sweeper()
+        return session
+
+    def sweep(self, idle_seconds=None, force=False):
+        """
+        Checkpoint due sessions and evict idle ones. Returns the number evicted.
+        """
+        idle_seconds = settings.COLLAB_IDLE_SECONDS if idle_seconds is None else idle_seconds
+        now = time.monotonic()
+        with self._lock:
+            sessions = list(self._sessions.items())
+        evicted = 0
+        for key, session in sessions:
+            idle = force or now - session.last_active >= idle_seconds
+            if idle or session.checkpoint_due():
+                session.checkpoint()
+            if idle:
+                with self._lock:
+                    if self._sessions.get(key) is session and not session.pending:
+                        del self._sessions[key]
+                        evicted += 1
+        return evicted
+
+    def __len__(self):
+        return len(self._sessions)
+
+
+sessions = SessionRegistry()
+_sweeper = None
+_sweeper_lock = threading.Lock()
+
+
+def start_sweeper():
+    """
+    Start the background thread that checkpoints and evicts sessions.
+    """
+    global _sweeper
+    if _sweeper is not None:
+        return
+    with _sweeper_lock:
+        if _sweeper is not None:
+            return
+        _sweeper = threading.Thread(target=_sweep_forever, name='collab-sweeper', daemon=True)
+        _sweeper.start()
+
+
+def _sweep_forever():
+    while True:
+        time.sleep(settings.COLLAB_CHECKPOINT_SECONDS)
+        try:
+            sessions.sweep()
+        except Exception:
+            logger.exception("Collaborative session sweep failed")
+        finally:
+            # The sweeper thread holds its own connection.
+            close_old_connections()
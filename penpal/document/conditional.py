@@ -0,0 +1,301 @@
+"""
+Conditional requests (``ETag`` / ``Last-Modified``) for document and comment views.
+
+Lists are validated by change stamps: ``ChangeStamp`` rows per scope
+(public documents, each author's documents, each document's comments, tags),
+given a new version after every committed change in the scope, so a list's
+validators are a primary-key read of a few rows whatever the filters, and a
+user's list only revalidates when something it can show has changed. Details
+use a narrow query for the row and its ``updated_at``. A matching
+``If-None-Match``/``If-Modified-Since`` is answered with ``304`` before any
+row is loaded or serialized.
+
+An ETag is ``"<version>"`` or, when query parameters such as ``?format=``
+change the representation, ``"<version>-<representation>"``. On PUT/PATCH,
+``If-Match`` is compared on the version part only, so a tag read with any
+representation can guard a write; ``If-Match``/``If-Unmodified-Since`` are
+checked against the object the update loads anyway, so a stale write gets
+``412`` without an extra read.
+
+``related_validators`` names reverse relations whose live rows are part of
+the representation (document comments), so adding a comment changes the
+document's ETag.
+"""
+import hashlib
+import secrets
+
+from django.db import transaction
+from django.db.models import Count, Max, Q
+from django.http import HttpResponse
+from django.utils import timezone
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date, parse_etags
+from rest_framework.generics import get_object_or_404
+
+
+def _digest(parts, length):
+    return hashlib.sha256('|'.join(str(part) for part in parts).encode()).hexdigest()[:length]
+
+
+def make_etag(*parts, representation=''):
+    tag = _digest(parts, 32)
+    if representation:
+        tag += '-' + _digest([representation], 8)
+    return f'"{tag}"'
+
+
+def version_of(etag):
+    """
+    The representation-independent part of an ETag made by ``make_etag``.
+    """
+    return etag.split('-', 1)[0] + '"' if '-' in etag else etag
+
+
+def latest(*values):
+    values = [value for value in values if value is not None]
+    return max(values) if values else None
+
+
+def related_aggregates(name):
+    live = Q(**{f'{name}__soft_delete': False})
+    return {
+        f'{name}_latest': Max(f'{name}__updated_at', filter=live),
+        f'{name}_count': Count(name, filter=live, distinct=True),
+    }
+
+
+# ----------------------------
+# CHANGE STAMPS
+# ----------------------------
+# Documents are stamped per audience: one scope per author and one for public
+# documents, so an edit only revalidates the lists that can show it. Comments
+# are stamped per document for comment lists, and count towards their
+# document's scopes (lists show comment counts). Tags are rare writes and
+# stay one global scope.
+PUBLIC_DOCUMENTS = 'documents:public'
+TAGS = 'tags'
+
+
+def author_scope(author_id):
+    return f'documents:author:{author_id}'
+
+
+def comments_scope(document_id):
+    return f'comments:document:{document_id}'
+
+
+def document_scopes(author_id, *public):
+    """
+    Scopes of a document by ``author_id``; ``public`` holds its visibility
+    before and/or after a change.
+    """
+    scopes = [author_scope(author_id)]
+    if any(public):
+        scopes.append(PUBLIC_DOCUMENTS)
+    return scopes
+
+
+def bump(scopes):
+    """
+    Give ``scopes`` new versions with one upsert; concurrent bumps of
+    different scopes never touch the same row.
+    """
+    from .models import ChangeStamp
+
+    now = timezone.now()
+    ChangeStamp.objects.bulk_create(
+        [ChangeStamp(scope=scope, version=secrets.randbits(63), changed_at=now) for scope in sorted(set(scopes))],
+        update_conflicts=True,
+        unique_fields=['scope'],
+        update_fields=['version', 'changed_at'],
+        batch_size=500,
+    )
+
+
+def touch(scopes):
+    """
+    Bump ``scopes`` once the current transaction commits (immediately
+    outside a transaction). Bumping after the commit keeps the stamp rows out
+    of the writer's transaction and never lets a reader see a new stamp
+    before the rows it stands for.
+    """
+    scopes = list(scopes)
+    if scopes:
+        transaction.on_commit(lambda: bump(scopes))
+
+
+def touch_documents(documents):
+    """
+    ``touch`` the scopes of ``(author_id, is_public)`` pairs, e.g. the
+    ``values_list`` of changed documents.
+    """
+    scopes = set()
+    for author_id, is_public in documents:
+        scopes.update(document_scopes(author_id, is_public))
+    touch(scopes)
+
+
+def read_stamps(scopes):
+    """
+    ``{scope: (version, changed_at)}``; ``(0, None)`` before the first change.
+    """
+    from .models import ChangeStamp
+
+    rows = {
+        scope: (version, changed_at)
+        for scope, version, changed_at in ChangeStamp.objects.filter(scope__in=scopes)
+        .values_list('scope', 'version', 'changed_at')
+    }
+    return {scope: rows.get(scope, (0, None)) for scope in scopes}
+
+
+def document_changed(sender, instance, created=False, **kwargs):
+    """
+    post_save/post_delete receiver for Document.
+    """
+    loaded = getattr(instance, '_loaded_state', {})
+    was_public = False if created else loaded.get('is_public', True)
+    touch(document_scopes(instance.author_id, was_public, instance.is_public))
+
+
+def comment_changed(sender, instance, **kwargs):
+    """
+    post_save/post_delete receiver for Comment.
+    """
+    document = instance.document
+    touch([comments_scope(document.pk), *document_scopes(document.author_id, document.is_public)])
+
+
+def tag_changed(sender, **kwargs):
+    touch([TAGS])
+
+
+def tags_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    """
+    m2m_changed receiver for ``Document.tags``, from either side.
+    """
+    from .models import Document
+
+    if not action.startswith('post_'):
+        return
+    if not reverse:
+        touch(document_scopes(instance.author_id, instance.is_public))
+    elif action == 'post_clear':
+        # The links are gone; any document may have lost the tag.
+        touch([TAGS])
+    else:
+        touch_documents(Document.all_objects.filter(pk__in=pk_set).values_list('author_id', 'is_public'))
+
+
+class ConditionalMixin:
+    related_validators = ()
+
+    def precondition_response(self, etag, last_modified):
+        """
+        Return a 304/412 response if the request's preconditions say so.
+        """
+        timestamp = last_modified.timestamp() if last_modified is not None else None
+        response = get_conditional_response(self.request, etag=etag, last_modified=timestamp)
+        if response is not None:
+            self.set_validators(response, etag, last_modified)
+        return response
+
+    def set_validators(self, response, etag, last_modified):
+        response['ETag'] = etag
+        if last_modified is not None:
+            response['Last-Modified'] = http_date(last_modified.timestamp())
+        # Lists and permissions depend on the user, from a token or a session.
+        patch_vary_headers(response, ('Authorization', 'Cookie'))
+        return response
+
+
+class ConditionalListMixin(ConditionalMixin):
+    """
+    ``get_stamp_scopes()`` names the change-stamp scopes covering the rows
+    the list can show; a committed change in one of them changes the list's
+    validators.
+    """
+
+    def get_stamp_scopes(self):
+        raise NotImplementedError
+
+    def list_validators(self):
+        stamps = read_stamps(self.get_stamp_scopes())
+        last_modified = latest(*(changed_at for _, changed_at in stamps.values()))
+        # The visible rows depend on the user; page, search and ordering on the query string.
+        etag = make_etag(
+            self.get_queryset().model._meta.label, self.request.user.pk,
+            *(f'{scope}:{version}' for scope, (version, _) in sorted(stamps.items())),
+            representation=self.request.GET.urlencode(),
+        )
+        return etag, last_modified
+
+    def get(self, request, *args, **kwargs):
+        etag, last_modified = self.list_validators()
+        response = self.precondition_response(etag, last_modified)
+        if response is not None:
+            return response
+        return self.set_validators(super().get(request, *args, **kwargs), etag, last_modified)
+
+
+class ConditionalDetailMixin(ConditionalMixin):
+    """
+    ``validator_queryset`` loads only what the validators and the object
+    permission checks need. ``get_object`` is memoized so PUT/PATCH reuse the
+    row the precondition was checked against.
+    """
+    validator_queryset = None
+
+    def get_validator_object(self):
+        queryset = self.validator_queryset.all()
+        for name in self.related_validators:
+            queryset = queryset.annotate(**related_aggregates(name))
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        obj = get_object_or_404(queryset, **{self.lookup_field: self.kwargs[lookup_url_kwarg]})
+        self.check_object_permissions(self.request, obj)
+        return obj
+
+    def object_validators(self, obj, representation=True):
+        parts = [obj._meta.label, obj.pk, obj.updated_at.isoformat()]
+        last_modified = obj.updated_at
+        for name in self.related_validators:
+            if hasattr(obj, f'{name}_count'):
+                related_latest, count = getattr(obj, f'{name}_latest'), getattr(obj, f'{name}_count')
+            else:
+                # Loaded for an update: use the prefetched rows instead of querying.
+                rows = list(getattr(obj, name).all())
+                related_latest, count = latest(*(row.updated_at for row in rows)), len(rows)
+            parts += [related_latest.isoformat() if related_latest else None, count]
+            last_modified = latest(last_modified, related_latest)
+        # Query parameters such as ?format= change the representation.
+        return make_etag(*parts, representation=self.request.GET.urlencode() if representation else ''), last_modified
+
+    def get_object(self):
+        if getattr(self, '_object', None) is None:
+            self._object = super().get_object()
+        return self._object
+
+    def get(self, request, *args, **kwargs):
+        etag, last_modified = self.object_validators(self.get_validator_object())
+        response = self.precondition_response(etag, last_modified)
+        if response is not None:
+            return response
+        return self.set_validators(super().get(request, *args, **kwargs), etag, last_modified)
+
+    def write_precondition_response(self):
+        if 'If-Match' not in self.request.headers and 'If-Unmodified-Since' not in self.request.headers:
+            return None
+        etag, last_modified = self.object_validators(self.get_object(), representation=False)
+        if 'If-Match' not in self.request.headers:
+            return self.precondition_response(etag, last_modified)
+        # If-Match takes precedence over If-Unmodified-Since (RFC 9110 13.2.2).
+        tags = parse_etags(self.request.headers['If-Match'])
+        if '*' in tags or etag in {version_of(tag) for tag in tags}:
+            return None
+        return self.set_validators(HttpResponse(status=412), etag, last_modified)
+
+    def put(self, request, *args, **kwargs):
+        return self.write_precondition_response() or super().put(request, *args, **kwargs)
+
+    def patch(self, request, *args, **kwargs):
+        return self.write_precondition_response() or super().patch(request, *args, **kwargs)
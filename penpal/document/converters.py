@@ -0,0 +1,641 @@
+"""
+Conversion between the document content formats.
+
+- ``html``: HTML as produced by TipTap (``Document.content``)
+- ``tiptap``: TipTap / ProseMirror JSON (``Document.content_json``)
+- ``blocknote``: BlockNote block JSON (``Document.block_note_content``)
+- ``markdown``: Markdown text (``Document.content`` for markdown documents)
+
+Every format is parsed into a flat list of blocks and rendered from it:
+
+    {'type': 'paragraph' | 'heading' | 'bullet' | 'numbered' | 'code' | 'quote' | 'rule',
+     'level': int,        # headings
+     'language': str,     # code blocks
+     'runs': [{'text': str, 'bold': bool, 'italic': bool, 'code': bool,
+               'strike': bool, 'href': str | None}]}
+
+Only the common subset of block and inline types is preserved; anything else
+degrades to a paragraph of its text. Links keep ``http``, ``https``,
+``mailto`` and relative URLs; other schemes (``javascript:``, ``data:``)
+drop the link and keep its text. Editor JSON comes from clients, so the
+JSON parsers skip nodes of the wrong shape instead of raising.
+"""
+import html
+import re
+from html.parser import HTMLParser
+
+
+FORMATS = ('html', 'tiptap', 'blocknote', 'markdown')
+
+MARKS = ('bold', 'italic', 'code', 'strike')
+
+
+LINK_SCHEMES = ('http', 'https', 'mailto')
+
+_SCHEME = re.compile(r'([a-z][a-z0-9+.-]*):', re.IGNORECASE)
+
+
+def safe_href(href):
+    """
+    ``href`` if it is relative or uses one of ``LINK_SCHEMES``, else None.
+    """
+    if not href:
+        return None
+    # Browsers ignore control characters and whitespace inside the scheme.
+    scheme = _SCHEME.match(re.sub(r'[\x00-\x20]', '', href))
+    if scheme and scheme.group(1).lower() not in LINK_SCHEMES:
+        return None
+    return href
+
+
+def make_run(text, **marks):
+    run = {'text': text, 'href': safe_href(marks.pop('href', None))}
+    for mark in MARKS:
+        run[mark] = bool(marks.get(mark))
+    return run
+
+
+def make_block(block_type, runs=None, **attrs):
+    return {'type': block_type, 'runs': runs or [], **attrs}
+
+
+def plain_text(runs):
+    return ''.join(run['text'] for run in runs)
+
+
+def _nodes(value):
+    """
+    The dict items of a JSON list; anything else holds no nodes.
+    """
+    if not isinstance(value, list):
+        return []
+    return [node for node in value if isinstance(node, dict)]
+
+
+def _mapping(value):
+    return value if isinstance(value, dict) else {}
+
+
+def _string(value):
+    return value if isinstance(value, str) else ''
+
+
+def _level(value):
+    try:
+        return min(max(int(value), 1), 6)
+    except (TypeError, ValueError):
+        return 1
+
+
+# ----------------------------
+# HTML
+# ----------------------------
+class _HTMLBlockParser(HTMLParser):
+    BLOCK_TAGS = {'p': 'paragraph', 'h1': 'heading', 'h2': 'heading', 'h3': 'heading',
+                  'h4': 'heading', 'h5': 'heading', 'h6': 'heading', 'pre': 'code'}
+    MARK_TAGS = {'strong': 'bold', 'b': 'bold', 'em': 'italic', 'i': 'italic',
+                 'code': 'code', 's': 'strike', 'strike': 'strike', 'del': 'strike'}
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.blocks = []
+        self.current = None
+        self.lists = []
+        self.quote_depth = 0
+        self.marks = {}
+        self.href = None
+
+    def open_block(self, block_type, **attrs):
+        self.close_block()
+        if block_type == 'paragraph' and self.quote_depth:
+            block_type = 'quote'
+        self.current = make_block(block_type, **attrs)
+
+    def close_block(self):
+        if self.current is not None and (self.current['runs'] or self.current['type'] == 'rule'):
+            self.blocks.append(self.current)
+        self.current = None
+
+    def handle_starttag(self, tag, attrs):
+        attrs = dict(attrs)
+        if tag in ('ul', 'ol'):
+            self.close_block()
+            self.lists.append('bullet' if tag == 'ul' else 'numbered')
+        elif tag == 'li':
+            self.open_block(self.lists[-1] if self.lists else 'bullet')
+        elif tag == 'blockquote':
+            self.close_block()
+            self.quote_depth += 1
+        elif tag == 'hr':
+            self.close_block()
+            self.blocks.append(make_block('rule'))
+        elif tag == 'br':
+            self.handle_data('\n')
+        elif tag == 'code' and self.current is not None and self.current['type'] == 'code':
+            language = (attrs.get('class') or '').removeprefix('language-')
+            self.current['language'] = language
+        elif tag in self.BLOCK_TAGS:
+            # <p> inside a list item belongs to the item; later ones start a new line.
+            if tag == 'p' and self.current is not None and self.current['type'] in ('bullet', 'numbered'):
+                if self.current['runs']:
+                    self.handle_data('\n')
+                return
+            block_type = self.BLOCK_TAGS[tag]
+            extra = {'level': int(tag[1])} if block_type == 'heading' else {}
+            if block_type == 'code':
+                extra['language'] = ''
+            self.open_block(block_type, **extra)
+        elif tag in self.MARK_TAGS:
+            self.marks[self.MARK_TAGS[tag]] = self.marks.get(self.MARK_TAGS[tag], 0) + 1
+        elif tag == 'a':
+            self.href = attrs.get('href')
+
+    def handle_endtag(self, tag):
+        if tag in ('ul', 'ol'):
+            self.close_block()
+            if self.lists:
+                self.lists.pop()
+        elif tag == 'blockquote':
+            self.close_block()
+            self.quote_depth = max(0, self.quote_depth - 1)
+        elif tag == 'li' or (tag in self.BLOCK_TAGS and tag != 'p'):
+            self.close_block()
+        elif tag == 'p' and self.current is not None and self.current['type'] in ('paragraph', 'quote'):
+            self.close_block()
+        elif tag in self.MARK_TAGS:
+            self.marks[self.MARK_TAGS[tag]] = max(0, self.marks.get(self.MARK_TAGS[tag], 0) - 1)
+        elif tag == 'a':
+            self.href = None
+
+    def handle_data(self, data):
+        if self.current is None:
+            if not data.strip():
+                return
+            self.open_block('paragraph')
+        if self.current['type'] != 'code':
+            data = re.sub(r'[ \t\r\n]+', ' ', data) if data != '\n' else data
+        code = self.current['type'] == 'code' or self.marks.get('code')
+        self.current['runs'].append(make_run(
+            data,
+            bold=self.marks.get('bold'),
+            italic=self.marks.get('italic'),
+            code=code and self.current['type'] != 'code',
+            strike=self.marks.get('strike'),
+            href=self.href,
+        ))
+
+
+def html_to_blocks(text):
+    parser = _HTMLBlockParser()
+    parser.feed(text or '')
+    parser.close()
+    parser.close_block()
+    return parser.blocks
+
+
+def _runs_to_html(runs):
+    parts = []
+    for run in runs:
+        text = html.escape(run['text']).replace('\n', '<br>')
+        if run['code']:
+            text = f'<code>{text}</code>'
+        if run['strike']:
+            text = f'<s>{text}</s>'
+        if run['italic']:
+            text = f'<em>{text}</em>'
+        if run['bold']:
+            text = f'<strong>{text}</strong>'
+        if run['href']:
+            text = f'<a href="{html.escape(run["href"])}">{text}</a>'
+        parts.append(text)
+    return ''.join(parts)
+
+
+def blocks_to_html(blocks):
+    parts = []
+    open_list = None
+    for block in blocks:
+        list_tag = {'bullet': 'ul', 'numbered': 'ol'}.get(block['type'])
+        if list_tag != open_list:
+            if open_list:
+                parts.append(f'</{open_list}>')
+            if list_tag:
+                parts.append(f'<{list_tag}>')
+            open_list = list_tag
+
+        inner = _runs_to_html(block['runs'])
+        if list_tag:
+            parts.append(f'<li><p>{inner}</p></li>')
+        elif block['type'] == 'heading':
+            parts.append(f'<h{block["level"]}>{inner}</h{block["level"]}>')
+        elif block['type'] == 'code':
+            language = block.get('language')
+            attr = f' class="language-{html.escape(language)}"' if language else ''
+            parts.append(f'<pre><code{attr}>{html.escape(plain_text(block["runs"]))}</code></pre>')
+        elif block['type'] == 'quote':
+            parts.append(f'<blockquote><p>{inner}</p></blockquote>')
+        elif block['type'] == 'rule':
+            parts.append('<hr>')
+        else:
+            parts.append(f'<p>{inner}</p>')
+    if open_list:
+        parts.append(f'</{open_list}>')
+    return ''.join(parts)
+
+
+# ----------------------------
+# MARKDOWN
+# ----------------------------
+_INLINE_RE = re.compile(
+    r'`(?P<code>[^`]+)`'
+    r'|\*\*(?P<bold>.+?)\*\*'
+    r'|~~(?P<strike>.+?)~~'
+    r'|\[(?P<link>[^\]]+)\]\((?P<href>[^)\s]+)\)'
+    r'|(?<!\w)[*_](?P<italic>[^*_]+)[*_](?!\w)'
+)
+
+
+def _parse_inline(text, **marks):
+    runs = []
+    position = 0
+    for match in _INLINE_RE.finditer(text):
+        if match.start() > position:
+            runs.append(make_run(text[position:match.start()], **marks))
+        if match.group('code') is not None:
+            runs.append(make_run(match.group('code'), **{**marks, 'code': True}))
+        elif match.group('bold') is not None:
+            runs.extend(_parse_inline(match.group('bold'), **{**marks, 'bold': True}))
+        elif match.group('strike') is not None:
+            runs.extend(_parse_inline(match.group('strike'), **{**marks, 'strike': True}))
+        elif match.group('link') is not None:
+            runs.extend(_parse_inline(match.group('link'), **{**marks, 'href': match.group('href')}))
+        else:
+            runs.extend(_parse_inline(match.group('italic'), **{**marks, 'italic': True}))
+        position = match.end()
+    if position < len(text):
+        runs.append(make_run(text[position:], **marks))
+    return runs
+
+
+def markdown_to_blocks(text):
+    blocks = []
+    paragraph = []
+    lines = (text or '').splitlines()
+    index = 0
+
+    def flush():
+        if paragraph:
+            blocks.append(make_block('paragraph', _parse_inline(' '.join(paragraph))))
+            paragraph.clear()
+
+    while index < len(lines):
+        line = lines[index]
+        stripped = line.strip()
+        index += 1
+
+        if stripped.startswith('```'):
+            flush()
+            language = stripped[3:].strip()
+            code = []
+            while index < len(lines) and not lines[index].strip().startswith('```'):
+                code.append(lines[index])
+                index += 1
+            index += 1
+            blocks.append(make_block('code', [make_run('\n'.join(code))], language=language))
+        elif not stripped:
+            flush()
+        elif match := re.match(r'(#{1,6})\s+(.*)', stripped):
+            flush()
+            blocks.append(make_block('heading', _parse_inline(match.group(2)), level=len(match.group(1))))
+        elif re.fullmatch(r'(\*\s*){3,}|(-\s*){3,}|(_\s*){3,}', stripped):
+            flush()
+            blocks.append(make_block('rule'))
+        elif match := re.match(r'[-*+]\s+(.*)', stripped):
+            flush()
+            blocks.append(make_block('bullet', _parse_inline(match.group(1))))
+        elif match := re.match(r'\d+[.)]\s+(.*)', stripped):
+            flush()
+            blocks.append(make_block('numbered', _parse_inline(match.group(1))))
+        elif stripped.startswith('>'):
+            flush()
+            blocks.append(make_block('quote', _parse_inline(stripped.lstrip('>').strip())))
+        else:
+            paragraph.append(stripped)
+    flush()
+    return blocks
+
+
+def _runs_to_markdown(runs):
+    parts = []
+    for run in runs:
+        # Two trailing spaces keep a hard line break inside a paragraph.
+        text = run['text'].replace('\n', '  \n')
+        if run['code']:
+            text = f'`{text}`'
+        if run['strike']:
+            text = f'~~{text}~~'
+        if run['italic']:
+            text = f'*{text}*'
+        if run['bold']:
+            text = f'**{text}**'
+        if run['href']:
+            text = f'[{text}]({run["href"]})'
+        parts.append(text)
+    return ''.join(parts)
+
+
+def blocks_to_markdown(blocks):
+    lines = []
+    previous = None
+    number = 0
+    for block in blocks:
+        block_type = block['type']
+        in_list = block_type in ('bullet', 'numbered')
+        # Consecutive list items stay together; everything else is separated.
+        if lines and not (in_list and previous == block_type):
+            lines.append('')
+        number = number + 1 if block_type == 'numbered' and previous == 'numbered' else 1
+
+        inner = _runs_to_markdown(block['runs'])
+        if block_type == 'heading':
+            lines.append(f'{"#" * block["level"]} {inner}')
+        elif block_type == 'bullet':
+            lines.append(f'- {inner}')
+        elif block_type == 'numbered':
+            lines.append(f'{number}. {inner}')
+        elif block_type == 'code':
+            lines.extend([f'```{block.get("language") or ""}', plain_text(block['runs']), '```'])
+        elif block_type == 'quote':
+            lines.append(f'> {inner}')
+        elif block_type == 'rule':
+            lines.append('---')
+        else:
+            lines.append(inner)
+        previous = block_type
+    return '\n'.join(lines) + ('\n' if lines else '')
+
+
+# ----------------------------
+# TIPTAP (ProseMirror JSON)
+# ----------------------------
+_TIPTAP_MARKS = {'bold': 'bold', 'italic': 'italic', 'code': 'code', 'strike': 'strike'}
+
+
+def _tiptap_runs(nodes):
+    runs = []
+    for node in _nodes(nodes):
+        if node.get('type') == 'hardBreak':
+            runs.append(make_run('\n'))
+        elif node.get('type') == 'text':
+            marks = {}
+            for mark in _nodes(node.get('marks')):
+                mark_type = _string(mark.get('type'))
+                if mark_type == 'link':
+                    marks['href'] = _string(_mapping(mark.get('attrs')).get('href')) or None
+                elif mark_type in _TIPTAP_MARKS:
+                    marks[_TIPTAP_MARKS[mark_type]] = True
+            runs.append(make_run(_string(node.get('text')), **marks))
+        else:
+            runs.extend(_tiptap_runs(node.get('content')))
+    return runs
+
+
+def tiptap_to_blocks(doc, list_type=None, quote=False):
+    blocks = []
+    for node in _nodes(doc.get('content') if isinstance(doc, dict) else doc):
+        node_type = _string(node.get('type'))
+        attrs = _mapping(node.get('attrs'))
+        if node_type in ('bulletList', 'orderedList'):
+            blocks.extend(tiptap_to_blocks(node, 'bullet' if node_type == 'bulletList' else 'numbered'))
+        elif node_type == 'listItem':
+            children = _nodes(node.get('content'))
+            first, rest = (children[0], children[1:]) if children else ({}, [])
+            blocks.append(make_block(list_type or 'bullet', _tiptap_runs(first.get('content'))))
+            blocks.extend(tiptap_to_blocks(rest, list_type))
+        elif node_type == 'blockquote':
+            blocks.extend(tiptap_to_blocks(node, quote=True))
+        elif node_type == 'heading':
+            blocks.append(make_block('heading', _tiptap_runs(node.get('content')), level=_level(attrs.get('level', 1))))
+        elif node_type == 'codeBlock':
+            blocks.append(make_block('code', [make_run(plain_text(_tiptap_runs(node.get('content'))))],
+                                     language=_string(attrs.get('language'))))
+        elif node_type == 'horizontalRule':
+            blocks.append(make_block('rule'))
+        else:
+            blocks.append(make_block('quote' if quote else 'paragraph', _tiptap_runs(node.get('content'))))
+    return blocks
+
+
+def _runs_to_tiptap(runs):
+    nodes = []
+    for run in runs:
+        if not run['text']:
+            continue
+        marks = [{'type': mark} for mark in MARKS if run[mark]]
+        if run['href']:
+            marks.append({'type': 'link', 'attrs': {'href': run['href']}})
+        node = {'type': 'text', 'text': run['text']}
+        if marks:
+            node['marks'] = marks
+        nodes.append(node)
+    return nodes
+
+
+def blocks_to_tiptap(blocks):
+    content = []
+    for block in blocks:
+        block_type = block['type']
+        paragraph = {'type': 'paragraph', 'content': _runs_to_tiptap(block['runs'])}
+        if block_type in ('bullet', 'numbered'):
+            list_type = 'bulletList' if block_type == 'bullet' else 'orderedList'
+            if not content or content[-1]['type'] != list_type:
+                content.append({'type': list_type, 'content': []})
+            content[-1]['content'].append({'type': 'listItem', 'content': [paragraph]})
+        elif block_type == 'heading':
+            content.append({'type': 'heading', 'attrs': {'level': block['level']},
+                            'content': _runs_to_tiptap(block['runs'])})
+        elif block_type == 'code':
+            content.append({'type': 'codeBlock', 'attrs': {'language': block.get('language') or None},
+                            'content': [{'type': 'text', 'text': plain_text(block['runs'])}]})
+        elif block_type == 'quote':
+            content.append({'type': 'blockquote', 'content': [paragraph]})
+        elif block_type == 'rule':
+            content.append({'type': 'horizontalRule'})
+        else:
+            content.append(paragraph)
+    return {'type': 'doc', 'content': content}
+
+
+# ----------------------------
+# BLOCKNOTE
+# ----------------------------
+_BLOCKNOTE_TYPES = {
+    'paragraph': 'paragraph', 'heading': 'heading', 'bulletListItem': 'bullet',
+    'numberedListItem': 'numbered', 'checkListItem': 'bullet', 'codeBlock': 'code',
+    'quote': 'quote',
+}
+
+
+def _blocknote_runs(content):
+    if isinstance(content, str):
+        return [make_run(content)]
+    runs = []
+    for item in _nodes(content):
+        if item.get('type') == 'link':
+            for run in _blocknote_runs(item.get('content')):
+                run['href'] = safe_href(_string(item.get('href')))
+                runs.append(run)
+            continue
+        styles = _mapping(item.get('styles'))
+        runs.append(make_run(_string(item.get('text')), bold=styles.get('bold'), italic=styles.get('italic'),
+                             code=styles.get('code'), strike=styles.get('strike')))
+    return runs
+
+
+def blocknote_to_blocks(document):
+    if isinstance(document, dict):
+        document = document.get('blocks') or document.get('content')
+    blocks = []
+    for item in _nodes(document):
+        block_type = _BLOCKNOTE_TYPES.get(_string(item.get('type')), 'paragraph')
+        props = _mapping(item.get('props'))
+        runs = _blocknote_runs(item.get('content'))
+        if block_type == 'heading':
+            blocks.append(make_block('heading', runs, level=_level(props.get('level', 1))))
+        elif block_type == 'code':
+            blocks.append(make_block('code', [make_run(plain_text(runs))], language=_string(props.get('language'))))
+        else:
+            blocks.append(make_block(block_type, runs))
+        blocks.extend(blocknote_to_blocks(item.get('children')))
+    return blocks
+
+
+def _runs_to_blocknote(runs):
+    items = []
+    for run in runs:
+        if not run['text']:
+            continue
+        styles = {mark: True for mark in MARKS if run[mark]}
+        text = {'type': 'text', 'text': run['text'], 'styles': styles}
+        if run['href']:
+            items.append({'type': 'link', 'href': run['href'], 'content': [text]})
+        else:
+            items.append(text)
+    return items
+
+
+def blocks_to_blocknote(blocks):
+    types = {'bullet': 'bulletListItem', 'numbered': 'numberedListItem', 'code': 'codeBlock'}
+    result = []
+    for block in blocks:
+        block_type = block['type']
+        props = {}
+        if block_type == 'heading':
+            props['level'] = block['level']
+        elif block_type == 'code':
+            props['language'] = block.get('language') or 'text'
+        runs = [] if block_type == 'rule' else block['runs']
+        result.append({
+            'type': types.get(block_type, 'paragraph' if block_type == 'rule' else block_type),
+            'props': props,
+            'content': _runs_to_blocknote(runs),
+            'children': [],
+        })
+    return result
+
+
+# ----------------------------
+# VALIDATION
+# ----------------------------
+def _check_types(node, path, **types):
+    for key, expected in types.items():
+        if node.get(key) is not None and not isinstance(node[key], expected):
+            raise ValueError(f"{path}.{key} has the wrong type.")
+
+
+def _check_nodes(value, path, check):
+    if not isinstance(value, list):
+        raise ValueError(f"{path} must be a list.")
+    for index, node in enumerate(value):
+        if not isinstance(node, dict):
+            raise ValueError(f"{path}[{index}] must be an object.")
+        check(node, f'{path}[{index}]')
+
+
+def _check_tiptap_node(node, path):
+    _check_types(node, path, type=str, text=str, attrs=dict)
+    if node.get('content') is not None:
+        _check_nodes(node['content'], f'{path}.content', _check_tiptap_node)
+    if node.get('marks') is not None:
+        _check_nodes(node['marks'], f'{path}.marks',
+                     lambda mark, mark_path: _check_types(mark, mark_path, type=str, attrs=dict))
+
+
+def _check_blocknote_inline(item, path):
+    _check_types(item, path, type=str, text=str, href=str, styles=dict, content=(str, list))
+    if isinstance(item.get('content'), list):
+        _check_nodes(item['content'], f'{path}.content', _check_blocknote_inline)
+
+
+def _check_blocknote_block(block, path):
+    _check_types(block, path, type=str, props=dict, content=(str, list), children=list)
+    if isinstance(block.get('content'), list):
+        _check_nodes(block['content'], f'{path}.content', _check_blocknote_inline)
+    if block.get('children') is not None:
+        _check_nodes(block['children'], f'{path}.children', _check_blocknote_block)
+
+
+def check_tiptap(doc):
+    """
+    Raise ``ValueError`` unless ``doc`` has the shape of TipTap JSON (or is empty).
+    """
+    if doc is None or doc == {}:
+        return
+    if not isinstance(doc, dict):
+        raise ValueError("Expected a TipTap document object.")
+    _check_tiptap_node(doc, 'doc')
+
+
+def check_blocknote(document):
+    """
+    Raise ``ValueError`` unless ``document`` has the shape of BlockNote JSON (or is empty).
+    """
+    if document is None or document == {}:
+        return
+    if isinstance(document, dict):
+        document = document.get('blocks', document.get('content'))
+    _check_nodes(document, 'blocks', _check_blocknote_block)
+
+
+PARSERS = {
+    'html': html_to_blocks,
+    'tiptap': tiptap_to_blocks,
+    'blocknote': blocknote_to_blocks,
+    'markdown': markdown_to_blocks,
+}
+
+RENDERERS = {
+    'html': blocks_to_html,
+    'tiptap': blocks_to_tiptap,
+    'blocknote': blocks_to_blocknote,
+    'markdown': blocks_to_markdown,
+}
+
+
+def source_of(document):
+    """
+    Return ``(format, value)`` for the representation a document is authored in.
+    """
+    if document.editor_type == 'blocknote' and document.block_note_content:
+        return 'blocknote', document.block_note_content
+    if document.editor_type == 'markdown':
+        return 'markdown', document.content
+    if document.editor_type == 'tiptap' and not document.content and document.content_json:
+        return 'tiptap', document.content_json
+    return 'html', document.content
+
+
+def convert(value, source, target):
+    if source == target:
+        return value
+    return RENDERERS[target](PARSERS[source](value))
@@ -0,0 +1,84 @@
+"""
+Write-time derived fields for documents: plain text, excerpt, heading
+outline, content hash, word count and read time.
+
+Computed from the document's source representation (see
+``converters.source_of``) so every editor type produces the same shape.
+"""
+import hashlib
+import json
+
+from .converters import PARSERS, plain_text, source_of
+
+
+EXCERPT_LENGTH = 280
+WORDS_PER_MINUTE = 200
+
+DERIVED_FIELDS = ('plain_text', 'excerpt', 'outline', 'content_hash', 'word_count', 'read_time')
+TEXT_FIELDS = tuple(field for field in DERIVED_FIELDS if field != 'content_hash')
+SOURCE_FIELDS = ('content', 'content_json', 'block_note_content', 'editor_type')
+
+
+def content_hash(document):
+    """
+    SHA-256 over the editor type and the three body fields.
+    """
+    digest = hashlib.sha256()
+    digest.update(document.editor_type.encode())
+    digest.update(b'\x00')
+    digest.update((document.content or '').encode())
+    for value in (document.content_json, document.block_note_content):
+        digest.update(b'\x00')
+        digest.update(json.dumps(value, sort_keys=True, separators=(',', ':')).encode())
+    return digest.hexdigest()
+
+
+def make_excerpt(text, length=EXCERPT_LENGTH):
+    text = ' '.join(text.split())
+    if len(text) <= length:
+        return text
+    cut = text[:length].rsplit(' ', 1)[0] or text[:length]
+    return cut.rstrip(' ,.;:') + '…'
+
+
+def derive(document, digest=None):
+    """
+    Return a dict of derived field values for ``document``.
+    """
+    source, value = source_of(document)
+    blocks = PARSERS[source](value)
+    text = '\n'.join(plain_text(block['runs']) for block in blocks if block['runs'])
+    word_count = len(text.split())
+    return {
+        'plain_text': text,
+        'excerpt': make_excerpt(text),
+        'outline': [
+            {'level': block['level'], 'text': plain_text(block['runs']).strip()}
+            for block in blocks if block['type'] == 'heading'
+        ],
+        'content_hash': digest or content_hash(document),
+        'word_count': word_count,
+        'read_time': f"{max(1, word_count // WORDS_PER_MINUTE)} min",
+    }
+
+
+def apply_derived(document, defer=False):
+    """
+    Refresh derived fields in place when the content changed.
+
+    Returns True if the content hash changed. Documents loaded without their
+    body fields are left untouched. With ``defer`` only the hash is updated;
+    the caller queues ``document.tasks.refresh_document_text`` for the rest.
+    """
+    deferred = document.get_deferred_fields()
+    if deferred.intersection(SOURCE_FIELDS):
+        return False
+    digest = content_hash(document)
+    if digest == document.content_hash:
+        return False
+    if defer:
+        document.content_hash = digest
+        return True
+    for field, value in derive(document, digest).items():
+        setattr(document, field, value)
+    return True
@@ -0,0 +1,324 @@
+"""
+Document change events and the pub/sub broker that fans them out.
+
+Writers call ``publish_document_event`` (deferred to transaction commit);
+the SSE stream in ``DocumentEventStreamView`` subscribes to a document's
+channel and relays what it receives.
+
+The broker is selected by ``DOCUMENT_EVENT_BROKER`` (a dotted path).
+``InProcessBroker`` only reaches subscribers in the same process, so with
+several workers a client misses events written through the others; it is
+the default only without ``REDIS_URL``. ``RedisBroker`` publishes through
+Redis pub/sub and fans each message out to its process's subscribers from
+one listener thread. Redis does not keep messages for a disconnected
+listener, so after a lost connection every subscriber gets a ``resync``.
+
+Each subscription has a bounded queue. A subscriber that falls
+``DOCUMENT_EVENT_QUEUE_SIZE`` events behind is not allowed to hold memory
+or slow publishers down: its queue is dropped and it receives a single
+``resync`` event telling the client to refetch and reconnect.
+"""
+import asyncio
+import itertools
+import json
+import logging
+import threading
+import time
+
+import redis
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+
+CONTENT_UPDATED = 'document.content_updated'
+STATUS_CHANGED = 'document.status_changed'
+DELETED = 'document.deleted'
+RESTORED = 'document.restored'
+COMMENT_ADDED = 'comment.added'
+
+# Resync marker put on a lagging subscriber's queue.
+LAGGED = object()
+
+logger = logging.getLogger(__name__)
+
+# Fields whose loaded values Document.from_db remembers for change events.
+WATCHED_FIELDS = ('status', 'is_public')
+
+
+def channel_for(document_id):
+    return f'document:{document_id}'
+
+
+class Subscription:
+    """
+    One consumer of a channel, bound to the event loop it was created on.
+    """
+
+    def __init__(self, channel, maxsize):
+        self.channel = channel
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(maxsize)
+        self.lagged = False
+
+    def deliver(self, event):
+        # Runs on the subscriber's loop. Delivering LAGGED forces a resync.
+        if self.lagged:
+            return
+        if event is not LAGGED:
+            try:
+                self.queue.put_nowait(event)
+                return
+            except asyncio.QueueFull:
+                pass
+        self.lagged = True
+        while not self.queue.empty():
+            self.queue.get_nowait()
+        self.queue.put_nowait(LAGGED)
+
+    def push(self, event):
+        # Safe to call from any thread.
+        try:
+            self.loop.call_soon_threadsafe(self.deliver, event)
+        except RuntimeError:
+            # Loop already closed; the stream is gone.
+            pass
+
+    async def get(self):
+        return await self.queue.get()
+
+
+class Broker:
+    """
+    Interface for event brokers.
+    """
+
+    def publish(self, channel, event):
+        raise NotImplementedError
+
+    def subscribe(self, channel, maxsize):
+        """
+        Return a ``Subscription``. Called from within the subscriber's event loop.
+        """
+        raise NotImplementedError
+
+    def unsubscribe(self, subscription):
+        raise NotImplementedError
+
+    def stats(self):
+        """
+        Subscriber and backlog counts for health checks, where the broker knows them.
+        """
+        return {}
+
+
+class InProcessBroker(Broker):
+    def __init__(self):
+        self._subscriptions = {}
+        self._lock = threading.Lock()
+
+    def publish(self, channel, event):
+        with self._lock:
+            subscriptions = list(self._subscriptions.get(channel, ()))
+        for subscription in subscriptions:
+            subscription.push(event)
+
+    def subscribe(self, channel, maxsize):
+        subscription = Subscription(channel, maxsize)
+        with self._lock:
+            self._subscriptions.setdefault(channel, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscriptions = self._subscriptions.get(subscription.channel)
+            if subscriptions is not None:
+                subscriptions.discard(subscription)
+                if not subscriptions:
+                    del self._subscriptions[subscription.channel]
+
+    def subscriber_count(self, channel=None):
+        with self._lock:
+            if channel is not None:
+                return len(self._subscriptions.get(channel, ()))
+            return sum(len(subscriptions) for subscriptions in self._subscriptions.values())
+
+    def stats(self):
+        with self._lock:
+            subscriptions = [item for items in self._subscriptions.values() for item in items]
+        backlog = [subscription.queue.qsize() for subscription in subscriptions]
+        return {
+            'subscribers': len(subscriptions),
+            'queued_events': sum(backlog),
+            'max_queued_events': max(backlog, default=0),
+        }
+
+
+class RedisBroker(InProcessBroker):
+    """
+    Publishes through Redis pub/sub so subscribers in every process see
+    every event. Each process runs one listener thread, started by its first
+    subscription, that hands received events to the local subscriptions.
+    """
+    prefix = 'penpal:events:'
+    reconnect_delay = 1
+
+    def __init__(self):
+        super().__init__()
+        self._client = redis.Redis.from_url(settings.REDIS_URL)
+        self._listener = None
+
+    def publish(self, channel, event):
+        self._client.publish(self.prefix + channel, json.dumps(event, cls=DjangoJSONEncoder))
+
+    def subscribe(self, channel, maxsize):
+        with self._lock:
+            if self._listener is None:
+                self._listener = threading.Thread(target=self.listen, name='document-events', daemon=True)
+                self._listener.start()
+        return super().subscribe(channel, maxsize)
+
+    def dispatch(self, message):
+        channel = message['channel'].decode()[len(self.prefix):]
+        super().publish(channel, json.loads(message['data']))
+
+    def resync_all(self):
+        with self._lock:
+            subscriptions = [item for items in self._subscriptions.values() for item in items]
+        for subscription in subscriptions:
+            subscription.push(LAGGED)
+
+    def listen(self):
+        while True:
+            pubsub = self._client.pubsub(ignore_subscribe_messages=True)
+            try:
+                pubsub.psubscribe(self.prefix + '*')
+                for message in pubsub.listen():
+                    self.dispatch(message)
+            except redis.RedisError:
+                logger.warning("Lost the document event subscription; reconnecting", exc_info=True)
+            finally:
+                pubsub.close()
+            # Events published while disconnected are gone; clients must refetch.
+            self.resync_all()
+            time.sleep(self.reconnect_delay)
+
+
+_broker = None
+_broker_lock = threading.Lock()
+_event_ids = itertools.count(1)
+
+
+def get_broker():
+    global _broker
+    if _broker is None:
+        with _broker_lock:
+            if _broker is None:
+                _broker = import_string(settings.DOCUMENT_EVENT_BROKER)()
+    return _broker
+
+
+def publish_document_event(document_id, event_type, data=None):
+    """
+    Publish an event on the document's channel once the current transaction
+    commits (immediately outside a transaction).
+    """
+    event = {
+        'id': next(_event_ids),
+        'type': event_type,
+        'document': str(document_id),
+        'data': data or {},
+        'at': timezone.now().isoformat(),
+    }
+    transaction.on_commit(lambda: get_broker().publish(channel_for(document_id), event))
+
+
+def document_saved(document, created, content_changed, text_pending=False):
+    """
+    Publish the events implied by a ``Document.save()``. ``text_pending``
+    means the derived text fields (word count) are still being computed by
+    the task worker, so they are left out of the content event.
+    """
+    if created:
+        # Later saves of this instance compare against what was inserted.
+        document._loaded_state = {field: getattr(document, field) for field in WATCHED_FIELDS}
+        return
+    loaded = getattr(document, '_loaded_state', {})
+    changed = {
+        field: getattr(document, field)
+        for field in WATCHED_FIELDS
+        if field in loaded and loaded[field] != getattr(document, field)
+    }
+    if content_changed:
+        data = {'content_hash': document.content_hash}
+        if not text_pending:
+            data['word_count'] = document.word_count
+        publish_document_event(document.pk, CONTENT_UPDATED, data)
+    if changed:
+        publish_document_event(document.pk, STATUS_CHANGED, changed)
+    document._loaded_state = {
+        field: getattr(document, field) for field in WATCHED_FIELDS if field in loaded
+    }
+
+
+def comment_added(sender, instance, created, **kwargs):
+    """
+    post_save receiver for Comment.
+    """
+    if created:
+        publish_document_event(instance.document_id, COMMENT_ADDED, {
+            'comment': str(instance.pk),
+            'author': instance.author_id,
+        })
+
+
+def format_sse(event):
+    """
+    Encode an event as a Server-Sent Events frame.
+    """
+    return (
+        f"id: {event['id']}\n"
+        f"event: {event['type']}\n"
+        f"data: {json.dumps(event, cls=DjangoJSONEncoder, separators=(',', ':'))}\n\n"
+    )
+
+
+async def event_stream(document_id, user_id, author_id):
+    """
+    Relay a document's events as SSE frames until the client disconnects,
+    falls behind, loses access or the stream reaches its maximum age.
+    """
+    broker = get_broker()
+    subscription = broker.subscribe(channel_for(document_id), settings.DOCUMENT_EVENT_QUEUE_SIZE)
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + settings.DOCUMENT_EVENT_STREAM_MAX_AGE
+    try:
+        yield f"retry: {settings.DOCUMENT_EVENT_RETRY_MS}\n\n"
+        while True:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                return
+            try:
+                event = await asyncio.wait_for(
+                    subscription.get(),
+                    min(settings.DOCUMENT_EVENT_HEARTBEAT, remaining),
+                )
+            except asyncio.TimeoutError:
+                yield ": keep-alive\n\n"
+                continue
+            if event is LAGGED:
+                yield "event: resync\ndata: {}\n\n"
+                return
+            yield format_sse(event)
+            if event['type'] == DELETED or (
+                event['type'] == STATUS_CHANGED
+                and event['data'].get('is_public') is False
+                and user_id != author_id
+            ):
+                # Access is gone; the client must re-authorize to continue.
+                yield "event: revoked\ndata: {}\n\n"
+                return
+    finally:
+        broker.unsubscribe(subscription)
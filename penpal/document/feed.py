@@ -0,0 +1,402 @@
+"""
+Public feed: published public documents, newest first, served from cache.
+
+There is one feed of all documents, one per ``document_type`` and one per
+tag (by slug). Each is kept in the default cache as:
+
+- an index of ``(id, updated_at)`` pairs for its first
+  ``PUBLIC_FEED_MAX_ITEMS`` documents;
+- one rendered JSON fragment per document, shared by every feed;
+- its rendered pages of ``PUBLIC_FEED_PAGE_SIZE`` fragments, with ETags.
+
+A cached page is answered with one cache read and no query. A missing page
+is assembled from the index and fragments; only a missing index or fragment
+is read from the database.
+
+Changes are applied by the ``refresh_public_feed`` task, which
+``Document.save()``, tag changes and the bulk operations queue for every
+document entering, changing in or leaving the feed. For each cached feed the
+document may be in, the task moves it within the index and re-renders only
+the pages whose contents changed. Index and page writes hold a short lock
+per feed (``cache.add``); a feed whose lock cannot be had is dropped and
+rebuilt on the next request, as is a feed the refresh cannot update exactly.
+
+When tasks run in a separate worker the cache must be shared (REDIS_URL);
+with the per-process memory cache, web processes never see the refreshes.
+"""
+import hashlib
+import time
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from penpal.renderers import FastJSONRenderer
+
+
+TYPES = ('blog', 'tutorial', 'tech-doc', 'marketing', 'srs', 'other')
+LOCK_TIMEOUT = 10
+LOCK_WAIT = 2.0
+
+_renderer = FastJSONRenderer()
+
+
+def feed_key(document_type=None, tag=None):
+    if tag:
+        return f'tag:{tag}'
+    if document_type:
+        return f'type:{document_type}'
+    return 'all'
+
+
+def document_feed_keys(tags=()):
+    """
+    Every feed a document with ``tags`` (slugs) can appear in.
+    """
+    return ['all', *(feed_key(document_type=value) for value in TYPES), *(feed_key(tag=slug) for slug in tags)]
+
+
+def index_cache_key(key):
+    return f'feed:index:{key}'
+
+
+def page_cache_key(key, number):
+    return f'feed:page:{key}:{number}'
+
+
+def item_cache_key(document_id):
+    return f'feed:item:{document_id}'
+
+
+def page_count(items):
+    return max(1, -(-len(items) // settings.PUBLIC_FEED_PAGE_SIZE))
+
+
+def max_pages():
+    return -(-settings.PUBLIC_FEED_MAX_ITEMS // settings.PUBLIC_FEED_PAGE_SIZE)
+
+
+def page_slice(items, number):
+    size = settings.PUBLIC_FEED_PAGE_SIZE
+    return items[(number - 1) * size:number * size]
+
+
+def feed_queryset(key):
+    from .models import Document
+
+    queryset = Document.objects.filter(status='published', is_public=True)
+    kind, _, value = key.partition(':')
+    if kind == 'type':
+        queryset = queryset.filter(document_type=value)
+    elif kind == 'tag':
+        queryset = queryset.filter(tags__slug=value, tags__soft_delete=False)
+    return queryset
+
+
+def in_feed(document):
+    return document.status == 'published' and document.is_public and not document.soft_delete
+
+
+def in_feed_key(document, tags, key):
+    kind, _, value = key.partition(':')
+    if kind == 'type':
+        return document.document_type == value
+    if kind == 'tag':
+        return value in tags
+    return True
+
+
+# ---------------------------------------------------------------------------
+# Fragments and pages
+# ---------------------------------------------------------------------------
+
+def render_item(document):
+    from .serilaizers import PublicFeedItemSerializer
+
+    return _renderer.render(PublicFeedItemSerializer(document).data)
+
+
+def load_items(document_ids):
+    """
+    ``{id: fragment}`` for ``document_ids``, from the cache where possible;
+    the rest are rendered with one query and cached. Documents no longer in
+    the feed are left out.
+    """
+    cached = cache.get_many([item_cache_key(pk) for pk in document_ids])
+    fragments = {pk: cached[item_cache_key(pk)] for pk in document_ids if item_cache_key(pk) in cached}
+    missing = [pk for pk in document_ids if pk not in fragments]
+    if missing:
+        documents = (feed_queryset('all').filter(pk__in=missing)
+                     .select_related('author').prefetch_related('tags'))
+        rendered = {str(document.pk): render_item(document) for document in documents}
+        cache.set_many({item_cache_key(pk): fragment for pk, fragment in rendered.items()},
+                       settings.PUBLIC_FEED_CACHE_TIMEOUT)
+        fragments.update(rendered)
+    return fragments
+
+
+def render_page(ids, number, fragments):
+    """
+    ``(etag, body)`` of page ``number`` of the feed listing ``ids``.
+    """
+    items = b','.join(fragments[pk] for pk in page_slice(ids, number) if pk in fragments)
+    body = b'{"page":%d,"next":%s,"previous":%s,"results":[%s]}' % (
+        number,
+        b'null' if number >= page_count(ids) else b'%d' % (number + 1),
+        b'null' if number == 1 else b'%d' % (number - 1),
+        items,
+    )
+    return f'"{hashlib.sha256(body).hexdigest()[:32]}"', body
+
+
+def store_pages(key, ids, numbers):
+    """
+    Render and cache pages ``numbers`` of the feed listing ``ids``; pages
+    past its end are removed. Returns ``{number: (etag, body)}``.
+    """
+    pages = page_count(ids)
+    wanted = [number for number in numbers if number <= pages]
+    fragments = load_items([pk for number in wanted for pk in page_slice(ids, number)])
+    rendered = {number: render_page(ids, number, fragments) for number in wanted}
+    cache.set_many({page_cache_key(key, number): page for number, page in rendered.items()},
+                   settings.PUBLIC_FEED_CACHE_TIMEOUT)
+    stale = [page_cache_key(key, number) for number in numbers if number > pages]
+    if stale:
+        cache.delete_many(stale)
+    return rendered
+
+
+def build_index(key):
+    limit = settings.PUBLIC_FEED_MAX_ITEMS
+    rows = list(feed_queryset(key).order_by('-updated_at', '-id').values_list('id', 'updated_at')[:limit + 1])
+    return {
+        'items': [(str(pk), updated_at.timestamp()) for pk, updated_at in rows[:limit]],
+        # Whether the index holds every document of the feed.
+        'complete': len(rows) <= limit,
+    }
+
+
+def get_page(key, number):
+    """
+    ``(etag, body)`` of a feed page, or None if there is no such page.
+    """
+    from .models import Tag
+
+    if number > max_pages():
+        return None
+    page = cache.get(page_cache_key(key, number))
+    if page is not None:
+        return page
+
+    with feed_lock(key) as locked:
+        index = cache.get(index_cache_key(key))
+        if index is None:
+            index = build_index(key)
+            kind, _, value = key.partition(':')
+            if not index['items'] and kind == 'tag' and not Tag.objects.filter(slug=value).exists():
+                return None
+            if locked:
+                cache.set(index_cache_key(key), index, settings.PUBLIC_FEED_CACHE_TIMEOUT)
+        ids = [pk for pk, _ in index['items']]
+        if number > page_count(ids):
+            return None
+        if not locked:
+            # A refresh holds the feed; answer without caching a page it may be rewriting.
+            return render_page(ids, number, load_items(page_slice(ids, number)))
+        return store_pages(key, ids, [number])[number]
+
+
+# ---------------------------------------------------------------------------
+# Incremental refresh
+# ---------------------------------------------------------------------------
+
+class feed_lock:
+    """
+    Best-effort cross-process lock on one feed, via ``cache.add``. Entering
+    yields whether the lock was taken within ``LOCK_WAIT`` seconds.
+    """
+
+    def __init__(self, key):
+        self.cache_key = f'feed:lock:{key}'
+        self.token = uuid.uuid4().hex
+        self.locked = False
+
+    def __enter__(self):
+        deadline = time.monotonic() + LOCK_WAIT
+        while not cache.add(self.cache_key, self.token, LOCK_TIMEOUT):
+            if time.monotonic() >= deadline:
+                return False
+            time.sleep(0.02)
+        self.locked = True
+        return True
+
+    def __exit__(self, *exc_info):
+        if self.locked and cache.get(self.cache_key) == self.token:
+            cache.delete(self.cache_key)
+
+
+def drop_feeds(keys):
+    """
+    Forget the cached index and pages of ``keys``; they are rebuilt on request.
+    """
+    cache.delete_many([
+        cache_key for key in keys
+        for cache_key in (index_cache_key(key), *(page_cache_key(key, n) for n in range(1, max_pages() + 1)))
+    ])
+
+
+def reposition(index, document_id, entry):
+    """
+    Move ``document_id`` to ``entry`` (or out) within ``index``, in place.
+    Returns False when the index can no longer be kept exact.
+    """
+    items = [item for item in index['items'] if item[0] != document_id]
+    removed = len(items) < len(index['items'])
+    if entry is not None:
+        position = 0
+        while position < len(items) and (items[position][1], items[position][0]) > (entry[1], entry[0]):
+            position += 1
+        if position < len(items) or index['complete']:
+            items.insert(position, entry)
+        elif removed:
+            # Moved past the cut-off: whatever follows it there is unknown.
+            return False
+    limit = settings.PUBLIC_FEED_MAX_ITEMS
+    if len(items) > limit:
+        del items[limit:]
+        index['complete'] = False
+    elif removed and len(items) < limit and not index['complete']:
+        return False
+    index['items'] = items
+    return True
+
+
+def refresh_document(document_id, document, tags):
+    """
+    Bring every cached feed up to date with one document: ``document`` as
+    loaded now (None if gone) and the slugs of its live ``tags``.
+    """
+    visible = document is not None and in_feed(document)
+    if visible:
+        cache.set(item_cache_key(document_id), render_item(document), settings.PUBLIC_FEED_CACHE_TIMEOUT)
+    else:
+        cache.delete(item_cache_key(document_id))
+
+    for key in document_feed_keys(tags):
+        if visible and in_feed_key(document, tags, key):
+            entry = (document_id, document.updated_at.timestamp())
+        else:
+            entry = None
+        if cache.get(index_cache_key(key)) is None:
+            # Not cached: built from the database on the next request.
+            continue
+        with feed_lock(key) as locked:
+            index = cache.get(index_cache_key(key))
+            if index is None:
+                continue
+            before = [pk for pk, _ in index['items']]
+            if entry is None and document_id not in before:
+                continue
+            if not locked or not reposition(index, document_id, entry):
+                drop_feeds([key])
+                continue
+            cache.set(index_cache_key(key), index, settings.PUBLIC_FEED_CACHE_TIMEOUT)
+            after = [pk for pk, _ in index['items']]
+            # Pages whose documents changed, the page with this document
+            # (its fragment changed) and the last pages ("next" links).
+            numbers = {
+                number for number in range(1, max_pages() + 1)
+                if page_slice(before, number) != page_slice(after, number)
+                or document_id in page_slice(after, number)
+            } | {page_count(before), page_count(after)}
+            store_pages(key, after, sorted(numbers))
+
+
+# ---------------------------------------------------------------------------
+# Write hooks
+# ---------------------------------------------------------------------------
+
+def queue_refresh(document_ids):
+    from .tasks import refresh_public_feed
+
+    for pk in document_ids:
+        refresh_public_feed.enqueue(str(pk), dedup_key=f'public-feed:{pk}')
+
+
+def published_ids(document_ids):
+    """
+    The subset of ``document_ids`` currently in the feed.
+    """
+    return [str(pk) for pk in feed_queryset('all').filter(pk__in=document_ids).values_list('pk', flat=True)]
+
+
+def drop_tag_feeds(tag_ids):
+    """
+    Drop the feeds of ``tag_ids`` once the transaction commits; used when
+    documents leave a tag, which the refresh task cannot see afterwards.
+    """
+    from .models import Tag
+
+    keys = [feed_key(tag=slug) for slug in Tag.all_objects.filter(pk__in=tag_ids).values_list('slug', flat=True)]
+    if keys:
+        transaction.on_commit(lambda: drop_feeds(keys))
+
+
+def document_saved(document, created):
+    """
+    Called by ``Document.save()``, before the loaded state is reset: queue a
+    refresh if the document was or now is in the feed.
+    """
+    loaded = getattr(document, '_loaded_state', {})
+    state = getattr(document, '_stats_state', None)
+    if created:
+        was_in_feed = False
+    elif len(loaded) < 2 or state is None:
+        # Not loaded whole; assume it may have been.
+        was_in_feed = True
+    else:
+        was_in_feed = loaded['status'] == 'published' and loaded['is_public'] and not state[-1]
+    if was_in_feed or in_feed(document):
+        queue_refresh([document.pk])
+
+
+def document_deleting(sender, instance, **kwargs):
+    """
+    pre_delete receiver for Document; its tag links go without m2m signals.
+    """
+    if in_feed(instance):
+        drop_tag_feeds(instance.tags.values_list('pk', flat=True))
+        queue_refresh([instance.pk])
+
+
+def tags_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    """
+    m2m_changed receiver for ``Document.tags``, from either side.
+    """
+    if action not in ('post_add', 'post_remove', 'pre_clear'):
+        return
+    if reverse:
+        tag_ids = [instance.pk]
+        document_ids = pk_set if action != 'pre_clear' else instance.tagged_documents.values_list('pk', flat=True)
+    else:
+        tag_ids = pk_set if action != 'pre_clear' else instance.tags.values_list('pk', flat=True)
+        document_ids = [instance.pk]
+    document_ids = published_ids(document_ids)
+    if not document_ids:
+        return
+    if action != 'post_add':
+        drop_tag_feeds(tag_ids)
+    queue_refresh(document_ids)
+
+
+def tag_saved(sender, instance, created, **kwargs):
+    """
+    post_save receiver for Tag: a rename or soft delete changes the
+    fragments of its documents, and a deleted tag's feed goes away.
+    """
+    if created:
+        return
+    if instance.soft_delete:
+        drop_tag_feeds([instance.pk])
+    queue_refresh(published_ids(instance.tagged_documents.values_list('pk', flat=True)))
@@ -0,0 +1,176 @@
+"""
+Transparently compressed model fields for large document bodies.
+
+Values whose serialized size reaches ``threshold`` characters are stored as
+``MARKER + codec + base64(compressed bytes)``; smaller values are stored as-is,
+so existing rows stay readable and small documents stay searchable.
+
+Decompression is lazy: rows load the stored string wrapped in
+``CompressedValue`` and the field's descriptor decodes it on first attribute
+access. Saving an instance whose field was never read writes the stored
+string back without recompressing. ``values()``/``values_list()`` return the
+stored form.
+
+zstd (Python 3.14's ``compression.zstd``) is used when available, zlib
+otherwise; both codecs are always readable.
+"""
+import base64
+import json
+import zlib
+
+from django.db import models
+from django.db.models.query_utils import DeferredAttribute
+
+try:
+    from compression import zstd
+except ImportError:  # Python < 3.14
+    zstd = None
+
+
+MARKER = '\x1f'
+CODEC_ZLIB = 'z'
+CODEC_ZSTD = 's'
+DEFAULT_THRESHOLD = 4096
+
+
+class CompressedValue(str):
+    """
+    A value still in its stored (compressed) form.
+    """
+
+
+def compress(text):
+    data = text.encode()
+    if zstd is not None:
+        codec, packed = CODEC_ZSTD, zstd.compress(data, level=6)
+    else:
+        codec, packed = CODEC_ZLIB, zlib.compress(data, 6)
+    return MARKER + codec + base64.b64encode(packed).decode('ascii')
+
+
+def decompress(stored):
+    codec, packed = stored[1], base64.b64decode(stored[2:])
+    if codec == CODEC_ZSTD:
+        if zstd is None:
+            raise RuntimeError("zstd-compressed value requires Python 3.14+")
+        return zstd.decompress(packed).decode()
+    return zlib.decompress(packed).decode()
+
+
+def is_compressed(value):
+    return isinstance(value, str) and value.startswith(MARKER)
+
+
+class CompressedAttribute(DeferredAttribute):
+    """
+    Decode a ``CompressedValue`` on first access and cache the result.
+
+    Defines ``__set__`` so it is a data descriptor and ``__get__`` runs even
+    when the value is already in the instance ``__dict__``.
+    """
+
+    def __set__(self, instance, value):
+        instance.__dict__[self.field.attname] = value
+
+    def __get__(self, instance, cls=None):
+        if instance is None:
+            return self
+        value = super().__get__(instance, cls)
+        if isinstance(value, CompressedValue):
+            value = self.field.decode(value)
+            instance.__dict__[self.field.attname] = value
+        return value
+
+
+class CompressedFieldMixin:
+    descriptor_class = CompressedAttribute
+
+    def __init__(self, *args, threshold=DEFAULT_THRESHOLD, **kwargs):
+        self.threshold = threshold
+        super().__init__(*args, **kwargs)
+
+    def deconstruct(self):
+        name, path, args, kwargs = super().deconstruct()
+        if self.threshold != DEFAULT_THRESHOLD:
+            kwargs['threshold'] = self.threshold
+        return name, path, args, kwargs
+
+    def pre_save(self, model_instance, add):
+        # Read the raw slot so an untouched body is not decompressed just to
+        # be compressed again.
+        if self.attname in model_instance.__dict__:
+            return model_instance.__dict__[self.attname]
+        return super().pre_save(model_instance, add)
+
+    def needs_compression(self, value):
+        """
+        True for a loaded value that would be stored compressed but is not yet.
+        """
+        if value is None or isinstance(value, CompressedValue):
+            return False
+        return len(self.encode_text(value)) >= self.threshold or is_compressed(value)
+
+    def store(self, value):
+        text = self.encode_text(value)
+        # Plain values that happen to start with MARKER are always compressed
+        # so the stored form is never ambiguous.
+        if len(text) >= self.threshold or is_compressed(value):
+            return compress(text)
+        return value
+
+
+class CompressedTextField(CompressedFieldMixin, models.TextField):
+    """
+    TextField that stores large values compressed.
+    """
+
+    def encode_text(self, value):
+        return value
+
+    def decode(self, stored):
+        return decompress(stored)
+
+    def from_db_value(self, value, expression, connection):
+        if is_compressed(value):
+            return CompressedValue(value)
+        return value
+
+    def to_python(self, value):
+        if isinstance(value, CompressedValue):
+            return self.decode(value)
+        return super().to_python(value)
+
+    def get_prep_value(self, value):
+        if isinstance(value, CompressedValue):
+            return str(value)
+        value = super().get_prep_value(value)
+        if value is None:
+            return value
+        return self.store(value)
+
+
+class CompressedJSONField(CompressedFieldMixin, models.JSONField):
+    """
+    JSONField that stores large documents as a compressed JSON string.
+    """
+
+    def encode_text(self, value):
+        # Compact, so the stored text can be embedded in API responses as-is.
+        return json.dumps(value, cls=self.encoder, separators=(',', ':'), ensure_ascii=False)
+
+    def decode(self, stored):
+        return json.loads(decompress(stored), cls=self.decoder)
+
+    def from_db_value(self, value, expression, connection):
+        value = super().from_db_value(value, expression, connection)
+        if is_compressed(value):
+            return CompressedValue(value)
+        return value
+
+    def get_prep_value(self, value):
+        if isinstance(value, CompressedValue):
+            return str(value)
+        value = super().get_prep_value(value)
+        if value is None:
+            return value
+        return self.store(value)
@@ -0,0 +1,47 @@
+from django.core.management.base import BaseCommand
+
+from document.conditional import touch_documents
+from document.derived import DERIVED_FIELDS, apply_derived
+from document.models import Document
+
+
+class Command(BaseCommand):
+    help = "Compute plain text, excerpt, outline and content hash for existing documents, in batches."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help="Rows loaded and updated per batch.")
+        parser.add_argument('--force', action='store_true', help="Recompute even when the content hash matches.")
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        scanned = updated = 0
+        changed_documents = set()
+        last_pk = None
+        while True:
+            qs = Document.objects.order_by('pk')
+            if last_pk is not None:
+                qs = qs.filter(pk__gt=last_pk)
+            batch = list(qs[:batch_size])
+            if not batch:
+                break
+            last_pk = batch[-1].pk
+            scanned += len(batch)
+
+            changed = []
+            for document in batch:
+                if options['force']:
+                    document.content_hash = ''
+                if apply_derived(document):
+                    changed.append(document)
+            if changed:
+                # bulk_update skips save(), so no revisions are recorded and
+                # updated_at is left untouched.
+                Document.objects.bulk_update(changed, DERIVED_FIELDS)
+                changed_documents.update((document.author_id, document.is_public) for document in changed)
+            updated += len(changed)
+            self.stdout.write(f"scanned {scanned}, updated {updated}")
+
+        # Lists show the excerpt and word count.
+        touch_documents(changed_documents)
+
+        self.stdout.write(self.style.SUCCESS(f"Backfilled {updated} of {scanned} documents."))
@@ -0,0 +1,107 @@
+import json
+import random
+import time
+import tracemalloc
+import uuid
+
+from django.core.management.base import BaseCommand
+from django.test.utils import override_settings
+
+from document.collab import CollabSession
+
+
+def sample_blocks(count, rng):
+    words = ['lorem', 'ipsum', 'dolor', 'sit', 'amet', 'consectetur', 'adipiscing', 'elit']
+    return [
+        {
+            'id': str(uuid.UUID(int=rng.getrandbits(128))),
+            'type': 'heading' if index % 10 == 0 else 'paragraph',
+            'props': {'textColor': 'default', 'textAlignment': 'left'},
+            'content': [{'type': 'text', 'text': ' '.join(rng.choices(words, k=40)), 'styles': {}}],
+            'children': [],
+        }
+        for index in range(count)
+    ]
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure collaborative-editing throughput (operations per second with "
+        "concurrent clients) and memory per open document session."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--blocks', type=int, default=200, help="Blocks per synthetic BlockNote document.")
+        parser.add_argument('--clients', type=int, default=4, help="Concurrent editors per document.")
+        parser.add_argument('--ops', type=int, default=20000, help="Operations submitted in the throughput run.")
+        parser.add_argument('--batch', type=int, default=1, help="Operations per submission.")
+        parser.add_argument('--documents', type=int, default=50, help="Sessions opened for the memory run.")
+        parser.add_argument('--seed', type=int, default=1)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        raw = json.dumps(sample_blocks(options['blocks'], rng))
+        self.stdout.write(f"document: {options['blocks']} blocks, {len(raw) / 1024:.1f} KiB of JSON")
+
+        # Keep checkpoints out of the measurement; they go through Document.save().
+        with override_settings(COLLAB_CHECKPOINT_OPS=10 ** 9, COLLAB_CHECKPOINT_SECONDS=10 ** 9):
+            self.throughput(raw, options, rng)
+            self.memory(raw, options)
+
+    def throughput(self, raw, options, rng):
+        session = CollabSession(uuid.uuid4(), 'block_note_content', json.loads(raw))
+        blocks = options['blocks']
+        text_length = min(len(block['content'][0]['text']) for block in session.state)
+        clients = [0] * options['clients']
+        batch = options['batch']
+        submissions = max(1, options['ops'] // batch)
+
+        start = time.perf_counter()
+        transformed = 0
+        for number in range(submissions):
+            client = number % len(clients)
+            ops = []
+            for _ in range(batch):
+                # Inserts only, at positions that exist in every version, so
+                # each client can keep editing from a stale base.
+                if rng.random() < 0.05:
+                    ops.append({'p': [rng.randrange(blocks)], 'li': sample_blocks(1, rng)[0]})
+                else:
+                    ops.append({
+                        'p': [rng.randrange(blocks), 'content', 0, 'text', rng.randrange(text_length)],
+                        'si': rng.choice('abcdefgh '),
+                    })
+            transformed += session.version - clients[client]
+            clients[client], _ = session.submit(clients[client], ops, client=str(client))
+        elapsed = time.perf_counter() - start
+
+        total = submissions * batch
+        self.stdout.write(
+            f"throughput: {total} ops from {len(clients)} clients in {elapsed:.3f} s "
+            f"-> {total / elapsed:,.0f} ops/s, {submissions / elapsed:,.0f} submissions/s "
+            f"(avg {transformed / submissions:.1f} concurrent batches transformed per submission)"
+        )
+
+    def memory(self, raw, options):
+        count = options['documents']
+        tracemalloc.start()
+        baseline = tracemalloc.take_snapshot()
+        sessions = [
+            CollabSession(uuid.uuid4(), 'block_note_content', json.loads(raw))
+            for _ in range(count)
+        ]
+        opened = tracemalloc.take_snapshot()
+        for session in sessions:
+            for offset in range(100):
+                session.submit(session.version, [{'p': [0, 'content', 0, 'text', offset], 'si': 'x'}])
+        edited = tracemalloc.take_snapshot()
+        tracemalloc.stop()
+
+        def per_session(snapshot):
+            diff = sum(stat.size_diff for stat in snapshot.compare_to(baseline, 'filename'))
+            return diff / count / 1024
+
+        self.stdout.write(
+            f"memory: {per_session(opened):.1f} KiB per open document, "
+            f"{per_session(edited):.1f} KiB after 100 operations each ({count} sessions)"
+        )
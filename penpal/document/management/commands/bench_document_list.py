@@ -0,0 +1,118 @@
+import random
+import statistics
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Q
+
+from document.models import Document
+from document.visibility import combine, visible_parts
+
+
+INDEXES = ('documents_public_live_idx', 'documents_author_live_idx')
+FILTERS = (
+    {},
+    {'status': 'published'},
+    {'document_type': 'blog', 'status': 'draft'},
+    {'editor_type': 'markdown'},
+)
+PAGE_SIZE = 20
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare the document list's visibility query written as 'is_public OR "
+        "author = me' with the UNION ALL of index-backed parts it uses now "
+        "(document/visibility.py): first-page and count timings and whether each "
+        "plan uses the partial indexes, on synthetic documents. "
+        "Runs inside a transaction that is rolled back."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--documents', type=int, default=100000, help="Synthetic documents (e.g. 1000000).")
+        parser.add_argument('--users', type=int, default=1000, help="Authors the documents are spread over.")
+        parser.add_argument('--public-ratio', type=float, default=0.3, help="Share of public documents.")
+        parser.add_argument('--repeat', type=int, default=10)
+        parser.add_argument('--seed', type=int, default=1)
+        parser.add_argument('--strict', action='store_true',
+                            help="Fail unless every UNION ALL plan uses both partial indexes.")
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                self.run(options)
+                raise Rollback
+        except Rollback:
+            pass
+
+    def run(self, options):
+        rng = random.Random(options['seed'])
+        users = User.objects.bulk_create([
+            User(username=f'bench-list-{index}', password='!') for index in range(options['users'])
+        ])
+        if users[0].pk is None:
+            # The backend does not return primary keys from bulk inserts.
+            users = list(User.objects.filter(username__startswith='bench-list-'))
+        self.seed(users, options, rng)
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+
+        user = users[0]
+        base = Document.objects.select_related('author')
+        failures = []
+        for filters in FILTERS:
+            label = ', '.join(f'{field}={value}' for field, value in filters.items()) or 'no filters'
+            self.stdout.write(f"\n{label}")
+            old = base.filter(Q(is_public=True) | Q(author=user), **filters).order_by('-updated_at')
+            new = combine([part.filter(**filters) for part in visible_parts(base, user)]).order_by('-updated_at')
+            for name, queryset in (('OR', old), ('UNION ALL', new)):
+                page = queryset[:PAGE_SIZE]
+                self.report(f'{name} page', self.time(lambda: list(page.all()), options['repeat']))
+                self.report(f'{name} count', self.time(queryset.count, options['repeat']))
+                plan = page.explain()
+                used = [index for index in INDEXES if index in plan]
+                self.stdout.write(f"  indexes used: {', '.join(used) or 'none'}")
+                if options['verbosity'] > 1:
+                    self.stdout.write('  ' + plan.replace('\n', '\n  '))
+                if name == 'UNION ALL' and len(used) < len(INDEXES):
+                    failures.append(label)
+
+        if failures and options['strict']:
+            raise CommandError(f"UNION ALL plans missing a partial index: {'; '.join(failures)}")
+
+    def seed(self, users, options, rng):
+        types = [value for value, _ in Document._meta.get_field('document_type').choices]
+        editors = [value for value, _ in Document._meta.get_field('editor_type').choices]
+        statuses = [value for value, _ in Document._meta.get_field('status').choices]
+        total = options['documents']
+        start = time.perf_counter()
+        for offset in range(0, total, 5000):
+            Document.objects.bulk_create([
+                Document(
+                    author=rng.choice(users), title=f'Benchmark document {index}', content='<p>benchmark</p>',
+                    document_type=rng.choice(types), editor_type=rng.choice(editors), status=rng.choice(statuses),
+                    is_public=rng.random() < options['public_ratio'], soft_delete=rng.random() < 0.02,
+                )
+                for index in range(offset, min(offset + 5000, total))
+            ])
+        self.stdout.write(f"seeded {total} documents for {len(users)} users in {time.perf_counter() - start:.1f} s")
+
+    def time(self, run, repeat):
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            run()
+            timings.append(time.perf_counter() - start)
+        return timings
+
+    def report(self, label, timings):
+        self.stdout.write(
+            f"  {label:<18} median {statistics.median(timings) * 1000:8.2f} ms  "
+            f"min {min(timings) * 1000:8.2f} ms"
+        )
@@ -0,0 +1,47 @@
+from django.core.management.base import BaseCommand
+
+from document.models import Document
+
+
+COMPRESSED_FIELDS = ('content', 'content_json', 'block_note_content')
+
+
+class Command(BaseCommand):
+    help = "Compress existing document bodies that exceed the compression threshold, in batches."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help="Rows loaded and updated per batch.")
+        parser.add_argument('--dry-run', action='store_true', help="Report what would change without writing.")
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        dry_run = options['dry_run']
+        fields = [Document._meta.get_field(name) for name in COMPRESSED_FIELDS]
+
+        scanned = updated = 0
+        last_pk = None
+        while True:
+            qs = Document.objects.order_by('pk').only('pk', *COMPRESSED_FIELDS)
+            if last_pk is not None:
+                qs = qs.filter(pk__gt=last_pk)
+            batch = list(qs[:batch_size])
+            if not batch:
+                break
+            last_pk = batch[-1].pk
+            scanned += len(batch)
+
+            # Rows already stored compressed hold a CompressedValue in the raw
+            # slot; only plain values over the threshold are rewritten.
+            changed = [
+                doc for doc in batch
+                if any(field.needs_compression(doc.__dict__[field.attname]) for field in fields)
+            ]
+            if changed and not dry_run:
+                # bulk_update skips save(), so no revisions are recorded and
+                # updated_at is left untouched.
+                Document.objects.bulk_update(changed, COMPRESSED_FIELDS)
+            updated += len(changed)
+            self.stdout.write(f"scanned {scanned}, compressed {updated}")
+
+        verb = "Would compress" if dry_run else "Compressed"
+        self.stdout.write(self.style.SUCCESS(f"{verb} {updated} of {scanned} documents."))
@@ -0,0 +1,54 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from document.models import Comment, Document, MediaAsset, Tag
+
+
+# Children first so document cascades have less left to collect.
+PURGE_ORDER = (MediaAsset, Comment, Document, Tag)
+
+
+class Command(BaseCommand):
+    help = "Hard-delete soft-deleted rows older than the retention window, in batches."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days', type=int, default=settings.SOFT_DELETE_RETENTION_DAYS,
+            help="Retention window in days (default: SOFT_DELETE_RETENTION_DAYS)."
+        )
+        parser.add_argument('--batch-size', type=int, default=1000, help="Rows deleted per transaction.")
+        parser.add_argument('--dry-run', action='store_true', help="Count tombstones without deleting.")
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(days=options['days'])
+        batch_size = options['batch_size']
+
+        for model in PURGE_ORDER:
+            # The partial tombstone index covers (updated_at) WHERE soft_delete.
+            expired = model.all_objects.tombstones().filter(updated_at__lt=cutoff)
+            if options['dry_run']:
+                self.stdout.write(f"{model._meta.label}: {expired.count()} expired tombstones")
+                continue
+
+            purged = 0
+            while True:
+                pks = list(expired.order_by().values_list('pk', flat=True)[:batch_size])
+                if not pks:
+                    break
+                with transaction.atomic():
+                    if model is MediaAsset:
+                        self.delete_files(pks)
+                    model.all_objects.filter(pk__in=pks).delete()
+                purged += len(pks)
+            self.stdout.write(f"{model._meta.label}: purged {purged}")
+
+        self.stdout.write(self.style.SUCCESS("Purge complete."))
+
+    def delete_files(self, pks):
+        for asset in MediaAsset.all_objects.filter(pk__in=pks).only('pk', 'file'):
+            if asset.file:
+                asset.file.delete(save=False)
@@ -0,0 +1,56 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from document.models import UserDocumentStats
+from document.stats import COUNTER_FIELDS, compute, store
+
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = (
+        "Rebuild per-user document statistics from aggregate queries, in batches "
+        "of users, and report rows that had drifted from the incremental counts."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help="Users rebuilt per batch.")
+        parser.add_argument('--dry-run', action='store_true', help="Report drift without writing.")
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        scanned = drifted = 0
+        last_pk = None
+        while True:
+            users = User.objects.order_by('pk')
+            if last_pk is not None:
+                users = users.filter(pk__gt=last_pk)
+            user_ids = list(users.values_list('pk', flat=True)[:batch_size])
+            if not user_ids:
+                break
+            last_pk = user_ids[-1]
+            scanned += len(user_ids)
+
+            with transaction.atomic():
+                rows = compute(user_ids)
+                current = {
+                    values[0]: dict(zip(COUNTER_FIELDS, values[1:]))
+                    for values in UserDocumentStats.objects.filter(user_id__in=user_ids)
+                    .values_list('user_id', *COUNTER_FIELDS)
+                }
+                changed = {user_id: row for user_id, row in rows.items() if current.get(user_id) != row}
+                for user_id, row in changed.items():
+                    if user_id in current:
+                        drifted += 1
+                        if options['verbosity'] > 1:
+                            diff = {field: (current[user_id][field], value)
+                                    for field, value in row.items() if current[user_id][field] != value}
+                            self.stdout.write(f"user {user_id}: {diff}")
+                if changed and not options['dry_run']:
+                    store(changed)
+            self.stdout.write(f"scanned {scanned}, drifted {drifted}")
+
+        verb = "Found" if options['dry_run'] else "Rebuilt stats; corrected"
+        self.stdout.write(self.style.SUCCESS(f"{verb} {drifted} drifted rows across {scanned} users."))
@@ -0,0 +1,22 @@
+from django.db import models
+
+
+class SoftDeleteQuerySet(models.QuerySet):
+    def live(self):
+        return self.filter(soft_delete=False)
+
+    def tombstones(self):
+        return self.filter(soft_delete=True)
+
+
+class SoftDeleteManager(models.Manager.from_queryset(SoftDeleteQuerySet)):
+    """
+    Default manager that hides soft-deleted rows.
+
+    Being the default manager, it also filters related managers and
+    prefetches (``document.comments``, ``prefetch_related('tags')``). Use the
+    model's ``all_objects`` manager for admin, restore and purge.
+    """
+
+    def get_queryset(self):
+        return super().get_queryset().filter(soft_delete=False)
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.18 on 2026-10-19 15:17
+
+import django.db.models.deletion
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('document', '0002_comment_mediaasset_tag_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DocumentRevision',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('number', models.PositiveIntegerField()),
+                ('is_keyframe', models.BooleanField(default=False)),
+                ('data', models.BinaryField()),
+                ('size', models.PositiveIntegerField(default=0, help_text='Compressed payload size in bytes')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('document', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='revisions', to='document.document')),
+            ],
+            options={
+                'db_table': 'document_revisions',
+                'ordering': ['-number'],
+                'constraints': [models.UniqueConstraint(fields=('document', 'number'), name='document_revision_number_unique')],
+            },
+        ),
+    ]
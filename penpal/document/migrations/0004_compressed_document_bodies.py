@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-19 15:26
+
+import document.fields
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('document', '0003_documentrevision'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='document',
+            name='block_note_content',
+            field=document.fields.CompressedJSONField(blank=True, default=dict),
+        ),
+        migrations.AlterField(
+            model_name='document',
+            name='content',
+            field=document.fields.CompressedTextField(help_text='HTML content for TipTap editor'),
+        ),
+        migrations.AlterField(
+            model_name='document',
+            name='content_json',
+            field=document.fields.CompressedJSONField(blank=True, default=dict),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-19 15:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('document', '0004_compressed_document_bodies'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='document',
+            name='content_hash',
+            field=models.CharField(blank=True, editable=False, max_length=64),
+        ),
+        migrations.AddField(
+            model_name='document',
+            name='excerpt',
+            field=models.CharField(blank=True, editable=False, max_length=300),
+        ),
+        migrations.AddField(
+            model_name='document',
+            name='outline',
+            field=models.JSONField(blank=True, default=list, editable=False),
+        ),
+        migrations.AddField(
+            model_name='document',
+            name='plain_text',
+            field=models.TextField(blank=True, editable=False),
+        ),
+    ]
@@ -0,0 +1,63 @@
+# Generated by Django 5.2.18 on 2026-10-19 15:32
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('document', '0005_document_derived_text_fields'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='comment',
+            name='comments_soft_de_93792d_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='document',
+            name='documents_soft_de_800ac0_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='mediaasset',
+            name='media_asset_soft_de_0f66ec_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='tag',
+            name='tags_soft_de_3b7013_idx',
+        ),
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(condition=models.Q(('soft_delete', False)), fields=['document', '-updated_at'], name='comments_document_live_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(condition=models.Q(('soft_delete', True)), fields=['updated_at'], name='comments_tombstone_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='document',
+            index=models.Index(condition=models.Q(('is_public', True), ('soft_delete', False)), fields=['-updated_at'], name='documents_public_live_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='document',
+            index=models.Index(condition=models.Q(('soft_delete', False)), fields=['author', '-updated_at'], name='documents_author_live_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='document',
+            index=models.Index(condition=models.Q(('soft_delete', True)), fields=['updated_at'], name='documents_tombstone_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='mediaasset',
+            index=models.Index(condition=models.Q(('soft_delete', False)), fields=['document', '-updated_at'], name='media_assets_document_live_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='mediaasset',
+            index=models.Index(condition=models.Q(('soft_delete', True)), fields=['updated_at'], name='media_assets_tombstone_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='tag',
+            index=models.Index(condition=models.Q(('soft_delete', False)), fields=['-updated_at'], name='tags_live_idx'),
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 5.2.18 on 2026-10-19 16:15
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('document', '0006_soft_delete_managers_partial_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserDocumentStats',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='document_stats', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('documents', models.IntegerField(default=0)),
+                ('status_draft', models.IntegerField(default=0)),
+                ('status_published', models.IntegerField(default=0)),
+                ('status_archived', models.IntegerField(default=0)),
+                ('type_blog', models.IntegerField(default=0)),
+                ('type_tutorial', models.IntegerField(default=0)),
+                ('type_tech_doc', models.IntegerField(default=0)),
+                ('type_marketing', models.IntegerField(default=0)),
+                ('type_srs', models.IntegerField(default=0)),
+                ('type_other', models.IntegerField(default=0)),
+                ('word_count', models.BigIntegerField(default=0)),
+                ('comments_received', models.IntegerField(default=0)),
+                ('comments_written', models.IntegerField(default=0)),
+                ('updated_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'verbose_name_plural': 'User document stats',
+                'db_table': 'user_document_stats',
+            },
+        ),
+    ]
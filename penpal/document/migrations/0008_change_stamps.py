@@ -0,0 +1,25 @@
+# Generated by Django 5.2.18 on 2026-10-19 16:47
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('document', '0007_user_document_stats'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ChangeStamp',
+            fields=[
+                ('scope', models.CharField(max_length=100, primary_key=True, serialize=False)),
+                ('version', models.BigIntegerField(default=0)),
+                ('changed_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'db_table': 'change_stamps',
+            },
+        ),
+    ]
@@ -1,8 +1,16 @@
 import uuid
+from django.conf import settings
 from django.contrib.auth.models import User
 from django.db import models
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete
+from django.utils import timezone
 from django.utils.text import slugify
 
+from .events import WATCHED_FIELDS, comment_added, document_saved
+from .fields import CompressedJSONField, CompressedTextField
+from .managers import SoftDeleteManager, SoftDeleteQuerySet
+from . import conditional, feed, stats
+
 
 class Tag(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
@@ -13,11 +21,14 @@ class Tag(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = SoftDeleteManager()
+    all_objects = SoftDeleteQuerySet.as_manager()
+
     class Meta:
         ordering = ['-updated_at']
         indexes = [
             models.Index(fields=['name', 'slug']),
-            models.Index(fields=['soft_delete']),
+            models.Index(fields=['-updated_at'], condition=models.Q(soft_delete=False), name='tags_live_idx'),
         ]
         db_table = 'tags'
 
@@ -26,7 +37,7 @@ class Tag(models.Model):
             base_slug = slugify(self.name)
             slug = base_slug
             counter = 1
-            while Tag.objects.filter(slug=slug).exclude(pk=self.pk).exists():
+            while Tag.all_objects.filter(slug=slug).exclude(pk=self.pk).exists():
                 slug = f"{base_slug}-{counter}"
                 counter += 1
             self.slug = slug
@@ -42,9 +53,10 @@ class Document(models.Model):
 
     title = models.CharField(max_length=200)
     description = models.TextField(blank=True)
-    content = models.TextField(help_text="HTML content for TipTap editor")
-    content_json = models.JSONField(default=dict, blank=True)
-    block_note_content = models.JSONField(default=dict, blank=True)
+    # Large bodies are stored compressed and decompressed lazily on access.
+    content = CompressedTextField(help_text="HTML content for TipTap editor")
+    content_json = CompressedJSONField(default=dict, blank=True)
+    block_note_content = CompressedJSONField(default=dict, blank=True)
 
     document_type = models.CharField(
         max_length=50,
@@ -78,6 +90,12 @@ class Document(models.Model):
 
     word_count = models.PositiveIntegerField(default=0)
     read_time = models.CharField(max_length=20, blank=True)
+
+    # Derived at write time from the source content; see document/derived.py.
+    plain_text = models.TextField(blank=True, editable=False)
+    excerpt = models.CharField(max_length=300, blank=True, editable=False)
+    outline = models.JSONField(default=list, blank=True, editable=False)
+    content_hash = models.CharField(max_length=64, blank=True, editable=False)
     status = models.CharField(
         max_length=20,
         choices=[
@@ -94,6 +112,9 @@ class Document(models.Model):
     updated_at = models.DateTimeField(auto_now=True)
     soft_delete = models.BooleanField(default=False)
 
+    objects = SoftDeleteManager()
+    all_objects = SoftDeleteQuerySet.as_manager()
+
     class Meta:
         ordering = ['-updated_at']
         indexes = [
@@ -101,22 +122,93 @@ class Document(models.Model):
             models.Index(fields=['document_type', 'status']),
             models.Index(fields=['editor_type']),
             models.Index(fields=['created_at']),
-            models.Index(fields=['soft_delete']),
+            # Live rows only: the list is "public OR mine" ordered by updated_at.
+            models.Index(fields=['-updated_at'], condition=models.Q(soft_delete=False, is_public=True),
+                         name='documents_public_live_idx'),
+            models.Index(fields=['author', '-updated_at'], condition=models.Q(soft_delete=False),
+                         name='documents_author_live_idx'),
+            models.Index(fields=['updated_at'], condition=models.Q(soft_delete=True),
+                         name='documents_tombstone_idx'),
         ]
         unique_together = ('author', 'title')
         db_table = 'documents'
 
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Loaded values of the fields that change events compare against.
+        instance._loaded_state = {
+            field: instance.__dict__[field] for field in WATCHED_FIELDS if field in instance.__dict__
+        }
+        instance._stats_state = stats.tracked_state(instance)
+        return instance
+
     def save(self, *args, **kwargs):
-        if self.content:
-            self.word_count = len(self.content.split())
-            self.read_time = f"{max(1, self.word_count // 200)} min"
+        from .derived import DERIVED_FIELDS, TEXT_FIELDS, apply_derived
+        from .rendering import invalidate
+        from .revisions import record_revision
+        from .tasks import refresh_document_text
+
+        # Derived text fields, revisions and cached renderings only change
+        # when the content hash does. Parsing the body for the text fields is
+        # left to the task worker unless tasks run eagerly.
+        created = self._state.adding
+        previous_hash = self.__dict__.get('content_hash')
+        defer_text = not settings.TASKS_ALWAYS_EAGER
+        content_changed = apply_derived(self, defer=defer_text)
+        if defer_text and not created and not kwargs.get('force_insert') and kwargs.get('update_fields') is None:
+            # The worker owns the text columns; never write back what this
+            # instance loaded before the worker last updated them.
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in TEXT_FIELDS
+            ]
+        if content_changed and kwargs.get('update_fields') is not None:
+            kwargs['update_fields'] = set(kwargs['update_fields']).union(
+                ('content_hash',) if defer_text else DERIVED_FIELDS
+            )
         super().save(*args, **kwargs)
+        if content_changed:
+            record_revision(self)
+            if previous_hash:
+                invalidate(self.pk, previous_hash)
+            if defer_text:
+                refresh_document_text.enqueue(self.pk, dedup_key=f'document-text:{self.pk}')
+        feed.document_saved(self, created)
+        document_saved(self, created, content_changed, text_pending=content_changed and defer_text)
+        stats.document_saved(self, created)
 
     def __str__(self):
         return f"{self.title} ({self.author.username})"
 
 
+class DocumentRevision(models.Model):
+    """
+    One saved state of a document's content fields.
+
+    `data` is a compressed full snapshot for keyframes and a compressed delta
+    against the previous revision otherwise; see document/revisions.py.
+    """
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    document = models.ForeignKey('Document', on_delete=models.CASCADE, related_name='revisions')
+    number = models.PositiveIntegerField()
+    is_keyframe = models.BooleanField(default=False)
+    data = models.BinaryField()
+    size = models.PositiveIntegerField(default=0, help_text="Compressed payload size in bytes")
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['-number']
+        constraints = [
+            models.UniqueConstraint(fields=['document', 'number'], name='document_revision_number_unique')
+        ]
+        db_table = 'document_revisions'
+
+    def __str__(self):
+        return f"{self.document_id} r{self.number}"
+
+
 class Comment(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     document = models.ForeignKey('Document', on_delete=models.CASCADE, related_name='comments')
@@ -126,11 +218,17 @@ class Comment(models.Model):
     updated_at = models.DateTimeField(auto_now=True)
     soft_delete = models.BooleanField(default=False)
 
+    objects = SoftDeleteManager()
+    all_objects = SoftDeleteQuerySet.as_manager()
+
     class Meta:
         ordering = ['-updated_at']
         indexes = [
             models.Index(fields=['document', 'author']),
-            models.Index(fields=['soft_delete']),
+            models.Index(fields=['document', '-updated_at'], condition=models.Q(soft_delete=False),
+                         name='comments_document_live_idx'),
+            models.Index(fields=['updated_at'], condition=models.Q(soft_delete=True),
+                         name='comments_tombstone_idx'),
         ]
         constraints = [
             models.CheckConstraint(
@@ -140,9 +238,66 @@ class Comment(models.Model):
         ]
         db_table = 'comments'
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        if 'soft_delete' in instance.__dict__:
+            # Compared on save to count soft deletes in the author statistics.
+            instance._loaded_soft_delete = instance.soft_delete
+        return instance
+
     def __str__(self):
         return f"{self.body[:10]} - ({self.document.title[:10]}) - ({self.author.username})"
 
+
+class UserDocumentStats(models.Model):
+    """
+    Dashboard totals for one author, kept current by document/stats.py.
+
+    Counts cover live documents; comment totals cover live comments on live
+    documents.
+    """
+    user = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True, related_name='document_stats')
+    documents = models.IntegerField(default=0)
+    status_draft = models.IntegerField(default=0)
+    status_published = models.IntegerField(default=0)
+    status_archived = models.IntegerField(default=0)
+    type_blog = models.IntegerField(default=0)
+    type_tutorial = models.IntegerField(default=0)
+    type_tech_doc = models.IntegerField(default=0)
+    type_marketing = models.IntegerField(default=0)
+    type_srs = models.IntegerField(default=0)
+    type_other = models.IntegerField(default=0)
+    word_count = models.BigIntegerField(default=0)
+    comments_received = models.IntegerField(default=0)
+    comments_written = models.IntegerField(default=0)
+    updated_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        db_table = 'user_document_stats'
+        verbose_name_plural = 'User document stats'
+
+    def __str__(self):
+        return f"Stats for user {self.user_id}"
+
+
+class ChangeStamp(models.Model):
+    """
+    Version of a scope of rows (public documents, one author's documents,
+    ...), replaced after every committed change in it; list validators read
+    it instead of aggregating (document/conditional.py).
+    """
+    scope = models.CharField(max_length=100, primary_key=True)
+    version = models.BigIntegerField(default=0)
+    changed_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        db_table = 'change_stamps'
+
+    def __str__(self):
+        return f"{self.scope} v{self.version}"
+
+
 class MediaAsset(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     document = models.ForeignKey('Document', on_delete=models.CASCADE, related_name='media_assets')
@@ -164,11 +319,17 @@ class MediaAsset(models.Model):
     updated_at = models.DateTimeField(auto_now=True)
     soft_delete = models.BooleanField(default=False)
 
+    objects = SoftDeleteManager()
+    all_objects = SoftDeleteQuerySet.as_manager()
+
     class Meta:
         ordering = ['-updated_at']
         indexes = [
             models.Index(fields=['document', 'owner']),
-            models.Index(fields=['soft_delete']),
+            models.Index(fields=['document', '-updated_at'], condition=models.Q(soft_delete=False),
+                         name='media_assets_document_live_idx'),
+            models.Index(fields=['updated_at'], condition=models.Q(soft_delete=True),
+                         name='media_assets_tombstone_idx'),
         ]
         db_table = 'media_assets'
         # If you use external storage (e.g., S3), allow file or url but not both empty.
@@ -183,3 +344,16 @@ class MediaAsset(models.Model):
         filename = self.file.name.split('/')[-1] if self.file else "No file"
         return f"{filename} ({self.file_type}) - {self.document.title[:20]}"
 
+
+post_save.connect(comment_added, sender=Comment)
+post_save.connect(stats.comment_saved, sender=Comment)
+pre_delete.connect(stats.document_deleting, sender=Document)
+pre_delete.connect(feed.document_deleting, sender=Document)
+post_save.connect(feed.tag_saved, sender=Tag)
+m2m_changed.connect(feed.tags_changed, sender=Document.tags.through)
+post_save.connect(conditional.document_changed, sender=Document)
+post_delete.connect(conditional.document_changed, sender=Document)
+post_save.connect(conditional.comment_changed, sender=Comment)
+post_save.connect(conditional.tag_changed, sender=Tag)
+post_delete.connect(conditional.tag_changed, sender=Tag)
+m2m_changed.connect(conditional.tags_changed, sender=Document.tags.through)
@@ -21,6 +21,20 @@ class DocumentPermission(permissions.BasePermission):
         return obj.author == request.user
 
 
+class CollabPermission(DocumentPermission):
+    """
+    Collaborative editing sessions:
+    - SAFE: as for the document
+    - Submit operations: the owner, or any signed-in user when the document is
+      public and allows editing
+    """
+
+    def has_object_permission(self, request, view, obj):
+        if request.method not in permissions.SAFE_METHODS and obj.is_public and obj.allow_editing:
+            return True
+        return super().has_object_permission(request, view, obj)
+
+
 # ----------------------------
 # COMMENT-LEVEL PERMISSIONS
 # ----------------------------
@@ -0,0 +1,93 @@
+"""
+Memoized derived-format rendering for documents.
+
+Results are keyed by ``(document id, content hash, source format, target
+format)`` and kept in a bounded in-process LRU in front of the shared Django
+cache. The hash is already loaded with the document, so a lookup costs no
+query. ``Document.save()`` calls ``invalidate`` with the superseded hash
+whenever the content changes.
+"""
+import threading
+from collections import OrderedDict
+
+from django.core.cache import cache
+
+from .converters import FORMATS, convert, source_of
+from .derived import content_hash
+
+
+RENDER_CACHE_TIMEOUT = 60 * 60 * 24
+LRU_MAXSIZE = 128
+
+
+class LRUCache:
+    """
+    Thread-safe, size-bounded mapping that evicts the least recently used key.
+    """
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            try:
+                self._data.move_to_end(key)
+            except KeyError:
+                return default
+            return self._data[key]
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def discard_where(self, predicate):
+        with self._lock:
+            for key in [key for key in self._data if predicate(key)]:
+                del self._data[key]
+
+
+_lru = LRUCache(LRU_MAXSIZE)
+
+
+def cache_key(document_id, version, source, target):
+    return f'docformat:{document_id}:{version}:{source}:{target}'
+
+
+def render(document, target):
+    """
+    Return the document's content converted to ``target``.
+    """
+    source, value = source_of(document)
+    if source == target:
+        return value
+
+    # Rows saved before content hashes existed are hashed on the fly.
+    version = document.content_hash or content_hash(document)
+    key = cache_key(document.pk, version, source, target)
+    result = _lru.get(key)
+    if result is not None:
+        return result
+
+    result = cache.get(key)
+    if result is None:
+        result = convert(value, source, target)
+        cache.set(key, result, RENDER_CACHE_TIMEOUT)
+    _lru.set(key, result)
+    return result
+
+
+def invalidate(document_id, version):
+    """
+    Drop cached renderings of ``version`` (the content hash just superseded).
+    """
+    cache.delete_many([
+        cache_key(document_id, version, source, target)
+        for source in FORMATS for target in FORMATS
+    ])
+    prefix = f'docformat:{document_id}:'
+    _lru.discard_where(lambda key: key.startswith(prefix))
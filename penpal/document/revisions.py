@@ -0,0 +1,238 @@
+"""
+Compact revision storage for documents.
+
+Each revision stores a zlib-compressed payload. Keyframes hold a full
+snapshot of the tracked fields; every other revision holds a token-level delta
+against the revision before it. Reconstruction loads the nearest keyframe at
+or before the requested number and replays at most ``KEYFRAME_INTERVAL - 1``
+deltas on top of it.
+
+Text is tokenized at tag ends and newlines (JSON fields are dumped with one
+value per line), so diffs stay cheap on large editor documents.
+
+Delta ops are a list of: positive int (copy N tokens), negative int (skip N
+tokens) or str (insert text).
+
+The latest snapshot of each document is cached under the id of its
+revision, so recording the next revision diffs against it without replaying
+the chain; a cached snapshot whose revision is no longer the latest is
+ignored.
+"""
+import difflib
+import json
+import re
+import zlib
+
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+
+
+TRACKED_FIELDS = ('content', 'content_json', 'block_note_content')
+JSON_FIELDS = ('content_json', 'block_note_content')
+
+KEYFRAME_INTERVAL = 20
+
+HEAD_CACHE_TIMEOUT = 60 * 60
+
+_TOKEN_RE = re.compile(r'(?<=[>\n])')
+
+
+def tokenize(text):
+    return [token for token in _TOKEN_RE.split(text) if token]
+
+
+def snapshot(document):
+    """
+    Return the tracked fields of ``document`` as a dict of strings.
+    """
+    data = {}
+    for field in TRACKED_FIELDS:
+        value = getattr(document, field)
+        if field in JSON_FIELDS:
+            value = json.dumps(value, sort_keys=True, indent=0, ensure_ascii=False)
+        data[field] = value or ''
+    return data
+
+
+def restore(data):
+    """
+    Inverse of ``snapshot``: decode JSON fields back to Python values.
+    """
+    return {
+        field: json.loads(value) if field in JSON_FIELDS else value
+        for field, value in data.items()
+    }
+
+
+def compute_delta(old, new):
+    old_tokens, new_tokens = tokenize(old), tokenize(new)
+
+    # Edits are usually local; only run the matcher over the changed middle.
+    prefix = 0
+    limit = min(len(old_tokens), len(new_tokens))
+    while prefix < limit and old_tokens[prefix] == new_tokens[prefix]:
+        prefix += 1
+    suffix = 0
+    while (suffix < limit - prefix
+           and old_tokens[-1 - suffix] == new_tokens[-1 - suffix]):
+        suffix += 1
+
+    ops = [prefix] if prefix else []
+    old_middle = old_tokens[prefix:len(old_tokens) - suffix]
+    new_middle = new_tokens[prefix:len(new_tokens) - suffix]
+    matcher = difflib.SequenceMatcher(None, old_middle, new_middle)
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == 'equal':
+            ops.append(i2 - i1)
+            continue
+        if i2 > i1:
+            ops.append(-(i2 - i1))
+        if j2 > j1:
+            ops.append(''.join(new_middle[j1:j2]))
+    if suffix:
+        ops.append(suffix)
+    return ops
+
+
+def apply_delta(tokens, ops):
+    """
+    Apply ``ops`` to a token list and return the new token list.
+
+    Replay stays in token form so a chain of deltas is not re-tokenized at
+    every step; tokenizing the joined result yields the same list.
+    """
+    position = 0
+    result = []
+    for op in ops:
+        if isinstance(op, str):
+            result.extend(tokenize(op))
+        elif op > 0:
+            result.extend(tokens[position:position + op])
+            position += op
+        else:
+            position -= op
+    return result
+
+
+def pack(payload):
+    return zlib.compress(json.dumps(payload, separators=(',', ':'), ensure_ascii=False).encode(), 6)
+
+
+def unpack(data):
+    return json.loads(zlib.decompress(bytes(data)))
+
+
+def reconstruct(document_id, number):
+    """
+    Return the snapshot dict (strings) for revision ``number`` of a document,
+    or None if it does not exist.
+    """
+    from .models import DocumentRevision
+
+    keyframe = (DocumentRevision.objects
+                .filter(document_id=document_id, number__lte=number, is_keyframe=True)
+                .order_by('-number')
+                .values_list('number', flat=True)
+                .first())
+    if keyframe is None:
+        return None
+
+    rows = (DocumentRevision.objects
+            .filter(document_id=document_id, number__gte=keyframe, number__lte=number)
+            .order_by('number')
+            .values_list('number', 'data'))
+    state = None
+    last = None
+    for last, data in rows:
+        payload = unpack(data)
+        if state is None:
+            state = {field: tokenize(value) for field, value in payload.items()}
+            continue
+        for field, ops in payload.items():
+            state[field] = apply_delta(state[field], ops)
+    if last != number:
+        return None
+    return {field: ''.join(tokens) for field, tokens in state.items()}
+
+
+def head_cache_key(document_id):
+    return f'revision-head:{document_id}'
+
+
+def latest_snapshot(document_id, revision_id, number):
+    """
+    The snapshot of the latest revision, from the cache when it holds that
+    revision, else reconstructed.
+    """
+    cached = cache.get(head_cache_key(document_id))
+    if cached is not None and cached[0] == str(revision_id):
+        return unpack(cached[1])
+    return reconstruct(document_id, number)
+
+
+def record_revision(document):
+    """
+    Store the current tracked fields of ``document`` as a new revision.
+
+    Does nothing when the tracked fields match the latest revision.
+    """
+    from .models import DocumentRevision
+
+    latest = (DocumentRevision.objects
+              .filter(document_id=document.pk)
+              .order_by('-number')
+              .values_list('pk', 'number')
+              .first())
+    current = snapshot(document)
+
+    if latest is None:
+        number, is_keyframe, payload = 1, True, current
+    else:
+        latest_id, latest = latest
+        previous = latest_snapshot(document.pk, latest_id, latest)
+        changed = {field: value for field, value in current.items() if previous.get(field) != value}
+        if not changed:
+            return None
+        number = latest + 1
+        is_keyframe = (number - 1) % KEYFRAME_INTERVAL == 0
+        if is_keyframe:
+            payload = current
+        else:
+            payload = {field: compute_delta(previous[field], value) for field, value in changed.items()}
+
+    data = pack(payload)
+    try:
+        with transaction.atomic():
+            revision = DocumentRevision.objects.create(
+                document_id=document.pk,
+                number=number,
+                is_keyframe=is_keyframe,
+                data=data,
+                size=len(data),
+            )
+    except IntegrityError:
+        # A concurrent save recorded this number first; retry on top of it.
+        return record_revision(document)
+    # Keyed by the revision id, so an entry left by a rolled-back save never
+    # matches a revision that exists.
+    cache.set(head_cache_key(document.pk), (str(revision.pk), data if is_keyframe else pack(current)),
+              HEAD_CACHE_TIMEOUT)
+    return revision
+
+
+def unified_diff(old, new, old_label, new_label):
+    """
+    Return a per-field unified diff between two snapshots.
+    """
+    diff = {}
+    for field in TRACKED_FIELDS:
+        lines = list(difflib.unified_diff(
+            tokenize(old.get(field, '')),
+            tokenize(new.get(field, '')),
+            fromfile=old_label,
+            tofile=new_label,
+            lineterm='',
+        ))
+        if lines:
+            diff[field] = '\n'.join(line.rstrip('\n') for line in lines)
+    return diff
@@ -1,8 +1,40 @@
 # serializers.py
+from django.core.exceptions import ValidationError as DjangoValidationError
 from django.db import IntegrityError
 from rest_framework import serializers
+from rest_framework.validators import UniqueValidator
 
-from .models import Document, Tag, Comment
+from penpal.renderers import RawJSON
+
+from .bulk import BULK_UPDATE_FIELDS, MAX_BATCH_SIZE
+from .converters import check_blocknote, check_tiptap
+from .fields import CompressedJSONField, CompressedValue, decompress
+from .models import Document, Tag, Comment, DocumentRevision
+
+
+class StoredJSONField(serializers.JSONField):
+    """
+    Passes a value that is still in its compressed stored form through to the
+    renderer as raw JSON, instead of decoding and re-encoding it.
+    """
+
+    def get_attribute(self, instance):
+        if len(self.source_attrs) == 1:
+            stored = instance.__dict__.get(self.source_attrs[0])
+            if isinstance(stored, CompressedValue):
+                return RawJSON(decompress(stored))
+        return super().get_attribute(instance)
+
+    def to_representation(self, value):
+        if isinstance(value, RawJSON):
+            return value
+        return super().to_representation(value)
+
+
+STORED_JSON_FIELD_MAPPING = {
+    **serializers.ModelSerializer.serializer_field_mapping,
+    CompressedJSONField: StoredJSONField,
+}
 
 
 class TagSerializer(serializers.ModelSerializer):
@@ -10,6 +42,10 @@ class TagSerializer(serializers.ModelSerializer):
         model = Tag
         fields = ['id', 'name', 'slug']
         read_only_fields = ['id', 'slug']
+        extra_kwargs = {
+            # The unique constraint also covers soft-deleted tags.
+            'name': {'validators': [UniqueValidator(queryset=Tag.all_objects.all())]},
+        }
 
 
 class CommentSerializer(serializers.ModelSerializer):
@@ -28,6 +64,7 @@ class CommentSerializer(serializers.ModelSerializer):
 
 
 class DocumentSerializer(serializers.ModelSerializer):
+    serializer_field_mapping = STORED_JSON_FIELD_MAPPING
     author_username = serializers.CharField(source='author.username', read_only=True)
     tags = TagSerializer(many=True, read_only=True)
     tag_ids = serializers.PrimaryKeyRelatedField(
@@ -61,6 +98,20 @@ class DocumentSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError("Tags must be a list")
         return value
 
+    def validate_content_json(self, value):
+        try:
+            check_tiptap(value)
+        except ValueError as exc:
+            raise serializers.ValidationError(str(exc))
+        return value
+
+    def validate_block_note_content(self, value):
+        try:
+            check_blocknote(value)
+        except ValueError as exc:
+            raise serializers.ValidationError(str(exc))
+        return value
+
     def create(self, validated_data):
         tags = validated_data.pop('tags', [])
         try:
@@ -73,6 +124,7 @@ class DocumentSerializer(serializers.ModelSerializer):
 
 
 class DocumentListSerializer(serializers.ModelSerializer):
+    serializer_field_mapping = STORED_JSON_FIELD_MAPPING
     author_username = serializers.CharField(source='author.username', read_only=True)
     comment_count = serializers.IntegerField(source='comments.count', read_only=True)
     tags = TagSerializer(many=True, read_only=True)
@@ -84,7 +136,7 @@ class DocumentListSerializer(serializers.ModelSerializer):
             'title', 'description', 'content', 'content_json', 'block_note_content',
             'document_type', 'editor_type', 'is_public',
             'allow_comments', 'allow_sharing', 'allow_editing',
-            'word_count', 'read_time', 'status', 'tags', 'comment_count',
+            'word_count', 'read_time', 'excerpt', 'outline', 'status', 'tags', 'comment_count',
             'created_at', 'updated_at', 'soft_delete'
         ]
         read_only_fields = ['id', 'author', 'word_count', 'read_time', 'created_at', 'updated_at']
@@ -128,3 +180,95 @@ class DocumentDetailSerializer(serializers.ModelSerializer):
             instance.tags.set(tags)
         return instance
 
+
+
+class DocumentRevisionSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = DocumentRevision
+        fields = ['number', 'is_keyframe', 'size', 'created_at']
+        read_only_fields = fields
+
+
+class DocumentSummarySerializer(serializers.ModelSerializer):
+    author_username = serializers.CharField(source='author.username', read_only=True)
+
+    class Meta:
+        model = Document
+        fields = [
+            'id', 'author', 'author_username', 'title', 'description',
+            'excerpt', 'outline', 'word_count', 'read_time', 'content_hash',
+            'document_type', 'editor_type', 'status', 'updated_at'
+        ]
+        read_only_fields = fields
+
+
+class PublicFeedItemSerializer(serializers.ModelSerializer):
+    """
+    One public feed entry (document/feed.py); rendered once and cached.
+    """
+    author_username = serializers.CharField(source='author.username', read_only=True)
+    tags = TagSerializer(many=True, read_only=True)
+
+    class Meta:
+        model = Document
+        fields = [
+            'id', 'author_username', 'title', 'description', 'excerpt',
+            'document_type', 'editor_type', 'tags', 'word_count', 'read_time',
+            'created_at', 'updated_at'
+        ]
+        read_only_fields = fields
+
+
+class DocumentIdsSerializer(serializers.Serializer):
+    ids = serializers.ListField(
+        child=serializers.UUIDField(),
+        allow_empty=False,
+        max_length=MAX_BATCH_SIZE,
+    )
+
+
+class DocumentBulkSerializer(DocumentIdsSerializer):
+    """
+    ``{"ids": [...], "action": "update", "fields": {"status": "archived"}}`` or
+    ``{"ids": [...], "action": "add_tags" | "remove_tags", "tag_ids": [...]}``.
+    """
+    action = serializers.ChoiceField(choices=['update', 'add_tags', 'remove_tags'])
+    fields = serializers.DictField(required=False)
+    tag_ids = serializers.ListField(child=serializers.UUIDField(), required=False, allow_empty=False)
+
+    def validate_fields(self, value):
+        unknown = set(value) - set(BULK_UPDATE_FIELDS)
+        if unknown:
+            raise serializers.ValidationError(
+                f"Unsupported fields: {', '.join(sorted(unknown))}. "
+                f"Allowed: {', '.join(BULK_UPDATE_FIELDS)}"
+            )
+        cleaned = {}
+        for name, raw in value.items():
+            try:
+                cleaned[name] = Document._meta.get_field(name).clean(raw, None)
+            except DjangoValidationError as exc:
+                raise serializers.ValidationError({name: exc.messages})
+        return cleaned
+
+    def validate_tag_ids(self, value):
+        value = list(dict.fromkeys(value))
+        found = set(Tag.objects.filter(pk__in=value).values_list('pk', flat=True))
+        missing = [str(pk) for pk in value if pk not in found]
+        if missing:
+            raise serializers.ValidationError(f"Unknown tags: {', '.join(missing)}")
+        return value
+
+    def validate(self, attrs):
+        if attrs['action'] == 'update':
+            if not attrs.get('fields'):
+                raise serializers.ValidationError({'fields': "This field is required for update."})
+        elif not attrs.get('tag_ids'):
+            raise serializers.ValidationError({'tag_ids': "This field is required for tag actions."})
+        return attrs
+
+
+class CollabOperationsSerializer(serializers.Serializer):
+    version = serializers.IntegerField(min_value=0)
+    ops = serializers.ListField(child=serializers.DictField(), allow_empty=False, max_length=500)
+    client = serializers.CharField(required=False, allow_blank=True, max_length=64)
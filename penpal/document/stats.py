@@ -0,0 +1,246 @@
+"""
+Per-author document statistics, maintained incrementally.
+
+Each author's ``UserDocumentStats`` row holds live document counts by status
+and type, their total word count, and live comments received on those
+documents and written by the author (a comment counts while both it and its
+document are live). Every write path applies the difference it makes as one
+``UPDATE ... SET col = col + delta`` per affected author:
+
+- ``Document.save()`` compares the loaded and saved author, status, type,
+  word count and soft-delete flag (``document_saved``);
+- bulk soft-delete/restore and field updates count each chunk before and
+  after the change (``document/bulk.py``);
+- the deferred text task adjusts word counts (``document/tasks.py``);
+- comment creation and soft deletion adjust comment totals
+  (``comment_saved``), and a hard-deleted live document is subtracted with
+  its comments (``document_deleting``).
+
+Deltas for a user without a row are dropped: the row is built from
+aggregates the first time it is read (``get_stats``). Hard deletes of single
+comments and of users are not tracked; ``manage.py reconcile_document_stats``
+rebuilds every row in bulk and reports drift.
+"""
+from collections import defaultdict
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Q, Sum
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+
+STATUS_FIELDS = {
+    'draft': 'status_draft',
+    'published': 'status_published',
+    'archived': 'status_archived',
+}
+TYPE_FIELDS = {
+    'blog': 'type_blog',
+    'tutorial': 'type_tutorial',
+    'tech-doc': 'type_tech_doc',
+    'marketing': 'type_marketing',
+    'srs': 'type_srs',
+    'other': 'type_other',
+}
+COUNTER_FIELDS = (
+    'documents', *STATUS_FIELDS.values(), *TYPE_FIELDS.values(),
+    'word_count', 'comments_received', 'comments_written',
+)
+# Document fields whose loaded values Document.from_db remembers for stats.
+TRACKED_FIELDS = ('author_id', 'status', 'document_type', 'word_count', 'soft_delete')
+
+
+def new_deltas():
+    return defaultdict(lambda: defaultdict(int))
+
+
+def apply(deltas):
+    """
+    Apply ``{user_id: {field: delta}}`` with one UPDATE per user.
+    """
+    from .models import UserDocumentStats
+
+    now = timezone.now()
+    for user_id, row in deltas.items():
+        changes = {field: F(field) + delta for field, delta in row.items() if delta}
+        if changes:
+            UserDocumentStats.objects.filter(user_id=user_id).update(updated_at=now, **changes)
+
+
+def add_document(deltas, state, sign=1):
+    """
+    Add (``sign=-1``: remove) one document, given its ``TRACKED_FIELDS`` values.
+    """
+    author_id, status, document_type, word_count, soft_delete = state
+    if soft_delete:
+        return
+    row = deltas[author_id]
+    row['documents'] += sign
+    row['word_count'] += sign * (word_count or 0)
+    if status in STATUS_FIELDS:
+        row[STATUS_FIELDS[status]] += sign
+    if document_type in TYPE_FIELDS:
+        row[TYPE_FIELDS[document_type]] += sign
+
+
+def add_documents(deltas, document_ids, sign=1):
+    from .models import Document
+
+    for state in Document.all_objects.filter(pk__in=document_ids).values_list(*TRACKED_FIELDS):
+        add_document(deltas, state, sign)
+
+
+def add_comments(deltas, document_ids, sign=1, recipient_id=None):
+    """
+    Add the live comments on ``document_ids``: to each writer's written count
+    and to the document author's (or ``recipient_id``'s) received count.
+    """
+    from .models import Comment
+
+    rows = (Comment.objects.filter(document_id__in=document_ids)
+            .values_list('document__author_id', 'author_id')
+            .annotate(count=Count('pk')).order_by())
+    for document_author_id, writer_id, count in rows:
+        deltas[recipient_id or document_author_id]['comments_received'] += sign * count
+        deltas[writer_id]['comments_written'] += sign * count
+
+
+def tracked_state(document):
+    """
+    ``TRACKED_FIELDS`` values of ``document``, or None if any is deferred.
+    """
+    if document.get_deferred_fields().intersection(('author', *TRACKED_FIELDS[1:])):
+        return None
+    return tuple(getattr(document, field) for field in TRACKED_FIELDS)
+
+
+def document_saved(document, created):
+    """
+    Called by ``Document.save()`` once the row is written.
+    """
+    old = None if created else getattr(document, '_stats_state', None)
+    new = tracked_state(document)
+    document._stats_state = new
+    if new is None or old == new or (old is None and not created):
+        # Unchanged, or an instance not loaded whole: left to reconcile.
+        return
+    deltas = new_deltas()
+    if old is not None:
+        add_document(deltas, old, -1)
+    add_document(deltas, new)
+
+    # Soft delete, restore or a change of author moves the comments too.
+    old_owner = old[0] if old is not None and not old[4] else None
+    new_owner = new[0] if not new[4] else None
+    if not created and old_owner != new_owner:
+        if old_owner is not None:
+            add_comments(deltas, [document.pk], -1, recipient_id=old_owner)
+        if new_owner is not None:
+            add_comments(deltas, [document.pk], 1, recipient_id=new_owner)
+    apply(deltas)
+
+
+def document_deleting(sender, instance, **kwargs):
+    """
+    pre_delete receiver for Document: a live document leaves with its comments.
+    """
+    if instance.soft_delete:
+        return
+    deltas = new_deltas()
+    add_documents(deltas, [instance.pk], -1)
+    add_comments(deltas, [instance.pk], -1)
+    apply(deltas)
+
+
+def comment_saved(sender, instance, created, **kwargs):
+    """
+    post_save receiver for Comment.
+    """
+    from .models import Document
+
+    if created:
+        was_live = False
+    elif hasattr(instance, '_loaded_soft_delete'):
+        was_live = not instance._loaded_soft_delete
+    else:
+        return
+    is_live = not instance.soft_delete
+    instance._loaded_soft_delete = instance.soft_delete
+    if was_live == is_live:
+        return
+    document_author_id = (Document.objects.filter(pk=instance.document_id)
+                          .values_list('author_id', flat=True).first())
+    if document_author_id is None:
+        # The document is soft-deleted; its comments are not counted.
+        return
+    sign = 1 if is_live else -1
+    deltas = new_deltas()
+    deltas[document_author_id]['comments_received'] += sign
+    deltas[instance.author_id]['comments_written'] += sign
+    apply(deltas)
+
+
+# ---------------------------------------------------------------------------
+# Rebuilding from aggregates
+# ---------------------------------------------------------------------------
+
+def compute(user_ids):
+    """
+    ``{user_id: {field: value}}`` for ``user_ids``, from three grouped queries.
+    """
+    from .models import Comment, Document
+
+    rows = {user_id: dict.fromkeys(COUNTER_FIELDS, 0) for user_id in user_ids}
+    aggregates = {
+        'documents': Count('pk'),
+        'word_count': Coalesce(Sum('word_count'), 0),
+        **{field: Count('pk', filter=Q(status=value)) for value, field in STATUS_FIELDS.items()},
+        **{field: Count('pk', filter=Q(document_type=value)) for value, field in TYPE_FIELDS.items()},
+    }
+    documents = Document.objects.filter(author_id__in=user_ids).values('author_id').annotate(**aggregates).order_by()
+    for values in documents:
+        rows[values.pop('author_id')].update(values)
+
+    live_comments = Comment.objects.filter(document__soft_delete=False)
+    received = (live_comments.filter(document__author_id__in=user_ids)
+                .values_list('document__author_id').annotate(count=Count('pk')).order_by())
+    for user_id, count in received:
+        rows[user_id]['comments_received'] = count
+    written = (live_comments.filter(author_id__in=user_ids)
+               .values_list('author_id').annotate(count=Count('pk')).order_by())
+    for user_id, count in written:
+        rows[user_id]['comments_written'] = count
+    return rows
+
+
+def store(rows):
+    """
+    Upsert computed rows.
+    """
+    from .models import UserDocumentStats
+
+    now = timezone.now()
+    UserDocumentStats.objects.bulk_create(
+        [UserDocumentStats(user_id=user_id, updated_at=now, **values) for user_id, values in rows.items()],
+        update_conflicts=True,
+        unique_fields=['user'],
+        update_fields=[*COUNTER_FIELDS, 'updated_at'],
+    )
+
+
+def get_stats(user_id):
+    """
+    The user's statistics row, built from aggregates if it does not exist yet.
+    """
+    from .models import UserDocumentStats
+
+    stats = UserDocumentStats.objects.filter(user_id=user_id).first()
+    if stats is not None:
+        return stats
+    values = compute([user_id])[user_id]
+    try:
+        with transaction.atomic():
+            return UserDocumentStats.objects.create(user_id=user_id, **values)
+    except IntegrityError:
+        # Built concurrently by another request.
+        return UserDocumentStats.objects.get(user_id=user_id)
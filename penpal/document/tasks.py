@@ -0,0 +1,87 @@
+"""
+Deferred document work, run by ``manage.py run_tasks`` (see tasks/queue.py).
+"""
+import logging
+
+from django.db import transaction
+from django.db.models import Case, F, Value, When
+from django.utils import timezone
+
+from tasks.queue import BatchItemsFailed, task
+
+from . import feed, stats
+from .conditional import document_scopes, touch
+from .derived import SOURCE_FIELDS, TEXT_FIELDS, derive
+
+
+logger = logging.getLogger(__name__)
+
+
+@task(batch_size=50, priority=10)
+def refresh_document_text(document_ids):
+    """
+    Compute plain text, excerpt, outline, word count and read time for
+    documents whose content changed. ``Document.save()`` has already stored
+    the new content hash; each row is only written if it still has the hash
+    the text was derived from, so a later edit is never overwritten with
+    text from an older one. Each document is written in its own savepoint;
+    the ones that fail are reported with ``BatchItemsFailed`` and retried
+    without holding back the rest.
+    """
+    from .models import Document
+
+    documents = Document.all_objects.filter(pk__in=document_ids).only(
+        'id', 'author', 'word_count', 'status', 'is_public', 'soft_delete', 'content_hash', *SOURCE_FIELDS,
+    )
+    now = timezone.now()
+    deltas = stats.new_deltas()
+    published = []
+    failed = []
+    scopes = set()
+    with transaction.atomic():
+        for document in documents:
+            try:
+                with transaction.atomic():
+                    fields = derive(document, document.content_hash)
+                    del fields['content_hash']
+                    # updated_at moves so ETags and Last-Modified see the new text,
+                    # except on soft-deleted rows, where it is the deletion stamp that
+                    # restores and purges match on (document/bulk.py).
+                    written = Document.all_objects.filter(pk=document.pk, content_hash=document.content_hash).update(
+                        updated_at=Case(When(soft_delete=False, then=Value(now)), default=F('updated_at')),
+                        **{field: fields[field] for field in TEXT_FIELDS},
+                    )
+            except Exception:
+                logger.exception("Could not refresh the text of document %s", document.pk)
+                failed.append(str(document.pk))
+                continue
+            if written and not document.soft_delete:
+                deltas[document.author_id]['word_count'] += fields['word_count'] - document.word_count
+            if written and feed.in_feed(document):
+                published.append(document.pk)
+            if written:
+                scopes.update(document_scopes(document.author_id, document.is_public))
+        stats.apply(deltas)
+        feed.queue_refresh(published)
+        touch(scopes)
+    if failed:
+        raise BatchItemsFailed(failed)
+
+
+@task(batch_size=100, priority=5)
+def refresh_public_feed(document_ids):
+    """
+    Apply the current state of documents to the cached public feeds
+    (document/feed.py): entering, moving within or leaving them.
+    """
+    from .models import Document
+
+    documents = {
+        str(document.pk): document
+        for document in Document.all_objects.filter(pk__in=document_ids)
+        .select_related('author').prefetch_related('tags')
+    }
+    for pk in dict.fromkeys(document_ids):
+        document = documents.get(pk)
+        tags = [tag.slug for tag in document.tags.all()] if document is not None else []
+        feed.refresh_document(pk, document, tags)
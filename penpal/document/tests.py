@@ -1,3 +1,1124 @@
-from django.test import TestCase
+import copy
+import html
+import io
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+from datetime import timedelta
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connections, transaction
+from django.db.models import Q
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings, tag
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from penpal import routers
+from penpal.routers import LAST_WRITE_COOKIE, LAST_WRITE_HEADER, ReplicaRouter
+from tasks.models import Task
+from tasks.queue import BatchItemsFailed, call, claim, complete, registry, split_failed
+
+from .bulk import set_soft_deleted
+from .collab import CollabSession, apply_ops, xform
+from .converters import PARSERS, blocknote_to_blocks, blocks_to_html, html_to_blocks, plain_text, tiptap_to_blocks
+from .derived import derive
+from . import bulk, events, feed, fields, revisions, stats
+from .models import Comment, Document, MediaAsset, Tag, UserDocumentStats
+from .rendering import render
+from .visibility import combine, visible_parts
+from .tasks import refresh_document_text
+from .views import DocumentListCreateView
+
+
+# The primary stands in for the replica: the router's choice of replica is
+# spied on, so tests see which reads were routed without a second database.
+@override_settings(REPLICA_DATABASES=['default'])
+class ReplicaRoutingTests(TransactionTestCase):
+    # Routing is disabled inside atomic blocks, so TestCase's wrapping
+    # transaction would keep every read on the primary.
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('writer', password='secret')
+        Document.objects.create(author=self.user, title='Public', is_public=True)
+        self.url = reverse('document-list-create')
+
+    def routed(self, method='get', **extra):
+        """
+        Whether the request's document reads were sent to a replica.
+        """
+        with mock.patch('penpal.routers.random.choice', side_effect=lambda replicas: replicas[0]) as choice:
+            response = getattr(self.client, method)(self.url, **extra)
+        self.assertLess(response.status_code, 400)
+        self.response = response
+        return choice.called
+
+    def test_safe_reads_use_the_replica(self):
+        self.assertTrue(self.routed())
+
+    def test_recent_write_header_reads_the_primary(self):
+        self.assertFalse(self.routed(HTTP_X_LAST_WRITE=str(time.time())))
+
+    def test_recent_write_cookie_reads_the_primary(self):
+        self.client.cookies[LAST_WRITE_COOKIE] = str(time.time())
+        self.assertFalse(self.routed())
+
+    def test_expired_write_reads_the_replica(self):
+        self.assertTrue(self.routed(HTTP_X_LAST_WRITE=str(time.time() - 3600)))
+
+    def test_future_write_is_ignored(self):
+        self.assertTrue(self.routed(HTTP_X_LAST_WRITE=str(time.time() + 3600)))
+
+    def test_malformed_write_is_ignored(self):
+        self.assertTrue(self.routed(HTTP_X_LAST_WRITE='soon'))
+
+    def test_write_goes_to_the_primary_and_sets_stickiness(self):
+        self.client.force_login(self.user)
+        data = {'title': 'Written', 'content': '<p>Hi</p>'}
+        self.assertFalse(self.routed('post', data=data, content_type='application/json'))
+        self.assertEqual(self.response.status_code, 201)
+        self.assertIn(LAST_WRITE_HEADER, self.response)
+        self.assertIn(LAST_WRITE_COOKIE, self.response.cookies)
+        # The test client sends the cookie back, so the next read is fresh.
+        self.assertFalse(self.routed())
+
+    def test_reads_inside_a_transaction_stay_on_the_primary(self):
+        router = ReplicaRouter()
+        token = routers._use_replica.set(True)
+        try:
+            self.assertEqual(router.db_for_read(Document), 'default')
+            self.assertIsNone(router.db_for_read(User))
+            with transaction.atomic():
+                with mock.patch('penpal.routers.random.choice') as choice:
+                    self.assertEqual(router.db_for_read(Document), 'default')
+                choice.assert_not_called()
+        finally:
+            routers._use_replica.reset(token)
+
+    def test_only_sqlite_stand_ins_are_migrated(self):
+        router = ReplicaRouter()
+        self.assertTrue(router.allow_migrate('default', 'document'))
+        with mock.patch.object(connections['default'], 'vendor', 'postgresql'):
+            self.assertFalse(router.allow_migrate('default', 'document'))
+        with override_settings(REPLICA_DATABASES=[]), mock.patch.object(connections['default'], 'vendor', 'postgresql'):
+            self.assertTrue(router.allow_migrate('default', 'document'))
+
+
+class ConverterTests(SimpleTestCase):
+    def test_paragraphs_in_a_list_item_are_separated(self):
+        blocks = html_to_blocks('<ul><li><p>one</p><p>two</p></li></ul>')
+        self.assertEqual([(block['type'], plain_text(block['runs'])) for block in blocks], [('bullet', 'one\ntwo')])
+
+    def test_blocknote_tolerates_malformed_nodes(self):
+        blocks = blocknote_to_blocks([
+            'oops', None, 3,
+            {'type': 'heading', 'props': {'level': 'big'}, 'content': [{'type': 'text', 'text': 'Title'}]},
+            {'type': ['list'], 'props': 'x', 'content': ['loose', {'text': 7, 'styles': 'bold'}], 'children': 'no'},
+            {'type': 'paragraph', 'content': [{'type': 'link', 'href': {}, 'content': 'Link'}]},
+        ])
+        self.assertEqual(blocks[0]['level'], 1)
+        self.assertEqual([plain_text(block['runs']) for block in blocks], ['Title', '', 'Link'])
+        self.assertIsNone(blocks[2]['runs'][0]['href'])
+
+    def test_tiptap_tolerates_malformed_nodes(self):
+        blocks = tiptap_to_blocks({'type': 'doc', 'content': [
+            'oops',
+            {'type': 'heading', 'attrs': {'level': '9'}, 'content': [{'type': 'text', 'text': 'Title'}]},
+            {'type': 'paragraph', 'attrs': [], 'content': [
+                {'type': 'text', 'text': ['x'], 'marks': ['bold', {'type': {}}]},
+                {'type': 'text', 'text': 'ok', 'marks': [{'type': 'link', 'attrs': 'x'}]},
+            ]},
+            {'type': 'bulletList', 'content': [{'type': 'listItem', 'content': 'oops'}]},
+        ]})
+        self.assertEqual(blocks[0]['level'], 6)
+        self.assertEqual([plain_text(block['runs']) for block in blocks], ['Title', 'ok', ''])
+
+    def test_links_keep_only_safe_schemes(self):
+        unsafe = ('javascript:alert(1)', 'JavaScript:alert(1)', 'java\tscript:alert(1)', ' javascript:x',
+                  'data:text/html,<script>x</script>', 'vbscript:x')
+        safe = ('https://example.com/a', 'http://example.com', 'mailto:a@example.com', '/docs/1', '#top', 'page')
+        for href in unsafe + safe:
+            expected = href if href in safe else None
+            sources = {
+                'html': f'<p><a href="{html.escape(href)}">x</a></p>',
+                'markdown': f'[x]({href})' if ' ' not in href and '\t' not in href else None,
+                'tiptap': {'type': 'doc', 'content': [{'type': 'paragraph', 'content': [
+                    {'type': 'text', 'text': 'x', 'marks': [{'type': 'link', 'attrs': {'href': href}}]},
+                ]}]},
+                'blocknote': [{'type': 'paragraph', 'content': [{'type': 'link', 'href': href, 'content': 'x'}]}],
+            }
+            for source, value in sources.items():
+                if value is None:
+                    continue
+                with self.subTest(href=href, source=source):
+                    blocks = PARSERS[source](value)
+                    self.assertEqual(blocks[0]['runs'][0]['href'], expected)
+                    rendered = blocks_to_html(blocks)
+                    self.assertEqual('<a href' in rendered, expected is not None)
+
+    def test_non_container_values_parse_to_nothing(self):
+        for value in ('text', 5, None, {'content': 'x'}):
+            self.assertEqual(PARSERS['tiptap'](value), [])
+            self.assertEqual(PARSERS['blocknote'](value), [])
+
+
+class RenderTests(TestCase):
+    def test_render_needs_no_queries(self):
+        user = User.objects.create_user('renderer')
+        document = Document.objects.create(author=user, title='Doc', content='<h1>Hello</h1><p>world</p>')
+        with self.assertNumQueries(0):
+            self.assertEqual(render(document, 'markdown'), '# Hello\n\nworld\n')
+
+    def test_render_follows_content_changes(self):
+        user = User.objects.create_user('renderer')
+        document = Document.objects.create(author=user, title='Doc', content='<p>first</p>')
+        self.assertEqual(render(document, 'markdown'), 'first\n')
+        document.content = '<p>second</p>'
+        document.save()
+        self.assertEqual(render(document, 'markdown'), 'second\n')
+
+
+class EditorJSONValidationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('editor')
+        self.client.force_login(self.user)
+        self.url = reverse('document-list-create')
+
+    def post(self, **fields):
+        data = {'title': 'Editor JSON', 'content': '<p>body</p>', **fields}
+        return self.client.post(self.url, data, content_type='application/json')
+
+    def test_malformed_blocknote_is_rejected(self):
+        for value in (['oops'], [{'content': [3]}], [{'children': 'x'}], 'blocks'):
+            response = self.post(editor_type='blocknote', block_note_content=value)
+            self.assertEqual(response.status_code, 400, value)
+            self.assertIn('block_note_content', response.json())
+
+    def test_malformed_tiptap_is_rejected(self):
+        for value in (['oops'], {'type': 'doc', 'content': 'x'}, {'content': [{'marks': [1]}]}):
+            response = self.post(editor_type='tiptap', content_json=value)
+            self.assertEqual(response.status_code, 400, value)
+            self.assertIn('content_json', response.json())
+
+    def test_well_formed_editor_json_is_accepted(self):
+        response = self.post(editor_type='blocknote', block_note_content=[
+            {'type': 'heading', 'props': {'level': 2}, 'content': [{'type': 'text', 'text': 'Hi', 'styles': {}}],
+             'children': []},
+        ])
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(Document.objects.get().outline, [{'level': 2, 'text': 'Hi'}])
+
+    def test_derive_degrades_to_empty_text(self):
+        document = Document(author=self.user, editor_type='blocknote', block_note_content=['oops', {'content': 5}])
+        derived = derive(document)
+        self.assertEqual((derived['plain_text'], derived['word_count']), ('', 0))
+        document = Document(author=self.user, editor_type='tiptap', content_json={'content': ['oops']})
+        self.assertEqual(derive(document)['plain_text'], '')
+
+
+class RevisionTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('writer')
+        self.document = Document.objects.create(author=self.user, title='Revised', content='<p>v0</p>')
+        self.snapshots = [revisions.snapshot(self.document)]
+
+    def edit(self, index):
+        paragraphs = [f'<p>paragraph {n} of edit {index if n % 3 == index % 3 else 0}</p>' for n in range(6)]
+        self.document.content = '\n'.join(paragraphs)
+        self.document.content_json = {'type': 'doc', 'content': [{'type': 'text', 'text': f'edit {index}'}]}
+        self.document.save()
+        self.snapshots.append(revisions.snapshot(self.document))
+
+    def test_round_trip_across_keyframes(self):
+        for index in range(1, 2 * revisions.KEYFRAME_INTERVAL + 3):
+            self.edit(index)
+        rows = list(self.document.revisions.order_by('number').values_list('number', 'is_keyframe'))
+        self.assertEqual(len(rows), len(self.snapshots))
+        self.assertEqual([number for number, is_keyframe in rows if is_keyframe],
+                         [1, revisions.KEYFRAME_INTERVAL + 1, 2 * revisions.KEYFRAME_INTERVAL + 1])
+        for number, expected in enumerate(self.snapshots, start=1):
+            with self.subTest(number=number):
+                self.assertEqual(revisions.reconstruct(self.document.pk, number), expected)
+        self.assertIsNone(revisions.reconstruct(self.document.pk, len(self.snapshots) + 1))
+
+    def test_unchanged_content_records_nothing(self):
+        self.document.title = 'Renamed'
+        self.document.save()
+        self.assertEqual(self.document.revisions.count(), 1)
+
+    def test_recording_diffs_against_the_cached_head(self):
+        self.edit(1)
+        with mock.patch.object(revisions, 'reconstruct', wraps=revisions.reconstruct) as replay:
+            self.edit(2)
+        replay.assert_not_called()
+        self.assertEqual(revisions.reconstruct(self.document.pk, 3), self.snapshots[2])
+
+    def test_stale_or_missing_head_falls_back_to_replay(self):
+        self.edit(1)
+        stale = cache.get(revisions.head_cache_key(self.document.pk))
+        self.edit(2)
+        for entry in (stale, None):
+            with self.subTest(entry=entry and 'stale'):
+                cache.delete(revisions.head_cache_key(self.document.pk))
+                if entry is not None:
+                    cache.set(revisions.head_cache_key(self.document.pk), entry)
+                with mock.patch.object(revisions, 'reconstruct', wraps=revisions.reconstruct) as replay:
+                    self.edit(len(self.snapshots))
+                replay.assert_called_once()
+        for number, expected in enumerate(self.snapshots, start=1):
+            self.assertEqual(revisions.reconstruct(self.document.pk, number), expected)
+
+
+class CompressedFieldTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('compressor')
+        self.body = ''.join(f'<p>paragraph {n}</p>' for n in range(400))
+        self.tree = {'type': 'doc', 'content': [{'type': 'text', 'text': f'node {n}'} for n in range(300)]}
+        self.document = Document.objects.create(author=self.user, title='Large', content=self.body,
+                                                content_json=self.tree)
+
+    def stored(self, field, pk=None):
+        # values_list() returns the stored form.
+        return Document.objects.values_list(field, flat=True).get(pk=pk or self.document.pk)
+
+    def test_large_values_are_stored_compressed_and_small_ones_plain(self):
+        self.assertTrue(fields.is_compressed(self.stored('content')))
+        self.assertTrue(fields.is_compressed(self.stored('content_json')))
+        small = Document.objects.create(author=self.user, title='Small', content='<p>hi</p>',
+                                        content_json={'type': 'doc'})
+        self.assertEqual(self.stored('content', small.pk), '<p>hi</p>')
+        self.assertEqual(self.stored('content_json', small.pk), {'type': 'doc'})
+
+    def test_values_that_look_compressed_are_compressed(self):
+        document = Document.objects.create(author=self.user, title='Marker', content=fields.MARKER + 'zplain')
+        self.assertTrue(fields.is_compressed(self.stored('content', document.pk)))
+        self.assertEqual(Document.objects.get(pk=document.pk).content, fields.MARKER + 'zplain')
+
+    def test_decompression_is_lazy_and_cached(self):
+        with mock.patch.object(fields, 'decompress', wraps=fields.decompress) as decompress:
+            document = Document.objects.get(pk=self.document.pk)
+            self.assertIsInstance(document.__dict__['content'], fields.CompressedValue)
+            decompress.assert_not_called()
+            self.assertEqual(document.content, self.body)
+            self.assertEqual(document.content, self.body)
+            self.assertEqual(decompress.call_count, 1)
+
+    def test_unread_bodies_are_written_back_without_recompressing(self):
+        document = Document.objects.get(pk=self.document.pk)
+        with mock.patch.object(fields, 'compress') as compress, \
+                mock.patch.object(fields, 'decompress') as decompress:
+            for name in ('content', 'content_json'):
+                field = Document._meta.get_field(name)
+                self.assertEqual(field.get_prep_value(field.pre_save(document, False)), self.stored(name))
+        compress.assert_not_called()
+        decompress.assert_not_called()
+
+    def test_values_return_the_stored_form(self):
+        content, content_json = Document.objects.values_list('content', 'content_json').get(pk=self.document.pk)
+        self.assertTrue(fields.is_compressed(content))
+        self.assertEqual(fields.decompress(content), self.body)
+        self.assertEqual(json.loads(fields.decompress(content_json)), self.tree)
+        row = Document.objects.values('content').get(pk=self.document.pk)
+        self.assertEqual(row['content'], content)
+
+    def test_refresh_from_db_round_trips(self):
+        self.document.content = 'stale'
+        self.document.content_json = {}
+        self.document.refresh_from_db()
+        self.assertEqual(self.document.content, self.body)
+        self.assertEqual(self.document.content_json, self.tree)
+        self.document.content_json = {**self.tree, 'attrs': {'edited': True}}
+        self.document.save()
+        self.document.refresh_from_db(fields=['content_json'])
+        self.assertEqual(self.document.content_json['attrs'], {'edited': True})
+
+    def test_compress_document_bodies_compresses_plain_rows_once(self):
+        # A row written before the field compressed anything.
+        with mock.patch.object(Document._meta.get_field('content'), 'threshold', len(self.body) + 1):
+            Document.objects.filter(pk=self.document.pk).update(content=self.body)
+        small = Document.objects.create(author=self.user, title='Small', content='<p>hi</p>')
+        updated_at = Document.objects.get(pk=self.document.pk).updated_at
+
+        out = io.StringIO()
+        call_command('compress_document_bodies', dry_run=True, stdout=out)
+        self.assertIn('Would compress 1 of 2 documents.', out.getvalue())
+        self.assertEqual(self.stored('content'), self.body)
+
+        out = io.StringIO()
+        call_command('compress_document_bodies', batch_size=1, stdout=out)
+        self.assertIn('Compressed 1 of 2 documents.', out.getvalue())
+        self.assertTrue(fields.is_compressed(self.stored('content')))
+        self.assertEqual(self.stored('content', small.pk), '<p>hi</p>')
+        document = Document.objects.get(pk=self.document.pk)
+        self.assertEqual((document.content, document.content_json), (self.body, self.tree))
+        self.assertEqual(document.updated_at, updated_at)
+
+        out = io.StringIO()
+        call_command('compress_document_bodies', stdout=out)
+        self.assertIn('Compressed 0 of 2 documents.', out.getvalue())
+
+
+def change_event(event_type, **data):
+    return {'id': 1, 'type': event_type, 'document': 'doc', 'data': data, 'at': '2026-01-01T00:00:00+00:00'}
+
+
+@override_settings(DOCUMENT_EVENT_QUEUE_SIZE=2, DOCUMENT_EVENT_HEARTBEAT=5, DOCUMENT_EVENT_STREAM_MAX_AGE=5)
+class EventStreamTests(SimpleTestCase):
+    def setUp(self):
+        self.broker = events.InProcessBroker()
+        patcher = mock.patch.object(events, '_broker', self.broker)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.channel = events.channel_for('doc')
+
+    async def open(self, user_id=1, author_id=1):
+        stream = events.event_stream('doc', user_id, author_id)
+        self.assertTrue((await anext(stream)).startswith('retry:'))
+        return stream
+
+    async def rest(self, stream):
+        return [frame async for frame in stream]
+
+    async def test_events_are_relayed_in_order(self):
+        stream = await self.open()
+        self.broker.publish(self.channel, change_event(events.COMMENT_ADDED, comment='c1'))
+        self.broker.publish(self.channel, change_event(events.CONTENT_UPDATED))
+        self.assertIn('event: comment.added', await anext(stream))
+        self.assertIn('event: document.content_updated', await anext(stream))
+        await stream.aclose()
+        self.assertEqual(self.broker.subscriber_count(), 0)
+
+    async def test_overflow_sends_one_resync_and_closes(self):
+        stream = await self.open()
+        for _ in range(5):
+            self.broker.publish(self.channel, change_event(events.CONTENT_UPDATED))
+        self.assertEqual(await self.rest(stream), ['event: resync\ndata: {}\n\n'])
+        self.assertEqual(self.broker.subscriber_count(), 0)
+
+    async def test_unpublishing_revokes_readers_but_not_the_author(self):
+        reader, author = await self.open(user_id=2, author_id=1), await self.open(user_id=1, author_id=1)
+        self.broker.publish(self.channel, change_event(events.STATUS_CHANGED, is_public=False))
+        frames = await self.rest(reader)
+        self.assertIn('event: document.status_changed', frames[0])
+        self.assertEqual(frames[1:], ['event: revoked\ndata: {}\n\n'])
+        self.assertIn('event: document.status_changed', await anext(author))
+        await author.aclose()
+
+    async def test_deletion_revokes_everyone(self):
+        stream = await self.open(user_id=1, author_id=1)
+        self.broker.publish(self.channel, change_event(events.DELETED))
+        self.assertEqual((await self.rest(stream))[-1], 'event: revoked\ndata: {}\n\n')
+
+    @override_settings(DOCUMENT_EVENT_STREAM_MAX_AGE=0)
+    async def test_stream_ends_at_its_maximum_age(self):
+        stream = await self.open()
+        self.assertEqual(await self.rest(stream), [])
+        self.assertEqual(self.broker.subscriber_count(), 0)
+
+
+@override_settings(REDIS_URL='redis://localhost:6379/0')
+class RedisBrokerTests(SimpleTestCase):
+    def setUp(self):
+        self.broker = events.RedisBroker()
+        self.channel = events.channel_for('doc')
+
+    def test_publish_sends_the_event_to_redis(self):
+        with mock.patch.object(self.broker._client, 'publish') as publish:
+            self.broker.publish(self.channel, change_event(events.DELETED))
+        channel, payload = publish.call_args.args
+        self.assertEqual(channel, 'penpal:events:document:doc')
+        self.assertEqual(json.loads(payload)['type'], events.DELETED)
+
+    async def test_messages_reach_local_subscribers_and_a_lost_connection_resyncs(self):
+        with mock.patch.object(self.broker, 'listen'):
+            subscription = self.broker.subscribe(self.channel, 10)
+        event = change_event(events.COMMENT_ADDED)
+        self.broker.dispatch({'channel': b'penpal:events:document:doc', 'data': json.dumps(event).encode()})
+        self.assertEqual(await subscription.get(), event)
+        self.broker.resync_all()
+        self.assertIs(await subscription.get(), events.LAGGED)
+        self.broker.unsubscribe(subscription)
+
+
+class StatsDriftMixin:
+    """
+    After every write path the incrementally maintained rows must equal a
+    full recount (``stats.compute``).
+    """
+
+    def setUp(self):
+        self.alice = User.objects.create_user('alice')
+        self.bob = User.objects.create_user('bob')
+        for user in (self.alice, self.bob):
+            stats.get_stats(user.pk)
+
+    def run_tasks(self):
+        while tasks := claim('test', 100):
+            for task in tasks:
+                call(registry[task.name], [(task.args, task.kwargs)])
+            complete(tasks)
+
+    def assertNoDrift(self):
+        self.run_tasks()
+        expected = stats.compute([self.alice.pk, self.bob.pk])
+        for user_id, values in expected.items():
+            row = UserDocumentStats.objects.get(user_id=user_id)
+            self.assertEqual({field: getattr(row, field) for field in values}, values)
+
+    def test_counters_match_a_recount_after_every_write(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            post = Document.objects.create(author=self.alice, title='Post', content='<p>one two three</p>',
+                                           status='published', document_type='blog', is_public=True)
+            draft = Document.objects.create(author=self.alice, title='Draft', content='<p>four</p>',
+                                            document_type='tutorial')
+            other = Document.objects.create(author=self.bob, title='Other', content='<p>five six</p>',
+                                            is_public=True)
+        self.assertNoDrift()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            draft = Document.objects.get(pk=draft.pk)
+            draft.status, draft.document_type = 'archived', 'srs'
+            draft.content = '<p>four and now many more words</p>'
+            draft.save()
+        self.assertNoDrift()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Comment.objects.create(document=post, author=self.bob, body='nice')
+            Comment.objects.create(document=post, author=self.alice, body='thanks')
+            Comment.objects.create(document=other, author=self.alice, body='hello')
+        self.assertNoDrift()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            comment = Comment.objects.get(body='thanks')
+            comment.soft_delete = True
+            comment.save()
+        self.assertNoDrift()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            bulk.update_fields(self.alice, [post.pk, draft.pk], {'status': 'draft'})
+        self.assertNoDrift()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            set_soft_deleted(self.alice, [post.pk], True)
+        self.assertNoDrift()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            set_soft_deleted(self.alice, [post.pk], False)
+        self.assertNoDrift()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Document.objects.get(pk=other.pk).delete()
+        self.assertNoDrift()
+
+
+@override_settings(TASKS_ALWAYS_EAGER=True)
+class EagerStatsDriftTests(StatsDriftMixin, TestCase):
+    pass
+
+
+@override_settings(TASKS_ALWAYS_EAGER=False)
+class DeferredStatsDriftTests(StatsDriftMixin, TestCase):
+    def test_word_counts_wait_for_the_text_task(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            Document.objects.create(author=self.alice, title='Later', content='<p>one two</p>')
+        self.assertEqual(UserDocumentStats.objects.get(user=self.alice).word_count, 0)
+        self.assertNoDrift()
+        self.assertEqual(UserDocumentStats.objects.get(user=self.alice).word_count, 2)
+
+
+class SoftDeleteManagerTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('keeper')
+        self.live_tag = Tag.objects.create(name='Live')
+        self.dead_tag = Tag.objects.create(name='Dead', soft_delete=True)
+        self.document = Document.objects.create(author=self.user, title='Live', content='<p>x</p>')
+        self.document.tags.set([self.live_tag, self.dead_tag])
+        self.gone = Document.objects.create(author=self.user, title='Gone', content='<p>x</p>', soft_delete=True)
+        self.comment = Comment.objects.create(document=self.document, author=self.user, body='kept')
+        Comment.objects.create(document=self.document, author=self.user, body='hidden', soft_delete=True)
+
+    def test_objects_hides_tombstones_and_all_objects_keeps_them(self):
+        self.assertQuerySetEqual(Document.objects.all(), [self.document])
+        self.assertCountEqual(Document.all_objects.all(), [self.document, self.gone])
+        self.assertQuerySetEqual(Document.all_objects.tombstones(), [self.gone])
+        self.assertQuerySetEqual(Document.all_objects.live(), [self.document])
+        with self.assertRaises(Document.DoesNotExist):
+            Document.objects.get(pk=self.gone.pk)
+
+    def test_related_managers_and_prefetches_hide_tombstones(self):
+        self.assertQuerySetEqual(self.document.comments.all(), [self.comment])
+        document = Document.objects.prefetch_related('tags', 'comments').get(pk=self.document.pk)
+        self.assertEqual([tag.name for tag in document.tags.all()], ['Live'])
+        self.assertEqual([comment.body for comment in document.comments.all()], ['kept'])
+        self.assertEqual(Comment.all_objects.filter(document=self.document).count(), 2)
+
+
+@override_settings(SOFT_DELETE_RETENTION_DAYS=30)
+class PurgeSoftDeletedTests(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        media = override_settings(MEDIA_ROOT=self.media_root)
+        media.enable()
+        self.addCleanup(media.disable)
+
+        self.user = User.objects.create_user('purger')
+        self.old = timezone.now() - timedelta(days=40)
+        self.recent = timezone.now() - timedelta(days=10)
+        self.expired = Document.objects.create(author=self.user, title='Expired', content='<p>x</p>')
+        self.asset = MediaAsset.objects.create(document=self.expired, owner=self.user, file_type='file',
+                                               file=SimpleUploadedFile('note.txt', b'note'))
+        self.comment = Comment.objects.create(document=self.expired, author=self.user, body='old')
+        set_soft_deleted(self.user, [self.expired.pk], True)
+        self.kept = Document.objects.create(author=self.user, title='Recent', content='<p>x</p>', soft_delete=True)
+        self.live = Document.objects.create(author=self.user, title='Live', content='<p>x</p>')
+        self.tag = Tag.objects.create(name='Old', soft_delete=True)
+        for model in (Document, Comment, MediaAsset, Tag):
+            model.all_objects.update(updated_at=self.old)
+        Document.all_objects.filter(pk=self.kept.pk).update(updated_at=self.recent)
+
+    def test_dry_run_counts_without_deleting(self):
+        out = io.StringIO()
+        call_command('purge_soft_deleted', dry_run=True, stdout=out)
+        self.assertIn('document.Document: 1 expired tombstones', out.getvalue())
+        self.assertIn('document.MediaAsset: 1 expired tombstones', out.getvalue())
+        self.assertEqual(Document.all_objects.count(), 3)
+
+    def test_only_tombstones_older_than_the_window_are_purged(self):
+        path = self.asset.file.path
+        self.assertTrue(os.path.exists(path))
+        call_command('purge_soft_deleted', batch_size=1, stdout=io.StringIO())
+        self.assertCountEqual(Document.all_objects.all(), [self.kept, self.live])
+        self.assertFalse(Comment.all_objects.exists())
+        self.assertFalse(MediaAsset.all_objects.exists())
+        self.assertFalse(Tag.all_objects.exists())
+        self.assertFalse(os.path.exists(path))
+
+    def test_days_overrides_the_retention_window(self):
+        call_command('purge_soft_deleted', days=5, stdout=io.StringIO())
+        self.assertQuerySetEqual(Document.all_objects.all(), [self.live])
+
+
+class SoftDeleteRestoreTests(TestCase):
+    def test_restore_after_text_refresh_brings_back_cascaded_comments(self):
+        user = User.objects.create_user('owner')
+        document = Document.objects.create(author=user, title='Doc', content='<p>body</p>', allow_comments=True)
+        kept = Comment.objects.create(document=document, author=user, body='cascaded')
+        gone = Comment.objects.create(document=document, author=user, body='deleted first')
+        Comment.all_objects.filter(pk=gone.pk).update(soft_delete=True)
+
+        set_soft_deleted(user, [document.pk], True)
+        stamp = Document.all_objects.get(pk=document.pk).updated_at
+        refresh_document_text([str(document.pk)])
+        self.assertEqual(Document.all_objects.get(pk=document.pk).updated_at, stamp)
+
+        set_soft_deleted(user, [document.pk], False)
+        self.assertFalse(Comment.all_objects.get(pk=kept.pk).soft_delete)
+        self.assertTrue(Comment.all_objects.get(pk=gone.pk).soft_delete)
+
+
+class BulkEndpointTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('owner')
+        other = User.objects.create_user('other')
+        self.live = Document.objects.create(author=self.user, title='Live', content='<p>x</p>')
+        self.deleted = Document.objects.create(author=self.user, title='Deleted', content='<p>x</p>', soft_delete=True)
+        self.foreign = Document.objects.create(author=other, title='Foreign', content='<p>x</p>')
+        self.missing = '00000000-0000-0000-0000-000000000000'
+        self.python = Tag.objects.create(name='Python')
+        self.django = Tag.objects.create(name='Django')
+        self.client.force_login(self.user)
+
+    def post(self, name, **data):
+        ids = [str(document.pk) for document in (self.live, self.deleted, self.foreign)] + [self.missing]
+        return self.client.post(reverse(name), {'ids': ids, **data}, content_type='application/json')
+
+    def assertResults(self, response, updated):
+        self.assertEqual(response.status_code, 200)
+        body = response.json()
+        expected = {pk: 'skipped' for pk in (str(self.live.pk), str(self.deleted.pk), str(self.foreign.pk), self.missing)}
+        expected.update({str(document.pk): 'updated' for document in updated})
+        self.assertEqual(body, {'updated': len(updated), 'skipped': 4 - len(updated), 'results': expected})
+        self.assertEqual(list(body['results']), list(expected))
+
+    def test_delete_and_restore(self):
+        self.assertResults(self.post('document-bulk-delete'), [self.live])
+        self.assertTrue(Document.all_objects.get(pk=self.live.pk).soft_delete)
+        self.assertResults(self.post('document-bulk-restore'), [self.live, self.deleted])
+        self.assertFalse(Document.all_objects.filter(soft_delete=True).exists())
+
+    def test_update_fields(self):
+        response = self.post('document-bulk-update', action='update', fields={'status': 'archived', 'is_public': True})
+        self.assertResults(response, [self.live])
+        self.assertEqual(
+            list(Document.all_objects.filter(status='archived', is_public=True).values_list('pk', flat=True)),
+            [self.live.pk],
+        )
+
+    def test_add_and_remove_tags(self):
+        tag_ids = [str(self.python.pk), str(self.django.pk)]
+        self.assertResults(self.post('document-bulk-update', action='add_tags', tag_ids=tag_ids), [self.live])
+        # Adding again leaves the existing links alone.
+        self.assertResults(self.post('document-bulk-update', action='add_tags', tag_ids=tag_ids), [self.live])
+        self.assertCountEqual(self.live.tags.all(), [self.python, self.django])
+        self.assertFalse(self.foreign.tags.exists())
+        response = self.post('document-bulk-update', action='remove_tags', tag_ids=[str(self.python.pk)])
+        self.assertResults(response, [self.live])
+        self.assertEqual(list(self.live.tags.all()), [self.django])
+
+    def test_invalid_requests(self):
+        for data in ({'action': 'update'},
+                     {'action': 'update', 'fields': {'title': 'x'}},
+                     {'action': 'update', 'fields': {'status': 'gone'}},
+                     {'action': 'add_tags'},
+                     {'action': 'remove_tags', 'tag_ids': [self.missing]},
+                     {'action': 'rename'}):
+            self.assertEqual(self.post('document-bulk-update', **data).status_code, 400, data)
+
+
+class RefreshDocumentTextTests(TestCase):
+    def test_failing_documents_do_not_hold_back_the_batch(self):
+        user = User.objects.create_user('writer')
+        good = Document.objects.create(author=user, title='Good', content='<p>one two</p>')
+        bad = Document.objects.create(author=user, title='Bad', content='<p>three</p>')
+        Document.all_objects.update(plain_text='', word_count=0)
+
+        def flaky(document, digest=None):
+            if document.pk == bad.pk:
+                raise ValueError('unparseable')
+            return derive(document, digest)
+
+        with mock.patch('document.tasks.derive', flaky), self.assertLogs('document.tasks', 'ERROR'):
+            with self.assertRaises(BatchItemsFailed) as raised:
+                refresh_document_text([str(good.pk), str(bad.pk)])
+        self.assertEqual(raised.exception.items, [str(bad.pk)])
+        self.assertEqual(Document.objects.get(pk=good.pk).plain_text, 'one two')
+        self.assertEqual(Document.objects.get(pk=bad.pk).plain_text, '')
+
+    def test_only_failed_items_are_split_off(self):
+        batch = [Task(pk=index, name='batch', args=[item]) for index, item in enumerate(['a', 'b', 'c'])]
+        self.assertEqual(split_failed(batch, ['b']), ([batch[0], batch[2]], [batch[1]]))
+        self.assertEqual(split_failed(batch, None), ([], batch))
+
+
+@override_settings(COLLAB_CHECKPOINT_OPS=10 ** 6, COLLAB_CHECKPOINT_SECONDS=3600)
+@mock.patch('document.collab.publish_document_event')
+class CollabSessionTests(SimpleTestCase):
+    initial = [{'type': 'paragraph', 'content': 'hello'}, {'type': 'quote', 'content': 'world'}]
+
+    def session(self):
+        return CollabSession('collab-test', 'block_note_content', copy.deepcopy(self.initial))
+
+    def test_concurrent_pairs_converge(self, publish):
+        pairs = [
+            ({'p': [0, 'content', 5], 'si': '!'}, {'p': [0, 'content', 0], 'si': '>'}),
+            ({'p': [0, 'content', 1], 'sd': 'ell'}, {'p': [0, 'content', 2], 'si': 'X'}),
+            ({'p': [0], 'ld': self.initial[0]}, {'p': [0, 'content', 0], 'si': 'gone'}),
+            ({'p': [1], 'li': {'type': 'paragraph'}}, {'p': [1], 'li': {'type': 'heading'}}),
+            ({'p': [1, 'type'], 'oi': 'paragraph'}, {'p': [1, 'type'], 'oi': 'heading'}),
+        ]
+        for first, second in pairs:
+            with self.subTest(first=first, second=second):
+                session = self.session()
+                session.submit(0, [first])
+                _, second_applied = session.submit(0, [second])
+                # Each client applied its own op, then receives the other's.
+                first_client = apply_ops(apply_ops(copy.deepcopy(self.initial), [first]), second_applied)
+                first_seen = xform([second], [first])[1]
+                second_client = apply_ops(apply_ops(copy.deepcopy(self.initial), [second]), first_seen)
+                _, state = session.snapshot()
+                self.assertEqual(first_client, state)
+                self.assertEqual(second_client, state)
+
+    def test_concurrent_submitters_keep_every_operation(self, publish):
+        session = CollabSession('collab-test', 'content_json', {'items': [], 'text': ''})
+        errors = []
+
+        def editor(name):
+            # Every op is made against the version this editor last saw.
+            version = 0
+            try:
+                for number in range(50):
+                    version, _ = session.submit(version, [
+                        {'p': ['items', 0], 'li': f'{name}-{number}'},
+                        {'p': ['text', 0], 'si': name},
+                    ])
+            except Exception as exc:
+                errors.append(exc)
+
+        threads = [threading.Thread(target=editor, args=(name,)) for name in 'abcd']
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+        version, state = session.snapshot()
+        self.assertEqual(version, 200)
+        self.assertCountEqual(state['items'], [f'{name}-{number}' for name in 'abcd' for number in range(50)])
+        self.assertEqual(sorted(state['text']), sorted('abcd' * 50))
+
+    def test_state_does_not_alias_client_values(self, publish):
+        session = self.session()
+        block = {'type': 'paragraph', 'content': 'new'}
+        _, ops = session.submit(0, [{'p': [0], 'li': block}, {'p': [1, 'props'], 'oi': {'level': 1}}])
+        block['content'] = 'changed by the client'
+        ops[1]['oi']['level'] = 9
+        _, state = session.snapshot()
+        self.assertEqual(state[0]['content'], 'new')
+        self.assertEqual(state[1]['props'], {'level': 1})
+        state[0]['content'] = 'changed by a reader'
+        self.assertEqual(session.snapshot()[1][0]['content'], 'new')
+        published = publish.call_args.args[2]['ops']
+        self.assertEqual(published[0]['li']['content'], 'new')
+        self.assertEqual(published[1]['oi'], {'level': 1})
+
+
+@mock.patch('document.collab.start_sweeper')
+class CollabViewTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user('author')
+        self.editor = User.objects.create_user('editor')
+        self.document = Document.objects.create(
+            author=self.author, title='Shared', content='<p>x</p>', editor_type='blocknote',
+            is_public=True, allow_editing=True, block_note_content=[{'type': 'paragraph', 'content': 'hello'}],
+        )
+        self.url = reverse('document-collab', args=[self.document.pk, 'block_note_content'])
+
+    def submit(self, user, version, *ops):
+        self.client.force_login(user)
+        return self.client.post(self.url, {'version': version, 'ops': list(ops)}, content_type='application/json')
+
+    def test_collaborators_can_edit_when_the_document_allows_it(self, start_sweeper):
+        response = self.submit(self.editor, 0, {'p': [0, 'content', 5], 'si': ' world'})
+        self.assertEqual(response.status_code, 200)
+        response = self.submit(self.author, 0, {'p': [0, 'content', 0], 'si': '> '})
+        self.assertEqual(response.json(), {'version': 2, 'ops': [{'p': [0, 'content', 0], 'si': '> '}]})
+        content = self.client.get(self.url).json()['content']
+        self.assertEqual(content, [{'type': 'paragraph', 'content': '> hello world'}])
+
+    def test_only_the_author_edits_otherwise(self, start_sweeper):
+        Document.objects.filter(pk=self.document.pk).update(allow_editing=False)
+        self.assertEqual(self.submit(self.editor, 0, {'p': [0, 'content', 0], 'si': 'x'}).status_code, 403)
+        self.assertEqual(self.submit(self.author, 0, {'p': [0, 'content', 0], 'si': 'x'}).status_code, 200)
+
+
+class ConditionalRequestTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('author')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.document = Document.objects.create(
+                author=self.user, title='Conditional', content='<p>body</p>', is_public=True,
+            )
+        self.list_url = reverse('document-list-create')
+        self.detail_url = reverse('document-retrieve-update-destroy', args=[self.document.pk])
+
+    def test_list_revalidation_reads_only_the_change_stamps(self):
+        etag = self.client.get(self.list_url)['ETag']
+        with self.assertNumQueries(1):
+            response = self.client.get(self.list_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+    def test_list_etag_follows_committed_changes(self):
+        etag = self.client.get(self.list_url)['ETag']
+        self.assertEqual(self.client.get(self.list_url)['ETag'], etag)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.document.title = 'Renamed'
+            self.document.save()
+        self.assertEqual(self.client.get(self.list_url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_list_etag_ignores_other_users_private_changes(self):
+        reader = User.objects.create_user('reader')
+        self.client.force_login(reader)
+        etag = self.client.get(self.list_url)['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            private = Document.objects.create(author=self.user, title='Private', content='<p>x</p>')
+            private.title = 'Still private'
+            private.save()
+            Comment.objects.create(document=private, author=self.user, body='note')
+            bulk.update_fields(self.user, [private.pk], {'status': 'published'})
+        self.assertEqual(self.client.get(self.list_url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Document.objects.create(author=reader, title='Mine', content='<p>x</p>')
+        self.assertEqual(self.client.get(self.list_url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_list_etag_follows_visibility_changes(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            private = Document.objects.create(author=self.user, title='Private', content='<p>x</p>')
+        etag = self.client.get(self.list_url)['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            private.is_public = True
+            private.save()
+        etag, previous = self.client.get(self.list_url, HTTP_IF_NONE_MATCH=etag)['ETag'], etag
+        self.assertNotEqual(etag, previous)
+        with self.captureOnCommitCallbacks(execute=True):
+            bulk.update_fields(self.user, [private.pk], {'is_public': False})
+        self.assertEqual(self.client.get(self.list_url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_comment_list_etag_is_scoped_to_its_document(self):
+        other = Document.objects.create(author=self.user, title='Other', content='<p>x</p>', is_public=True)
+        url = reverse('comment-list-create', args=[self.document.pk])
+        etag = self.client.get(url)['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            Comment.objects.create(document=other, author=self.user, body='elsewhere')
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        with self.captureOnCommitCallbacks(execute=True):
+            Comment.objects.create(document=self.document, author=self.user, body='here')
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_responses_vary_on_credentials(self):
+        for url in (self.list_url, self.detail_url):
+            vary = self.client.get(url)['Vary']
+            self.assertIn('Authorization', vary)
+            self.assertIn('Cookie', vary)
+
+    def test_if_match_accepts_an_etag_read_with_a_format(self):
+        self.client.force_login(self.user)
+        etag = self.client.get(self.detail_url, {'format': 'markdown'})['ETag']
+        self.assertNotEqual(etag, self.client.get(self.detail_url)['ETag'])
+        response = self.client.patch(self.detail_url, {'title': 'Guarded'}, content_type='application/json',
+                                     HTTP_IF_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        response = self.client.patch(self.detail_url, {'title': 'Stale'}, content_type='application/json',
+                                     HTTP_IF_MATCH=etag)
+        self.assertEqual(response.status_code, 412)
+
+
+class VisibilityPlanTests(TestCase):
+    """
+    With a few rows these only show that each part *can* be answered from its
+    partial index; VisibilityPlanAtScaleTests checks the planner's choice on
+    a large table.
+    """
+
+    def setUp(self):
+        self.user = User.objects.create_user('reader')
+        other = User.objects.create_user('other')
+        for index in range(30):
+            Document.objects.create(author=(self.user, other)[index % 2], title=f'Doc {index}',
+                                    content='<p>x</p>', is_public=index % 3 == 0)
+
+    def plan(self, queryset):
+        return queryset.order_by('-updated_at')[:20].explain()
+
+    def test_each_part_uses_its_partial_index(self):
+        public, own = visible_parts(Document.objects.all(), self.user)
+        self.assertIn('documents_public_live_idx', self.plan(public))
+        self.assertIn('documents_author_live_idx', self.plan(own))
+
+    def test_union_uses_both_partial_indexes(self):
+        plan = self.plan(combine(visible_parts(Document.objects.all(), self.user)))
+        self.assertIn('documents_public_live_idx', plan)
+        self.assertIn('documents_author_live_idx', plan)
+
+    def test_filters_and_search_apply_inside_both_parts(self):
+        request = APIRequestFactory().get('/', {'status': 'draft', 'document_type': 'other', 'search': '12'})
+        force_authenticate(request, self.user)
+        view = DocumentListCreateView(format_kwarg=None)
+        view.request = view.initialize_request(request)
+        parts = view.visible_querysets(view.get_queryset())
+        self.assertEqual(len(parts), 2)
+        for part in parts:
+            where = str(part.query).partition(' WHERE ')[2]
+            self.assertIn('"status" = draft', where)
+            self.assertIn('"document_type" = other', where)
+            self.assertIn('LIKE', where)
+        combined = str(view.filter_queryset(view.get_queryset()).query)
+        self.assertIn('UNION ALL', combined)
+        self.assertEqual(combined.count('"status" = draft'), 2)
+        expected = Document.objects.filter(Q(is_public=True) | Q(author=self.user), status='draft',
+                                           document_type='other', title__icontains='12')
+        self.assertCountEqual(view.filter_queryset(view.get_queryset()), expected)
+
+    def test_parts_are_disjoint_and_cover_the_visible_rows(self):
+        ids = list(combine(visible_parts(Document.objects.all(), self.user)).values_list('pk', flat=True))
+        expected = Document.objects.filter(Q(is_public=True) | Q(author=self.user)).values_list('pk', flat=True)
+        self.assertEqual(len(ids), len(set(ids)))
+        self.assertCountEqual(ids, expected)
+
+
+@tag('slow')
+@skipUnless(os.environ.get('PLAN_TEST_DOCUMENTS'), "set PLAN_TEST_DOCUMENTS (e.g. 1000000) to check plans at scale")
+class VisibilityPlanAtScaleTests(TestCase):
+    def test_union_plans_use_both_partial_indexes(self):
+        # Seeds PLAN_TEST_DOCUMENTS rows, runs ANALYZE and fails unless every
+        # filtered UNION ALL plan uses both partial indexes.
+        call_command('bench_document_list', documents=int(os.environ['PLAN_TEST_DOCUMENTS']), repeat=1,
+                     strict=True, stdout=io.StringIO())
+
+
+@override_settings(TASKS_ALWAYS_EAGER=True, PUBLIC_FEED_PAGE_SIZE=3, PUBLIC_FEED_MAX_ITEMS=7)
+class PublicFeedTests(TestCase):
+    """
+    After every change the cached feeds must match a rebuild from the database.
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('publisher')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.python = Tag.objects.create(name='Python')
+            self.django = Tag.objects.create(name='Django')
+            self.documents = []
+            for index in range(10):
+                document = Document.objects.create(
+                    author=self.user, title=f'Post {index}', content=f'<p>post {index}</p>',
+                    status='published', is_public=True, document_type=('blog', 'tutorial')[index % 2],
+                )
+                document.tags.set([self.python] if index % 3 else [self.python, self.django])
+                self.documents.append(document)
+        self.keys = ['all', 'type:blog', 'type:tutorial', 'tag:python', 'tag:django']
+        self.warm()
+
+    def warm(self):
+        for key in self.keys:
+            number = 1
+            while feed.get_page(key, number) is not None:
+                number += 1
+
+    def change(self):
+        return self.captureOnCommitCallbacks(execute=True)
+
+    def fresh_pages(self, key):
+        index = feed.build_index(key)
+        ids = [pk for pk, _ in index['items']]
+        documents = feed.feed_queryset('all').filter(pk__in=ids).select_related('author').prefetch_related('tags')
+        fragments = {str(document.pk): feed.render_item(document) for document in documents}
+        kind, _, slug = key.partition(':')
+        if not ids and kind == 'tag' and not Tag.objects.filter(slug=slug).exists():
+            return index, {}
+        return index, {number: feed.render_page(ids, number, fragments) for number in range(1, feed.page_count(ids) + 1)}
+
+    def assertFeedsFresh(self):
+        for key in self.keys:
+            index = cache.get(feed.index_cache_key(key))
+            fresh_index, fresh_pages = self.fresh_pages(key)
+            if index is not None:
+                self.assertEqual(index['items'], fresh_index['items'], key)
+                # An index may under-report completeness, never over-report it.
+                self.assertTrue(fresh_index['complete'] or not index['complete'], key)
+            for number in range(1, feed.max_pages() + 1):
+                page = cache.get(feed.page_cache_key(key, number))
+                if page is not None:
+                    self.assertIsNotNone(index, key)
+                    self.assertEqual(page, fresh_pages.get(number), (key, number))
+            # Whatever was dropped is rebuilt correctly on the next request.
+            for number, page in fresh_pages.items():
+                self.assertEqual(feed.get_page(key, number), page, (key, number))
+            self.assertIsNone(feed.get_page(key, len(fresh_pages) + 1))
+
+    def test_warm_feeds_match_a_rebuild(self):
+        self.assertFeedsFresh()
+
+    def test_cache_hits_run_no_queries(self):
+        url = reverse('public-feed')
+        self.client.get(url, {'page': 2})
+        with self.assertNumQueries(0):
+            response = self.client.get(url, {'page': 2})
+        self.assertEqual(response.status_code, 200)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get(url, {'tag': 'django'}).status_code, 200)
+
+    def test_update_moves_the_document_without_a_rebuild(self):
+        with self.change():
+            document = self.documents[4]
+            document.title = 'Edited'
+            document.save()
+        self.assertIsNotNone(cache.get(feed.index_cache_key('all')))
+        self.assertEqual(feed.build_index('all')['items'][0][0], str(document.pk))
+        self.assertFeedsFresh()
+
+    def test_publish(self):
+        with self.change():
+            Document.objects.create(author=self.user, title='Fresh', content='<p>x</p>', status='published',
+                                    is_public=True, document_type='blog')
+            Document.objects.create(author=self.user, title='Draft', content='<p>x</p>', is_public=True)
+        self.assertFeedsFresh()
+
+    def test_unpublish(self):
+        for position in (0, 2, 9):
+            with self.subTest(position=position), self.change():
+                document = self.documents[position]
+                document.status = 'draft'
+                document.save()
+            self.assertFeedsFresh()
+
+    def test_document_beyond_the_cut_off_moves_in_and_out(self):
+        # Post 0 is the oldest, past PUBLIC_FEED_MAX_ITEMS of the 'all' feed.
+        oldest = self.documents[0]
+        with self.change():
+            oldest.title = 'Bumped'
+            oldest.save()
+        self.assertFeedsFresh()
+        with self.change():
+            oldest.is_public = False
+            oldest.save()
+        self.assertFeedsFresh()
+
+    def test_retag(self):
+        document = self.documents[5]
+        with self.change():
+            document.tags.add(self.django)
+        self.assertFeedsFresh()
+        with self.change():
+            document.tags.remove(self.python)
+        self.assertFeedsFresh()
+        with self.change():
+            self.documents[3].tags.clear()
+        self.assertFeedsFresh()
+        with self.change():
+            self.django.tagged_documents.clear()
+        self.assertFeedsFresh()
+
+    def test_tag_rename_and_soft_delete(self):
+        with self.change():
+            self.django.name = 'Web'
+            self.django.save()
+        self.assertFeedsFresh()
+        with self.change():
+            self.django.soft_delete = True
+            self.django.save()
+        self.assertFeedsFresh()
+
+    def test_delete_and_soft_delete(self):
+        with self.change():
+            self.documents[6].delete()
+        self.assertFeedsFresh()
+        with self.change():
+            set_soft_deleted(self.user, [self.documents[8].pk, self.documents[1].pk], True)
+        self.assertFeedsFresh()
+        with self.change():
+            set_soft_deleted(self.user, [self.documents[8].pk], False)
+        self.assertFeedsFresh()
+
+    def test_reposition_cut_off(self):
+        index = {'items': [('c', 3.0), ('b', 2.0), ('a', 1.0)], 'complete': False}
+        with override_settings(PUBLIC_FEED_MAX_ITEMS=3):
+            # Entering at the top pushes the last item out.
+            self.assertTrue(feed.reposition(index, 'd', ('d', 4.0)))
+            self.assertEqual([pk for pk, _ in index['items']], ['d', 'c', 'b'])
+            # Older than everything in an incomplete index: position unknown.
+            self.assertTrue(feed.reposition(index, 'z', ('z', 0.5)))
+            self.assertEqual([pk for pk, _ in index['items']], ['d', 'c', 'b'])
+            # Leaving an incomplete index leaves a gap only the database can fill.
+            self.assertFalse(feed.reposition(dict(index), 'c', None))
+            # Moving from inside to past the cut-off likewise.
+            self.assertFalse(feed.reposition(dict(index), 'c', ('c', 0.1)))
+            complete = {'items': [('b', 2.0), ('a', 1.0)], 'complete': True}
+            self.assertTrue(feed.reposition(complete, 'z', ('z', 0.5)))
+            self.assertEqual([pk for pk, _ in complete['items']], ['b', 'a', 'z'])
+            self.assertTrue(feed.reposition(complete, 'b', None))
+            self.assertEqual(complete, {'items': [('a', 1.0), ('z', 0.5)], 'complete': True})
@@ -6,7 +6,17 @@ from .views import (
     DocumentListCreateView,
     DocumentRetrieveUpdateDestroyView,
     CommentListCreateView,
-    CommentRetrieveUpdateDestroyView
+    CommentRetrieveUpdateDestroyView,
+    DocumentRevisionListView,
+    DocumentRevisionDetailView,
+    DocumentRevisionDiffView,
+    DocumentSummaryView,
+    DocumentBulkSoftDeleteView,
+    DocumentBulkRestoreView,
+    DocumentBulkUpdateView,
+    DocumentEventStreamView,
+    DocumentCollabView,
+    PublicFeedView,
 )
 
 
@@ -15,9 +25,20 @@ router.register(r'tags', TagViewSet)
 
 urlpatterns = [
     path('', include(router.urls)),
+    path('feed/', PublicFeedView.as_view(), name='public-feed'),
     path('docs/', DocumentListCreateView.as_view(), name='document-list-create'),
+    path('docs/bulk/', DocumentBulkUpdateView.as_view(), name='document-bulk-update'),
+    path('docs/bulk-delete/', DocumentBulkSoftDeleteView.as_view(), name='document-bulk-delete'),
+    path('docs/bulk-restore/', DocumentBulkRestoreView.as_view(), name='document-bulk-restore'),
     path('docs/<str:pk>/', DocumentRetrieveUpdateDestroyView.as_view(), name='document-retrieve-update-destroy'),
+    path('docs/<str:pk>/summary/', DocumentSummaryView.as_view(), name='document-summary'),
+    path('docs/<str:pk>/events/', DocumentEventStreamView.as_view(), name='document-events'),
+    path('docs/<str:pk>/collab/<str:field>/', DocumentCollabView.as_view(), name='document-collab'),
 
     path('docs/<str:document_id>/comments/', CommentListCreateView.as_view(), name='comment-list-create'),
     path('docs/comments/<str:pk>/', CommentRetrieveUpdateDestroyView.as_view(), name='comment-retrieve-update-destroy'),
+
+    path('docs/<str:document_id>/revisions/', DocumentRevisionListView.as_view(), name='document-revision-list'),
+    path('docs/<str:document_id>/revisions/<int:number>/', DocumentRevisionDetailView.as_view(), name='document-revision-detail'),
+    path('docs/<str:document_id>/revisions/<int:number>/diff/', DocumentRevisionDiffView.as_view(), name='document-revision-diff'),
 ]
\ No newline at end of file
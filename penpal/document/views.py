@@ -1,17 +1,39 @@
 # views.py
-from django.db.models import Q
+from django.conf import settings
+from django.http import HttpResponse, StreamingHttpResponse
 from django.template.context_processors import request
+from django.utils.cache import get_conditional_response, patch_cache_control
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework import filters
 from rest_framework import generics
 from rest_framework import permissions
+from rest_framework import status
 from rest_framework import viewsets
+from rest_framework.generics import get_object_or_404
+from rest_framework.negotiation import DefaultContentNegotiation
+from rest_framework.exceptions import NotFound, ValidationError
 from rest_framework.permissions import IsAuthenticated
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+from rest_framework.response import Response
+from rest_framework.views import APIView
 
-from .models import Document, Tag, Comment
-from .permissions import DocumentPermission, CommentPermission
+from penpal.throttling import ScopedRateThrottle
+
+from . import conditional
+from .bulk import UPDATED, add_tags, normalize_ids, remove_tags, results_for, set_soft_deleted, update_fields
+from .collab import COLLAB_FIELDS, OperationError, StaleVersion, sessions
+from .conditional import ConditionalDetailMixin, ConditionalListMixin
+from .converters import FORMATS
+from .feed import TYPES, feed_key, get_page
+from .events import event_stream
+from .models import Document, Tag, Comment, DocumentRevision
+from .permissions import CollabPermission, DocumentPermission, CommentPermission
+from .rendering import render
+from .revisions import reconstruct, restore, unified_diff
 from .serilaizers import TagSerializer, CommentSerializer, DocumentListSerializer, DocumentDetailSerializer, \
-    DocumentSerializer
+    DocumentSerializer, DocumentRevisionSerializer, DocumentSummarySerializer, DocumentIdsSerializer, \
+    DocumentBulkSerializer, CollabOperationsSerializer
+from .visibility import combine, visible_parts
 
 
 class TagViewSet(viewsets.ModelViewSet):
@@ -19,14 +41,27 @@ class TagViewSet(viewsets.ModelViewSet):
     serializer_class = TagSerializer
     permission_classes = [IsAuthenticated]
 
+    def perform_destroy(self, instance):
+        # Soft delete keeps existing document tag links restorable
+        instance.soft_delete = True
+        instance.save(update_fields=['soft_delete', 'updated_at'])
+
 
-class DocumentListCreateView(generics.ListCreateAPIView):
+class DocumentListCreateView(ConditionalListMixin, generics.ListCreateAPIView):
     serializer_class = DocumentListSerializer
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
     filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
     filterset_fields = ['document_type', 'status', 'editor_type', 'is_public', 'author__id']
-    search_fields = ['title', 'description', 'content']
+    search_fields = ['title', 'description', 'plain_text']
     ordering_fields = ['created_at', 'updated_at']
+    ordering = ['-updated_at']
+
+    def get_stamp_scopes(self):
+        # The same parts as visible_parts(): public documents and the user's own.
+        scopes = [conditional.PUBLIC_DOCUMENTS, conditional.TAGS]
+        if self.request.user.is_authenticated:
+            scopes.append(conditional.author_scope(self.request.user.pk))
+        return scopes
 
     def get_serializer_class(self):
         if self.request.method == 'POST':
@@ -34,37 +69,241 @@ class DocumentListCreateView(generics.ListCreateAPIView):
         return DocumentListSerializer
 
     def get_queryset(self):
-        user = self.request.user
-        qs = (Document.objects.select_related('author')
-              .prefetch_related('tags','comments')
-              .filter(soft_delete=False))
-        if user.is_authenticated:
-            qs = qs.filter(Q(is_public=True) | Q(author=user))
-        else:
-            qs = qs.filter(is_public=True)
-        return qs
+        # Visibility is applied per part by filter_queryset().
+        return (Document.objects.select_related('author')
+                .prefetch_related('tags','comments'))
+
+    def visible_querysets(self, queryset):
+        """
+        The user's visible parts of ``queryset`` with filters and search
+        applied to each (see document/visibility.py).
+        """
+        parts = []
+        for part in visible_parts(queryset, self.request.user):
+            for backend in self.filter_backends:
+                if backend is not filters.OrderingFilter:
+                    part = backend().filter_queryset(self.request, part, self)
+            parts.append(part)
+        return parts
+
+    def filter_queryset(self, queryset):
+        combined = combine(self.visible_querysets(queryset))
+        return filters.OrderingFilter().filter_queryset(self.request, combined, self)
 
     def perform_create(self, serializer):
         serializer.save(author=self.request.user)
 
 
-class DocumentRetrieveUpdateDestroyView(generics.RetrieveUpdateDestroyAPIView):
+class DocumentFormatNegotiation(DefaultContentNegotiation):
+    """
+    Treat ``?format=<document format>`` as a content format, not a renderer override.
+    """
+
+    def filter_renderers(self, renderers, format):
+        if format in FORMATS:
+            return renderers
+        return super().filter_renderers(renderers, format)
+
+
+class DocumentRetrieveUpdateDestroyView(ConditionalDetailMixin, generics.RetrieveUpdateDestroyAPIView):
     """
     Retrieve, update, or delete a document.
+    GET ?format=html|tiptap|blocknote|markdown adds the content converted to that format.
     """
     serializer_class = DocumentDetailSerializer
     permission_classes = [permissions.IsAuthenticatedOrReadOnly, DocumentPermission]
+    content_negotiation_class = DocumentFormatNegotiation
     queryset = (Document.objects.select_related('author')
-                .prefetch_related('tags','comments')
-                .filter(soft_delete=False))
+                .prefetch_related('tags','comments'))
+    validator_queryset = Document.objects.select_related('author').only('id', 'updated_at', 'is_public', 'author')
+    related_validators = ('comments',)
+
+    def retrieve(self, request, *args, **kwargs):
+        instance = self.get_object()
+        data = self.get_serializer(instance).data
+        target = request.query_params.get('format')
+        if target in FORMATS:
+            data['format'] = target
+            data['rendered'] = render(instance, target)
+        return Response(data)
 
     def perform_destroy(self, instance):
-        # Soft delete instead of actual delete
-        instance.soft_delete = True
-        instance.save()
+        # Soft delete instead of actual delete, cascading to comments and media
+        set_soft_deleted(self.request.user, [instance.pk], True, request=self.request)
+
+
+def bulk_response(results):
+    """
+    The response shared by the bulk endpoints: ``{id: "updated" | "skipped"}``
+    in request order, plus both counts.
+    """
+    updated = sum(1 for result in results.values() if result == UPDATED)
+    return Response({'updated': updated, 'skipped': len(results) - updated, 'results': results})
 
 
-class CommentListCreateView(generics.ListCreateAPIView):
+class DocumentBulkSoftDeleteView(generics.GenericAPIView):
+    """
+    Soft-delete many of the current user's documents with their comments and media.
+    POST /api/documents/docs/bulk-delete/  {"ids": [...]}
+    """
+    serializer_class = DocumentIdsSerializer
+    permission_classes = [IsAuthenticated]
+    deleted = True
+
+    def post(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        ids = serializer.validated_data['ids']
+        changed, _ = set_soft_deleted(request.user, ids, self.deleted, request=request)
+        return bulk_response(results_for(normalize_ids(ids), changed))
+
+
+class DocumentBulkRestoreView(DocumentBulkSoftDeleteView):
+    """
+    Restore many soft-deleted documents with the comments and media removed alongside them.
+    POST /api/documents/docs/bulk-restore/  {"ids": [...]}
+    """
+    deleted = False
+
+
+class DocumentBulkUpdateView(generics.GenericAPIView):
+    """
+    Change fields or tags on many of the current user's documents at once.
+    POST /api/documents/docs/bulk/
+    """
+    serializer_class = DocumentBulkSerializer
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+        if data['action'] == 'update':
+            results = update_fields(request.user, data['ids'], data['fields'], request=request)
+        elif data['action'] == 'add_tags':
+            results = add_tags(request.user, data['ids'], data['tag_ids'], request=request)
+        else:
+            results = remove_tags(request.user, data['ids'], data['tag_ids'], request=request)
+        return bulk_response(results)
+
+
+class EventStreamRenderer(BaseRenderer):
+    """
+    Lets clients send ``Accept: text/event-stream``; errors become one SSE frame.
+    """
+    media_type = 'text/event-stream'
+    format = 'sse'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        payload = JSONRenderer().render(data).decode()
+        return f"event: error\ndata: {payload}\n\n".encode()
+
+
+class DocumentEventStreamView(generics.GenericAPIView):
+    """
+    Server-Sent Events feed of changes to one document (requires ASGI).
+    GET /api/documents/docs/<pk>/events/
+    """
+    permission_classes = [permissions.IsAuthenticatedOrReadOnly, DocumentPermission]
+    renderer_classes = [JSONRenderer, EventStreamRenderer]
+    queryset = Document.objects.select_related('author').only('id', 'is_public', 'author')
+
+    def get(self, request, *args, **kwargs):
+        document = self.get_object()
+        response = StreamingHttpResponse(
+            event_stream(document.pk, request.user.pk, document.author_id),
+            content_type='text/event-stream',
+        )
+        response['Cache-Control'] = 'no-cache'
+        response['X-Accel-Buffering'] = 'no'
+        return response
+
+
+class DocumentCollabView(generics.GenericAPIView):
+    """
+    Operational-transform editing session for an editor JSON field.
+    GET  /api/documents/docs/<pk>/collab/<field>/  current version and content
+    POST /api/documents/docs/<pk>/collab/<field>/  {"version": n, "ops": [...], "client": "..."}
+    """
+    serializer_class = CollabOperationsSerializer
+    permission_classes = [permissions.IsAuthenticatedOrReadOnly, CollabPermission]
+    throttle_classes = [ScopedRateThrottle]
+    throttle_scope = 'collab'
+    # The field itself is only loaded when a session is opened.
+    queryset = Document.objects.select_related('author').only('id', 'is_public', 'allow_editing', 'author')
+
+    def get_session(self):
+        field = self.kwargs['field']
+        if field not in COLLAB_FIELDS:
+            raise NotFound(f"Collaborative editing is available for: {', '.join(COLLAB_FIELDS)}")
+        return sessions.get(self.get_object(), field)
+
+    def get(self, request, *args, **kwargs):
+        version, content = self.get_session().snapshot()
+        return Response({'version': version, 'content': content})
+
+    def post(self, request, *args, **kwargs):
+        session = self.get_session()
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+        try:
+            version, ops = session.submit(data['version'], data['ops'], data.get('client'))
+        except StaleVersion:
+            return Response(
+                {'detail': "Version is too old; reload the document.", 'version': session.version},
+                status=status.HTTP_409_CONFLICT,
+            )
+        except OperationError as exc:
+            raise ValidationError({'ops': [str(exc)]})
+        return Response({'version': version, 'ops': ops})
+
+
+class DocumentSummaryView(ConditionalDetailMixin, generics.RetrieveAPIView):
+    """
+    Lightweight document summary read from the precomputed columns only.
+    GET /api/documents/docs/<pk>/summary/
+    """
+    serializer_class = DocumentSummarySerializer
+    permission_classes = [permissions.IsAuthenticatedOrReadOnly, DocumentPermission]
+    queryset = (Document.objects.select_related('author')
+                .only('id', 'author__username', 'title', 'description', 'excerpt', 'outline',
+                      'word_count', 'read_time', 'content_hash', 'document_type', 'editor_type',
+                      'status', 'updated_at', 'is_public'))
+    validator_queryset = Document.objects.select_related('author').only('id', 'updated_at', 'is_public', 'author')
+
+
+class PublicFeedView(APIView):
+    """
+    Published public documents, newest first, served from precomputed pages.
+    GET /api/documents/feed/?type=<document_type>&tag=<slug>&page=<n>
+    """
+    permission_classes = [permissions.AllowAny]
+
+    def get(self, request, *args, **kwargs):
+        document_type = request.query_params.get('type') or None
+        tag = request.query_params.get('tag') or None
+        if document_type and tag:
+            raise ValidationError({'detail': "Filter by type or by tag, not both."})
+        if document_type and document_type not in TYPES:
+            raise ValidationError({'type': f"Must be one of: {', '.join(TYPES)}."})
+        try:
+            number = int(request.query_params.get('page', 1))
+        except ValueError:
+            raise NotFound("Invalid page.")
+        page = get_page(feed_key(document_type, tag), number) if number >= 1 else None
+        if page is None:
+            raise NotFound("Invalid page.")
+
+        etag, body = page
+        response = get_conditional_response(request, etag=etag) or HttpResponse(body, content_type='application/json')
+        response['ETag'] = etag
+        patch_cache_control(response, public=True, max_age=settings.PUBLIC_FEED_MAX_AGE)
+        return response
+
+
+class CommentListCreateView(ConditionalListMixin, generics.ListCreateAPIView):
     """
     List all comments for a document or create a new one.
     """
@@ -74,22 +313,97 @@ class CommentListCreateView(generics.ListCreateAPIView):
     def get_queryset(self):
         document_id = self.kwargs.get('document_id')
         return (Comment.objects.select_related('document', 'author')
-                .filter(document_id=document_id, soft_delete=False))
+                .filter(document_id=document_id))
+
+    def get_stamp_scopes(self):
+        return [conditional.comments_scope(self.kwargs.get('document_id'))]
 
     def perform_create(self, serializer):
         document_id = self.kwargs.get('document_id')
         serializer.save(author=self.request.user, document_id=document_id)
 
 
-class CommentRetrieveUpdateDestroyView(generics.RetrieveUpdateDestroyAPIView):
+class CommentRetrieveUpdateDestroyView(ConditionalDetailMixin, generics.RetrieveUpdateDestroyAPIView):
     """
     Retrieve, update, or delete a specific comment.
     """
     serializer_class = CommentSerializer
     permission_classes = [permissions.IsAuthenticatedOrReadOnly, CommentPermission]
-    queryset = (Comment.objects.select_related('document', 'author')
-                .filter(soft_delete=False))
+    queryset = Comment.objects.select_related('document', 'author')
+    validator_queryset = (Comment.objects.select_related('document__author')
+                          .only('id', 'updated_at', 'author', 'document__id', 'document__is_public', 'document__author'))
 
     def perform_destroy(self, instance):
         instance.soft_delete = True
-        instance.save()
\ No newline at end of file
+        instance.save()
+
+
+class DocumentRevisionMixin:
+    """
+    Resolve the parent document from the URL and apply DocumentPermission to it.
+    """
+    permission_classes = [permissions.IsAuthenticatedOrReadOnly, DocumentPermission]
+
+    def get_document(self):
+        document = get_object_or_404(
+            Document.objects.select_related('author').only('id', 'is_public', 'author'),
+            pk=self.kwargs.get('document_id')
+        )
+        self.check_object_permissions(self.request, document)
+        return document
+
+    def get_snapshot(self, document, number):
+        data = reconstruct(document.pk, number)
+        if data is None:
+            raise NotFound(f"Revision {number} does not exist.")
+        return data
+
+
+class DocumentRevisionListView(DocumentRevisionMixin, generics.ListAPIView):
+    """
+    List revisions of a document, newest first.
+    GET /api/documents/docs/<document_id>/revisions/
+    """
+    serializer_class = DocumentRevisionSerializer
+
+    def get_queryset(self):
+        document = self.get_document()
+        return (DocumentRevision.objects
+                .filter(document_id=document.pk)
+                .only('number', 'is_keyframe', 'size', 'created_at'))
+
+
+class DocumentRevisionDetailView(DocumentRevisionMixin, generics.GenericAPIView):
+    """
+    Reconstruct a single revision.
+    GET /api/documents/docs/<document_id>/revisions/<number>/
+    """
+
+    def get(self, request, *args, **kwargs):
+        document = self.get_document()
+        number = self.kwargs['number']
+        data = restore(self.get_snapshot(document, number))
+        return Response({'number': number, **data})
+
+
+class DocumentRevisionDiffView(DocumentRevisionMixin, generics.GenericAPIView):
+    """
+    Unified diff between two revisions (defaults to the previous one).
+    GET /api/documents/docs/<document_id>/revisions/<number>/diff/?against=<number>
+    """
+
+    def get(self, request, *args, **kwargs):
+        document = self.get_document()
+        number = self.kwargs['number']
+        try:
+            against = int(request.query_params.get('against', number - 1))
+        except ValueError:
+            raise ValidationError({"against": "Must be a revision number."})
+
+        new = self.get_snapshot(document, number)
+        old = self.get_snapshot(document, against) if against > 0 else {}
+        return Response({
+            'from': against,
+            'to': number,
+            'diff': unified_diff(old, new, f"r{against}", f"r{number}"),
+        })
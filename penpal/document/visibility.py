@@ -0,0 +1,38 @@
+"""
+The documents a user may list: public ones and their own.
+
+``is_public OR author = me`` spans two columns, so no single index answers
+it and the planner scans and sorts every live row. The list is instead
+built from disjoint parts, each matching one partial index:
+
+- ``is_public`` → ``documents_public_live_idx (-updated_at)``;
+- ``author = me AND NOT is_public`` → ``documents_author_live_idx
+  (author, -updated_at)``;
+
+with filters and search applied inside each part, and the parts combined
+with ``UNION ALL`` (no duplicate elimination is needed) before ordering and
+slicing, so a page is a merge of two index scans. ``manage.py
+bench_document_list`` compares the plans on synthetic data.
+"""
+
+
+def visible_parts(queryset, user):
+    """
+    Disjoint querysets that together hold the documents of ``queryset``
+    visible to ``user``.
+    """
+    parts = [queryset.filter(is_public=True)]
+    if user is not None and user.is_authenticated:
+        parts.append(queryset.filter(author=user, is_public=False))
+    return parts
+
+
+def combine(parts):
+    """
+    One queryset over ``parts``: ``UNION ALL`` of them, unordered, or the
+    only part as it is.
+    """
+    if len(parts) == 1:
+        return parts[0]
+    first, *rest = (part.order_by() for part in parts)
+    return first.union(*rest, all=True)
@@ -0,0 +1,13 @@
+from django.apps import AppConfig
+from django.conf import settings
+
+
+class PenpalConfig(AppConfig):
+    name = 'penpal'
+
+    def ready(self):
+        from . import checks  # noqa: F401
+
+        if settings.REQUEST_PHASE_TIMING:
+            from .profiling import install
+            install()
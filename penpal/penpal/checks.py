@@ -0,0 +1,25 @@
+"""
+System checks for settings that only matter once more than one process serves
+the API. Run with ``python manage.py check --deploy``.
+"""
+from django.conf import settings
+from django.core.checks import Tags, Warning, register
+
+
+PROCESS_LOCAL_CACHES = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+
+@register(Tags.caches, deploy=True)
+def check_shared_cache(app_configs, **kwargs):
+    backend = settings.CACHES.get('default', {}).get('BACKEND')
+    if backend not in PROCESS_LOCAL_CACHES:
+        return []
+    return [Warning(
+        'The default cache is local to each process, so throttle windows and cached feed pages are not '
+        'shared between workers, and change-feed events only reach clients of the worker that wrote them.',
+        hint='Set REDIS_URL to a Redis server reachable from every worker.',
+        id='penpal.W001',
+    )]
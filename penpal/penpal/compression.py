@@ -0,0 +1,263 @@
+"""
+Response compression for API responses.
+
+``Accept-Encoding`` is negotiated against the encodings available here:
+brotli (the ``brotli`` package, a project dependency), zstd when the
+interpreter ships ``compression.zstd`` (Python 3.14+), and gzip. Bodies smaller than
+``COMPRESSION_MIN_SIZE`` go out as-is; streaming responses (exports) are
+compressed chunk by chunk without buffering the whole body.
+
+Responses that carry an ``ETag`` are the hot, revalidated representations
+(document lists and details), so their compressed bodies are cached, keyed
+by a digest of the uncompressed body and the encoding; a document that has
+not changed is compressed once rather than on every hit.
+
+Each encoding is a different representation, so its name is appended to the
+``ETag`` (``"abc-gzip"``). The suffix is stripped from incoming
+``If-None-Match``/``If-Match`` before the view compares validators, which
+keeps strong ``If-Match`` checks working for clients that echo the ETag.
+"""
+import hashlib
+import re
+import zlib
+
+import brotli
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.cache import patch_vary_headers
+
+try:
+    from compression import zstd
+except ImportError:
+    zstd = None
+
+
+GZIP_LEVEL = 6
+# Brotli's default (11) is meant for static assets; 5 compresses about as
+# well as gzip -9 at a fraction of the cost.
+BROTLI_QUALITY = 5
+ZSTD_LEVEL = 3
+
+COMPRESSIBLE_TYPES = (
+    'application/json',
+    'application/javascript',
+    'application/xml',
+    'image/svg+xml',
+    'text/',
+)
+# The change feed must reach the client event by event.
+UNCOMPRESSED_TYPES = ('text/event-stream',)
+
+ETAG_SUFFIX_RE = re.compile(r'-(br|zstd|gzip)"')
+ENCODING_ATTR = '_etag_encoding'
+
+
+class GzipStream:
+    def __init__(self):
+        # wbits 31: gzip container with a zero mtime, so output is deterministic.
+        self._compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)
+
+    def compress(self, data):
+        return self._compressor.compress(data)
+
+    def finish(self):
+        return self._compressor.flush()
+
+
+class BrotliStream:
+    def __init__(self):
+        self._compressor = brotli.Compressor(quality=BROTLI_QUALITY)
+
+    def compress(self, data):
+        return self._compressor.process(data)
+
+    def finish(self):
+        return self._compressor.finish()
+
+
+class ZstdStream:
+    def __init__(self):
+        self._compressor = zstd.ZstdCompressor(level=ZSTD_LEVEL)
+
+    def compress(self, data):
+        return self._compressor.compress(data)
+
+    def finish(self):
+        return self._compressor.flush()
+
+
+STREAMS = {'br': BrotliStream, 'zstd': ZstdStream, 'gzip': GzipStream}
+
+
+def available_encodings():
+    """
+    Encodings in server preference order.
+    """
+    encodings = ['br']
+    if zstd is not None:
+        encodings.append('zstd')
+    encodings.append('gzip')
+    return encodings
+
+
+def negotiate(accept_encoding):
+    """
+    Pick the encoding for an ``Accept-Encoding`` header, or ``None``.
+
+    The client's q-values win; ties go to the server's preference order.
+    """
+    if not accept_encoding:
+        return None
+    qualities = {}
+    for item in accept_encoding.split(','):
+        name, _, params = item.partition(';')
+        quality = 1.0
+        for param in params.split(';'):
+            key, _, value = param.strip().partition('=')
+            if key.lower() == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        qualities[name.strip().lower()] = quality
+
+    best, best_quality = None, 0.0
+    for encoding in available_encodings():
+        quality = qualities.get(encoding, qualities.get('*', 0.0))
+        if quality > best_quality:
+            best, best_quality = encoding, quality
+    return best
+
+
+def compress_body(body, encoding):
+    if encoding == 'br':
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    if encoding == 'zstd':
+        return zstd.compress(body, level=ZSTD_LEVEL)
+    if encoding == 'gzip':
+        return zlib.compress(body, GZIP_LEVEL, wbits=31)
+    raise ValueError(f'Unsupported encoding: {encoding}')
+
+
+def cached_compress(body, encoding, timeout=None):
+    """
+    ``compress_body`` through the default cache.
+
+    The key is a digest of the uncompressed body, so entries are shared by
+    every response with the same bytes and never served for different ones.
+    """
+    timeout = settings.COMPRESSION_CACHE_TIMEOUT if timeout is None else timeout
+    if not timeout or len(body) > settings.COMPRESSION_CACHE_MAX_SIZE:
+        return compress_body(body, encoding)
+    key = f'compressed:{encoding}:{hashlib.sha256(body).hexdigest()}'
+    compressed = cache.get(key)
+    if compressed is None:
+        compressed = compress_body(body, encoding)
+        cache.set(key, compressed, timeout)
+    return compressed
+
+
+def compress_stream(chunks, encoding):
+    stream = STREAMS[encoding]()
+    for chunk in chunks:
+        data = stream.compress(chunk)
+        if data:
+            yield data
+    yield stream.finish()
+
+
+async def acompress_stream(chunks, encoding):
+    stream = STREAMS[encoding]()
+    async for chunk in chunks:
+        data = stream.compress(chunk)
+        if data:
+            yield data
+    yield stream.finish()
+
+
+def suffix_etag(etag, encoding):
+    if etag.endswith('"'):
+        return f'{etag[:-1]}-{encoding}"'
+    return etag
+
+
+def strip_etag_suffixes(request):
+    """
+    Remove encoding suffixes from the request's validators.
+
+    Returns the encoding of the first suffixed ``If-None-Match`` tag, which a
+    ``304`` has to echo back.
+    """
+    encoding = None
+    for header in ('HTTP_IF_NONE_MATCH', 'HTTP_IF_MATCH'):
+        value = request.META.get(header)
+        if not value:
+            continue
+        match = ETAG_SUFFIX_RE.search(value)
+        if match is None:
+            continue
+        if header == 'HTTP_IF_NONE_MATCH':
+            encoding = match.group(1)
+        request.META[header] = ETAG_SUFFIX_RE.sub('"', value)
+    return encoding
+
+
+def is_compressible(response):
+    if response.status_code in (204, 206) or response.has_header('Content-Encoding'):
+        return False
+    if 'no-transform' in response.get('Cache-Control', ''):
+        return False
+    content_type = response.get('Content-Type', '').split(';')[0].strip().lower()
+    if content_type in UNCOMPRESSED_TYPES:
+        return False
+    return content_type.startswith(COMPRESSIBLE_TYPES) or content_type.endswith('+json')
+
+
+class CompressionMiddleware:
+    """
+    Compress API responses with the best encoding the client accepts.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        setattr(request, ENCODING_ATTR, strip_etag_suffixes(request))
+        response = self.get_response(request)
+        return self.process_response(request, response)
+
+    def process_response(self, request, response):
+        if response.status_code == 304:
+            encoding = getattr(request, ENCODING_ATTR, None)
+            if encoding and response.has_header('ETag'):
+                response['ETag'] = suffix_etag(response['ETag'], encoding)
+            return response
+
+        if not is_compressible(response):
+            return response
+        if not response.streaming and len(response.content) < settings.COMPRESSION_MIN_SIZE:
+            return response
+
+        patch_vary_headers(response, ('Accept-Encoding',))
+        encoding = negotiate(request.META.get('HTTP_ACCEPT_ENCODING', ''))
+        if encoding is None:
+            return response
+
+        if response.streaming:
+            if response.is_async:
+                response.streaming_content = acompress_stream(response.streaming_content, encoding)
+            else:
+                response.streaming_content = compress_stream(response.streaming_content, encoding)
+            del response['Content-Length']
+        else:
+            compress = cached_compress if response.has_header('ETag') else compress_body
+            body = compress(response.content, encoding)
+            if len(body) >= len(response.content):
+                return response
+            response.content = body
+            response['Content-Length'] = str(len(body))
+
+        if response.has_header('ETag'):
+            response['ETag'] = suffix_etag(response['ETag'], encoding)
+        response['Content-Encoding'] = encoding
+        return response
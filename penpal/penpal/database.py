@@ -0,0 +1,113 @@
+"""
+Database configuration driven by environment variables.
+
+``DATABASE_URL`` selects the backend:
+
+- unset or ``sqlite:///path`` -> SQLite, with WAL journaling and tuned pragmas
+- ``postgres://`` / ``postgresql://`` -> PostgreSQL, using Django's native
+  connection pool (``psycopg[pool]``, a project dependency) or persistent connections
+
+Tuning variables (all optional):
+
+- ``DB_POOL`` - enable the PostgreSQL pool (default True)
+- ``DB_POOL_MIN_SIZE`` / ``DB_POOL_MAX_SIZE`` - pool bounds
+- ``DB_POOL_TIMEOUT`` - seconds to wait for a free pooled connection
+- ``DB_CONN_MAX_AGE`` - persistent connection lifetime when not pooling
+- ``DB_CONN_HEALTH_CHECKS`` - verify persistent connections before reuse
+- ``SQLITE_BUSY_TIMEOUT`` - seconds SQLite waits on a locked database
+"""
+from urllib.parse import unquote, urlparse
+
+from decouple import config
+
+
+SQLITE_PRAGMAS = (
+    'PRAGMA journal_mode=WAL',
+    'PRAGMA synchronous=NORMAL',
+    'PRAGMA temp_store=MEMORY',
+    'PRAGMA cache_size=-20000',
+    'PRAGMA mmap_size=134217728',
+    'PRAGMA foreign_keys=ON',
+)
+
+POSTGRES_SCHEMES = ('postgres', 'postgresql', 'pgsql')
+
+
+def sqlite_settings(name):
+    return {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': name,
+        'CONN_MAX_AGE': config('DB_CONN_MAX_AGE', default=0, cast=int),
+        'CONN_HEALTH_CHECKS': config('DB_CONN_HEALTH_CHECKS', default=False, cast=bool),
+        'OPTIONS': {
+            'init_command': ';'.join(SQLITE_PRAGMAS),
+            # Take the write lock at BEGIN so concurrent writers queue on
+            # busy_timeout instead of failing with "database is locked".
+            'transaction_mode': 'IMMEDIATE',
+            'timeout': config('SQLITE_BUSY_TIMEOUT', default=20, cast=int),
+        },
+    }
+
+
+def postgres_settings(url):
+    settings = {
+        'ENGINE': 'django.db.backends.postgresql',
+        'NAME': unquote(url.path.lstrip('/')),
+        'USER': unquote(url.username or ''),
+        'PASSWORD': unquote(url.password or ''),
+        'HOST': url.hostname or '',
+        'PORT': str(url.port or ''),
+        'OPTIONS': {},
+    }
+    if config('DB_POOL', default=True, cast=bool):
+        # Pooled connections are returned to the pool at the end of each
+        # request, so persistent connections must stay disabled.
+        settings['CONN_MAX_AGE'] = 0
+        settings['OPTIONS']['pool'] = {
+            'min_size': config('DB_POOL_MIN_SIZE', default=2, cast=int),
+            'max_size': config('DB_POOL_MAX_SIZE', default=10, cast=int),
+            'timeout': config('DB_POOL_TIMEOUT', default=10, cast=int),
+        }
+    else:
+        settings['CONN_MAX_AGE'] = config('DB_CONN_MAX_AGE', default=60, cast=int)
+        settings['CONN_HEALTH_CHECKS'] = config('DB_CONN_HEALTH_CHECKS', default=True, cast=bool)
+    return settings
+
+
+def database_settings(url, default_sqlite_path):
+    """
+    Build a single ``DATABASES`` entry from a database URL.
+    """
+    if not url:
+        return sqlite_settings(default_sqlite_path)
+
+    parsed = urlparse(url)
+    if parsed.scheme == 'sqlite':
+        # sqlite:///relative.db or sqlite:////absolute/path.db
+        return sqlite_settings(parsed.path[1:] or default_sqlite_path)
+    if parsed.scheme in POSTGRES_SCHEMES:
+        return postgres_settings(parsed)
+
+    raise ValueError(f"Unsupported DATABASE_URL scheme: '{parsed.scheme}'")
+
+
+def pool_stats(connection):
+    """
+    Return pool usage for a pooled PostgreSQL connection, or None.
+    """
+    pool = getattr(connection, 'pool', None)
+    if pool is None:
+        return None
+
+    stats = pool.get_stats()
+    size = stats.get('pool_size', 0)
+    available = stats.get('pool_available', 0)
+    in_use = size - available
+    return {
+        'size': size,
+        'available': available,
+        'in_use': in_use,
+        'max_size': pool.max_size,
+        'requests_waiting': stats.get('requests_waiting', 0),
+        'saturation': round(in_use / pool.max_size, 2) if pool.max_size else 0,
+    }
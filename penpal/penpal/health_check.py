@@ -1,8 +1,35 @@
+import os
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+
 from rest_framework import status
-from rest_framework.decorators import api_view, permission_classes
+from rest_framework.decorators import api_view, permission_classes, throttle_classes
 from rest_framework.response import Response
 from rest_framework.permissions import AllowAny
-from django.db import connection
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, connections
+
+from document.collab import sessions
+from document.events import get_broker
+from tasks.queue import queue_stats
+
+from .database import pool_stats
+from .metrics import IN_FLIGHT, Gauge, registry
+
+
+STARTED = time.monotonic()
+
+CHECK_UP = registry.register(Gauge(
+    'penpal_health_check_up', 'Result of the last readiness check (1 ok, 0.5 degraded, 0 failing).', ('check',),
+))
+CHECK_LATENCY = registry.register(Gauge(
+    'penpal_health_check_latency_seconds', 'Latency measured by the last readiness check.', ('check',),
+))
+CHECK_VALUES = {'ok': 1, 'degraded': 0.5, 'failing': 0}
 
 
 @api_view(['GET'])
@@ -18,11 +45,15 @@ def health_check(request):
             cursor.execute("SELECT 1")
             cursor.fetchone()
 
-        return Response({
+        data = {
             'status': 'healthy',
             'database': 'connected',
             'message': 'All systems operational'
-        }, status=status.HTTP_200_OK)
+        }
+        pool = pool_stats(connection)
+        if pool is not None:
+            data['pool'] = pool
+        return Response(data, status=status.HTTP_200_OK)
 
     except Exception as e:
         return Response({
@@ -30,3 +61,168 @@ def health_check(request):
             'database': 'disconnected',
             'error': str(e)
         }, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+
+
+# ---------------------------------------------------------------------------
+# Liveness / readiness
+# ---------------------------------------------------------------------------
+
+def worst(statuses):
+    return min(statuses, key=CHECK_VALUES.get, default='ok')
+
+
+def timed(function):
+    start = time.perf_counter()
+    result = function()
+    return result, time.perf_counter() - start
+
+
+def check_databases():
+    aliases = {}
+    for alias in connections:
+        def ping(alias=alias):
+            with connections[alias].cursor() as cursor:
+                cursor.execute("SELECT 1")
+                cursor.fetchone()
+        try:
+            _, latency = timed(ping)
+        except Exception as e:
+            aliases[alias] = {'status': 'failing', 'error': str(e)}
+            continue
+        result = {
+            'status': 'degraded' if latency * 1000 > settings.HEALTH_DB_SLOW_MS else 'ok',
+            'latency_ms': round(latency * 1000, 2),
+        }
+        pool = pool_stats(connections[alias])
+        if pool is not None:
+            result['pool'] = pool
+            if pool['requests_waiting']:
+                result['status'] = 'degraded'
+        aliases[alias] = result
+    return {
+        'status': worst(result['status'] for result in aliases.values()),
+        'latency_ms': max((result.get('latency_ms', 0) for result in aliases.values()), default=0),
+        'aliases': aliases,
+    }
+
+
+def check_cache():
+    key = f'health:{uuid.uuid4().hex}'
+
+    def roundtrip():
+        cache.set(key, 'ok', 10)
+        value = cache.get(key)
+        cache.delete(key)
+        return value
+
+    value, latency = timed(roundtrip)
+    return {'status': 'ok' if value == 'ok' else 'failing', 'latency_ms': round(latency * 1000, 2)}
+
+
+def check_media():
+    os.makedirs(settings.MEDIA_ROOT, exist_ok=True)
+
+    def write():
+        with tempfile.NamedTemporaryFile(dir=settings.MEDIA_ROOT, prefix='.health-') as handle:
+            handle.write(b'ok')
+            handle.flush()
+
+    _, latency = timed(write)
+    return {'status': 'ok', 'latency_ms': round(latency * 1000, 2)}
+
+
+def check_disk():
+    usage = shutil.disk_usage(settings.MEDIA_ROOT)
+    free_mb = usage.free // (1024 * 1024)
+    return {
+        'status': 'failing' if free_mb < settings.HEALTH_MIN_FREE_DISK_MB else 'ok',
+        'free_mb': free_mb,
+        'used_percent': round(usage.used / usage.total * 100, 1) if usage.total else 0,
+    }
+
+
+def check_queues():
+    in_flight = IN_FLIGHT.get()
+    limit = settings.HEALTH_MAX_IN_FLIGHT
+    tasks = queue_stats()
+    max_age = settings.HEALTH_MAX_TASK_AGE
+    saturated = (limit and in_flight > limit) or (max_age and tasks['oldest_ready_seconds'] > max_age)
+    return {
+        'status': 'degraded' if saturated else 'ok',
+        'requests_in_flight': in_flight,
+        'tasks': tasks,
+        'event_stream': get_broker().stats(),
+        'collab_sessions': len(sessions),
+    }
+
+
+READINESS_CHECKS = {
+    'database': check_databases,
+    'cache': check_cache,
+    'media': check_media,
+    'disk': check_disk,
+    'queues': check_queues,
+}
+
+_readiness = None
+_readiness_lock = threading.Lock()
+
+
+def run_check(name, check):
+    try:
+        result = check()
+    except Exception as e:
+        result = {'status': 'failing', 'error': str(e)}
+    CHECK_UP.set(CHECK_VALUES[result['status']], name)
+    if 'latency_ms' in result:
+        CHECK_LATENCY.set(result['latency_ms'] / 1000, name)
+    return result
+
+
+def readiness():
+    """
+    Run the readiness checks at most once per HEALTH_CACHE_SECONDS per process,
+    so frequent probes never turn into load on the database or disk.
+    """
+    global _readiness
+    now = time.monotonic()
+    if _readiness is not None and _readiness[0] > now:
+        return _readiness[1]
+    with _readiness_lock:
+        if _readiness is not None and _readiness[0] > time.monotonic():
+            return _readiness[1]
+        checks = {name: run_check(name, check) for name, check in READINESS_CHECKS.items()}
+        data = {
+            'status': worst(result['status'] for result in checks.values()),
+            'checked_at': time.time(),
+            'checks': checks,
+        }
+        _readiness = (time.monotonic() + settings.HEALTH_CACHE_SECONDS, data)
+        return data
+
+
+@api_view(['GET'])
+@permission_classes([AllowAny])
+@throttle_classes([])
+def liveness(request):
+    """
+    Liveness probe: the process is serving requests. Checks no dependencies.
+    GET /api/health/live/
+    """
+    return Response({'status': 'alive', 'uptime_seconds': round(time.monotonic() - STARTED, 1)})
+
+
+@api_view(['GET'])
+@permission_classes([AllowAny])
+@throttle_classes([])
+def readiness_check(request):
+    """
+    Readiness probe: database (with latency), cache, media writability, disk
+    headroom and queue depth. 503 when a check is failing; a degraded check
+    (slow database, saturated pool or worker, task backlog) is reported but
+    stays ready.
+    GET /api/health/ready/
+    """
+    data = readiness()
+    code = status.HTTP_503_SERVICE_UNAVAILABLE if data['status'] == 'failing' else status.HTTP_200_OK
+    return Response(data, status=code)
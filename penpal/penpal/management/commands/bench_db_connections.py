@@ -0,0 +1,59 @@
+import copy
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure per-request connection cost with a fresh connection per "
+        "request (the old behaviour) versus the configured pooling / "
+        "persistent-connection settings."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=500, help="Simulated requests per run.")
+        parser.add_argument('--database', default='default', help="Database alias to benchmark.")
+
+    def handle(self, *args, **options):
+        alias = options['database']
+        count = options['requests']
+
+        baseline = connections.create_connection(alias)
+        baseline.settings_dict = copy.deepcopy(baseline.settings_dict)
+        baseline.settings_dict['CONN_MAX_AGE'] = 0
+        baseline.settings_dict['OPTIONS'].pop('pool', None)
+
+        configured = connections.create_connection(alias)
+
+        self.stdout.write(f"{count} simulated requests against '{alias}' ({configured.vendor})")
+        for label, conn in (('per-request connect', baseline), ('configured', configured)):
+            timings = self.run(conn, count)
+            self.stdout.write(
+                f"  {label:<20} mean {statistics.mean(timings) * 1000:.3f} ms  "
+                f"p95 {self.percentile(timings, 95) * 1000:.3f} ms  "
+                f"total {sum(timings):.3f} s"
+            )
+            conn.close()
+
+    def run(self, conn, count):
+        timings = []
+        for _ in range(count):
+            start = time.perf_counter()
+            # Mirrors django.db.close_old_connections(), which runs on the
+            # request_started and request_finished signals.
+            conn.close_if_unusable_or_obsolete()
+            with conn.cursor() as cursor:
+                cursor.execute('SELECT 1')
+                cursor.fetchone()
+            conn.close_if_unusable_or_obsolete()
+            timings.append(time.perf_counter() - start)
+        return timings
+
+    @staticmethod
+    def percentile(values, pct):
+        ordered = sorted(values)
+        index = min(len(ordered) - 1, int(len(ordered) * pct / 100))
+        return ordered[index]
@@ -0,0 +1,129 @@
+import io
+import json
+import statistics
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from rest_framework.serializers import ModelSerializer
+
+from document.models import Document
+from document.serilaizers import DocumentListSerializer, DocumentSerializer
+from penpal.compression import available_encodings, cached_compress, compress_body
+from penpal.renderers import FastJSONParser, FastJSONRenderer
+
+
+class Rollback(Exception):
+    pass
+
+
+def plain(serializer_class):
+    """
+    The same serializer with stock JSONField mapping (no passthrough).
+    """
+    meta = type('Meta', (serializer_class.Meta,), {})
+    return type(f'Plain{serializer_class.__name__}', (serializer_class,), {
+        'serializer_field_mapping': ModelSerializer.serializer_field_mapping,
+        'Meta': meta,
+    })
+
+
+def sample_blocks(count):
+    return [
+        {
+            'id': f'block-{index}',
+            'type': 'heading' if index % 10 == 0 else 'paragraph',
+            'props': {'textColor': 'default', 'backgroundColor': 'default', 'textAlignment': 'left'},
+            'content': [{'type': 'text', 'text': f'Paragraph {index} ' + 'lorem ipsum dolor sit amet ' * 8,
+                         'styles': {'bold': index % 3 == 0}}],
+            'children': [],
+        }
+        for index in range(count)
+    ]
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare DRF's stock JSON rendering/parsing with the orjson renderer, "
+        "parser and stored-JSON passthrough on document list and detail payloads, "
+        "and the cost of compressing the list payload. "
+        "Runs inside a transaction that is rolled back."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--documents', type=int, default=20, help="Documents in the list payload.")
+        parser.add_argument('--blocks', type=int, default=300, help="Blocks per document body.")
+        parser.add_argument('--repeat', type=int, default=20)
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                self.run(options)
+                raise Rollback
+        except Rollback:
+            pass
+
+    def run(self, options):
+        user = User.objects.create_user(username='bench-json', password=None)
+        blocks = sample_blocks(options['blocks'])
+        for index in range(options['documents']):
+            Document.objects.create(
+                author=user, title=f'Benchmark document {index}', editor_type='blocknote',
+                block_note_content=blocks, content_json={'type': 'doc', 'content': blocks[:50]},
+            )
+        queryset = Document.objects.filter(author=user).select_related('author').prefetch_related('tags', 'comments')
+        repeat = options['repeat']
+
+        cases = (
+            ('list', lambda: list(queryset.all()), True),
+            ('detail', lambda: queryset.first(), False),
+        )
+        for label, load, many in cases:
+            serializer_class = DocumentListSerializer if many else DocumentSerializer
+            size = None
+            for name, serializer, renderer in (
+                ('stdlib', plain(serializer_class), JSONRenderer()),
+                ('orjson', plain(serializer_class), FastJSONRenderer()),
+                ('orjson+passthrough', serializer_class, FastJSONRenderer()),
+            ):
+                timings = []
+                for _ in range(repeat):
+                    instance = load()
+                    start = time.perf_counter()
+                    body = renderer.render(serializer(instance, many=many).data)
+                    timings.append(time.perf_counter() - start)
+                size = len(body)
+                self.report(f'{label} {name}', timings)
+            self.stdout.write(f"  ({label} payload {size / 1024:.0f} KiB)")
+            if many:
+                self.compression(body, repeat)
+
+        body = json.dumps({'block_note_content': blocks}).encode()
+        for name, parser in (('stdlib', JSONParser()), ('orjson', FastJSONParser())):
+            timings = []
+            for _ in range(repeat):
+                start = time.perf_counter()
+                parser.parse(io.BytesIO(body), 'application/json', {})
+                timings.append(time.perf_counter() - start)
+            self.report(f'parse {name}', timings)
+        self.stdout.write(f"  (request body {len(body) / 1024:.0f} KiB)")
+
+    def compression(self, body, repeat):
+        for encoding in available_encodings():
+            for name, compress in (('', compress_body), (' cached', cached_compress)):
+                timings = []
+                for _ in range(repeat):
+                    start = time.perf_counter()
+                    compressed = compress(body, encoding)
+                    timings.append(time.perf_counter() - start)
+                self.report(f'compress {encoding}{name}', timings)
+            self.stdout.write(f"  ({encoding} {len(compressed) / 1024:.0f} KiB)")
+
+    def report(self, label, timings):
+        self.stdout.write(
+            f"{label:<28} median {statistics.median(timings) * 1000:8.2f} ms  "
+            f"min {min(timings) * 1000:8.2f} ms"
+        )
@@ -0,0 +1,141 @@
+import collections
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+
+# Runs in a fresh interpreter and reports when each startup phase finished.
+PROBE = r'''
+import json, time
+start = time.perf_counter()
+import django
+from django.conf import settings
+settings.INSTALLED_APPS
+marks = {'settings': time.perf_counter()}
+django.setup()
+marks['apps'] = time.perf_counter()
+from django.urls import get_resolver
+get_resolver().url_patterns
+marks['urlconf'] = time.perf_counter()
+from django.core.handlers.wsgi import WSGIHandler
+WSGIHandler()
+marks['middleware'] = time.perf_counter()
+print(json.dumps({name: (value - start) * 1000 for name, value in marks.items()}))
+'''
+
+PHASES = ('settings', 'apps', 'urlconf', 'middleware')
+
+
+def parse_importtime(stderr):
+    """
+    ``[(module, self_us, cumulative_us)]`` from ``python -X importtime`` output.
+    """
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'imported package' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        rows.append((name.strip(), int(self_us), int(cumulative_us)))
+    return rows
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure cold start in fresh interpreters: settings import, app loading, "
+        "URLconf build and middleware chain, plus per-package import cost."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=5, help="Fresh interpreters to time.")
+        parser.add_argument('--imports', type=int, default=15, help="Rows in the import tables (0 to skip).")
+        parser.add_argument(
+            '--set', action='append', default=[], metavar='NAME=VALUE',
+            help="Environment override for the measured processes, e.g. --set API_DOCS_ENABLED=False.",
+        )
+        parser.add_argument(
+            '--no-bytecode-cache', action='store_true',
+            help="Compile every module from source, like a container image without .pyc files.",
+        )
+        parser.add_argument('--json', action='store_true', help="Print one JSON object for tracking results.")
+
+    def handle(self, *args, **options):
+        env = dict(os.environ)
+        for item in options['set']:
+            name, sep, value = item.partition('=')
+            if not sep:
+                raise CommandError(f"--set expects NAME=VALUE, got {item!r}")
+            env[name] = value
+
+        runs = []
+        for _ in range(options['repeat']):
+            runs.append(self.probe(env, options['no_bytecode_cache']))
+        result = {
+            'overrides': options['set'],
+            'no_bytecode_cache': options['no_bytecode_cache'],
+            'median_ms': {
+                phase: round(statistics.median(run[phase] for run in runs), 1)
+                for phase in (*PHASES, 'process')
+            },
+        }
+
+        if options['imports']:
+            _, stderr = self.run_probe(['-X', 'importtime'], env, options['no_bytecode_cache'])
+            result['imports'] = parse_importtime(stderr)
+
+        if options['json']:
+            result.pop('imports', None)
+            self.stdout.write(json.dumps(result))
+            return
+        self.report(result, options)
+
+    def run_probe(self, flags, env, no_bytecode_cache):
+        with tempfile.TemporaryDirectory() as prefix:
+            if no_bytecode_cache:
+                env = {**env, 'PYTHONPYCACHEPREFIX': prefix}
+            completed = subprocess.run(
+                [sys.executable, *flags, '-c', PROBE],
+                cwd=settings.BASE_DIR, env=env, capture_output=True, text=True,
+            )
+        if completed.returncode:
+            raise CommandError(f"Startup probe failed:\n{completed.stderr[-2000:]}")
+        return completed.stdout, completed.stderr
+
+    def probe(self, env, no_bytecode_cache):
+        start = time.perf_counter()
+        stdout, _ = self.run_probe([], env, no_bytecode_cache)
+        process = (time.perf_counter() - start) * 1000
+        marks = json.loads(stdout.strip().splitlines()[-1])
+        phases, previous = {}, 0.0
+        for phase in PHASES:
+            phases[phase] = marks[phase] - previous
+            previous = marks[phase]
+        phases['process'] = process
+        return phases
+
+    def report(self, result, options):
+        overrides = ' '.join(options['set']) or 'current settings'
+        self.stdout.write(f"cold start ({overrides}), median of {options['repeat']} fresh interpreters:")
+        for phase, value in result['median_ms'].items():
+            label = 'whole process' if phase == 'process' else phase
+            self.stdout.write(f"  {label:<16} {value:8.1f} ms")
+
+        rows = result.get('imports')
+        if not rows:
+            return
+        limit = options['imports']
+        packages = collections.Counter()
+        for name, self_us, _ in rows:
+            packages[name.split('.')[0]] += self_us
+        self.stdout.write("\nimport time by top-level package (self time, summed):")
+        for name, total in packages.most_common(limit):
+            self.stdout.write(f"  {name:<32} {total / 1000:8.1f} ms")
+        self.stdout.write("\nslowest modules (self / cumulative):")
+        for name, self_us, cumulative_us in sorted(rows, key=lambda row: row[1], reverse=True)[:limit]:
+            self.stdout.write(f"  {name:<48} {self_us / 1000:7.1f} / {cumulative_us / 1000:7.1f} ms")
@@ -0,0 +1,24 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from penpal.schema import ensure_artifact
+
+
+class Command(BaseCommand):
+    help = (
+        "Build the OpenAPI schema artifact served at /api/swagger.json/ unless "
+        "the current URL configuration and code version already have one."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true', help="Rebuild even if the artifact exists.")
+
+    def handle(self, *args, **options):
+        if not settings.API_DOCS_ENABLED:
+            self.stdout.write("API_DOCS_ENABLED is off; no schema to build.")
+            return
+        version, path, built = ensure_artifact(force=options['force'])
+        if built:
+            self.stdout.write(self.style.SUCCESS(f"Built schema {version} at {path}"))
+        else:
+            self.stdout.write(f"Schema {version} is up to date at {path}")
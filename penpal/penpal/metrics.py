@@ -0,0 +1,258 @@
+"""
+In-process metrics in the Prometheus text exposition format.
+
+Each worker process keeps its own counters and histograms; a scrape of
+``/api/metrics/`` sees the process that served it, so scrape every worker
+(or run one worker per container) to get the full picture.
+"""
+import bisect
+import contextlib
+import threading
+import time
+
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseForbidden, JsonResponse
+from django.utils.crypto import constant_time_compare
+from django.views.decorators.http import require_safe
+
+from .profiling import PHASES, profile_request, recent_slow_requests, report_if_slow
+
+
+# Seconds; Prometheus client defaults extended for slow document payloads.
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+PHASE_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200)
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+METHODS = {'GET', 'HEAD', 'POST', 'PUT', 'PATCH', 'DELETE', 'OPTIONS'}
+
+
+def format_labels(names, values):
+    if not names:
+        return ''
+    pairs = (
+        '{}="{}"'.format(name, str(value).replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n'))
+        for name, value in zip(names, values)
+    )
+    return '{' + ','.join(pairs) + '}'
+
+
+def format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def header(self):
+        return [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.kind}']
+
+    def samples(self):
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f'{self.name}{format_labels(self.labelnames, labels)} {format_value(value)}' for labels, value in items]
+
+    def render(self):
+        return self.header() + self.samples()
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+
+class Gauge(Metric):
+    kind = 'gauge'
+
+    def set(self, value, *labels):
+        with self._lock:
+            self._values[labels] = value
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def dec(self, *labels, amount=1):
+        self.inc(*labels, amount=-amount)
+
+    def get(self, *labels):
+        with self._lock:
+            return self._values.get(labels, 0)
+
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, *labels):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(labels)
+            if state is None:
+                # Per-bucket (not cumulative) counts, sum, count.
+                state = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    def samples(self):
+        with self._lock:
+            items = sorted((labels, (list(state[0]), state[1], state[2])) for labels, state in self._values.items())
+        lines = []
+        bucket_labels = self.labelnames + ('le',)
+        for labels, (counts, total, count) in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += bucket_count
+                le = '+Inf' if bound == float('inf') else repr(bound)
+                lines.append(f'{self.name}_bucket{format_labels(bucket_labels, labels + (le,))} {cumulative}')
+            lines.append(f'{self.name}_sum{format_labels(self.labelnames, labels)} {format_value(total)}')
+            lines.append(f'{self.name}_count{format_labels(self.labelnames, labels)} {count}')
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+        self._collectors = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def add_collector(self, collector):
+        """
+        ``collector()`` is called on each scrape to refresh gauges.
+        """
+        self._collectors.append(collector)
+
+    def render(self):
+        for collector in self._collectors:
+            collector()
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+REQUEST_LATENCY = registry.register(Histogram(
+    'penpal_http_request_duration_seconds',
+    'Time from the request reaching Django to the response being returned.',
+    ('view', 'method'),
+))
+REQUESTS = registry.register(Counter(
+    'penpal_http_requests_total', 'Requests served.', ('view', 'method', 'status'),
+))
+IN_FLIGHT = registry.register(Gauge(
+    'penpal_http_requests_in_flight', 'Requests being handled by this process.',
+))
+IN_FLIGHT.set(0)
+PHASE_LATENCY = registry.register(Histogram(
+    'penpal_http_request_phase_seconds',
+    'Exclusive time per request phase (authentication, permissions, throttling, '
+    'database, serialization, rendering, other).',
+    ('view', 'phase'), buckets=PHASE_BUCKETS,
+))
+QUERY_COUNT = registry.register(Histogram(
+    'penpal_http_request_queries', 'SQL statements executed per request.', ('view',), buckets=QUERY_COUNT_BUCKETS,
+))
+SLOW_REQUESTS = registry.register(Counter(
+    'penpal_http_slow_requests_total', 'Requests slower than SLOW_REQUEST_MS.', ('view',),
+))
+
+
+def view_label(request):
+    """
+    The URL name (bounded cardinality), or the route pattern for unnamed URLs.
+    """
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return '<unmatched>'
+    return match.view_name or match.route or '<unnamed>'
+
+
+class RequestMetricsMiddleware:
+    """
+    Record per-view latency and status counts and, with REQUEST_PHASE_TIMING,
+    per-phase timings and slow-request reports (penpal/profiling.py). Place it
+    first so the time spent in the rest of the middleware stack is included.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        IN_FLIGHT.inc()
+        start = time.perf_counter()
+        profiling = profile_request() if settings.REQUEST_PHASE_TIMING else contextlib.nullcontext()
+        try:
+            with profiling as timer:
+                response = self.get_response(request)
+        finally:
+            IN_FLIGHT.dec()
+        elapsed = time.perf_counter() - start
+        view = view_label(request)
+        method = request.method if request.method in METHODS else 'other'
+        REQUEST_LATENCY.observe(elapsed, view, method)
+        REQUESTS.inc(view, method, str(response.status_code))
+        if timer is not None:
+            timer.finish()
+            for name in PHASES:
+                PHASE_LATENCY.observe(timer.totals[name], view, name)
+            QUERY_COUNT.observe(timer.query_count, view)
+            if report_if_slow(request, view, elapsed, timer, response.status_code):
+                SLOW_REQUESTS.inc(view)
+        return response
+
+
+def authorized(request):
+    """
+    Deny by default: the bearer METRICS_TOKEN, a signed-in staff user, or any
+    caller under DEBUG when no token is configured.
+    """
+    token = settings.METRICS_TOKEN
+    if token and constant_time_compare(request.headers.get('Authorization', ''), f'Bearer {token}'):
+        return True
+    user = getattr(request, 'user', None)
+    if user is not None and user.is_active and user.is_staff:
+        return True
+    return settings.DEBUG and not token
+
+
+@require_safe
+def metrics(request):
+    """
+    Prometheus scrape endpoint. Requires ``Authorization: Bearer <METRICS_TOKEN>``
+    (or a staff session).
+    GET /api/metrics/
+    """
+    if not authorized(request):
+        return HttpResponseForbidden()
+    return HttpResponse(registry.render(), content_type=CONTENT_TYPE)
+
+
+@require_safe
+def slow_requests(request):
+    """
+    The most recent slow-request reports of this process, newest first.
+    GET /api/metrics/slow-requests/
+    """
+    if not authorized(request):
+        return HttpResponseForbidden()
+    return JsonResponse({'threshold_ms': settings.SLOW_REQUEST_MS, 'results': list(reversed(recent_slow_requests))})
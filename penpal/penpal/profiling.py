@@ -0,0 +1,234 @@
+"""
+Per-request phase timing and slow-request sampling.
+
+``install()`` wraps DRF's authentication, permission and throttle checks,
+``serializer.data`` and response rendering so every API view is timed
+without changes to the views themselves. Statement execution is timed with
+an ``execute_wrapper`` on each connection (row fetching and model building
+fall in whichever phase iterates the queryset). Phases are exclusive: SQL
+run while serializing counts as ``database``, not ``serialization``, and
+whatever is left of the request (view code, ORM query building, middleware)
+is ``other``.
+
+Requests still running after ``SLOW_REQUEST_MS`` have their thread's stack
+sampled every ``SLOW_REQUEST_SAMPLE_INTERVAL_MS`` by a background thread, so
+fast requests pay nothing for it. When a slow request finishes, its phases,
+heaviest SQL statements and most frequent stacks are logged to
+``penpal.slow_requests`` and kept in a small in-memory ring.
+"""
+import collections
+import contextlib
+import contextvars
+import functools
+import logging
+import sys
+import threading
+import time
+import traceback
+
+from django.conf import settings
+from django.db import connections
+
+
+logger = logging.getLogger('penpal.slow_requests')
+
+PHASES = ('authentication', 'permissions', 'throttling', 'database', 'serialization', 'rendering', 'other')
+MAX_QUERIES = 500
+MAX_STACK_DEPTH = 30
+
+_current = contextvars.ContextVar('phase_timer', default=None)
+_active = {}
+_active_lock = threading.Lock()
+_sampler = None
+recent_slow_requests = collections.deque(maxlen=50)
+
+
+class PhaseTimer:
+    """
+    Exclusive time per phase: entering a nested phase pauses the outer one.
+    """
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.totals = dict.fromkeys(PHASES, 0.0)
+        self.stack = []
+        self.queries = []
+        self.query_count = 0
+        self.samples = collections.Counter()
+
+    def push(self, phase):
+        now = time.perf_counter()
+        if self.stack:
+            outer = self.stack[-1]
+            self.totals[outer[0]] += now - outer[1]
+        self.stack.append([phase, now])
+
+    def pop(self):
+        now = time.perf_counter()
+        phase, started = self.stack.pop()
+        self.totals[phase] += now - started
+        if self.stack:
+            self.stack[-1][1] = now
+
+    def finish(self):
+        elapsed = time.perf_counter() - self.start
+        self.totals['other'] = max(0.0, elapsed - sum(self.totals.values()))
+        return elapsed
+
+
+@contextlib.contextmanager
+def phase(name):
+    timer = _current.get()
+    if timer is None:
+        yield
+        return
+    timer.push(name)
+    try:
+        yield
+    finally:
+        timer.pop()
+
+
+def timed_method(function, name):
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        with phase(name):
+            return function(*args, **kwargs)
+    return wrapper
+
+
+def timed_property(prop, name):
+    return property(timed_method(prop.fget, name), prop.fset, prop.fdel, prop.__doc__)
+
+
+def install():
+    """
+    Wrap the DRF hooks that make up each phase. Idempotent.
+    """
+    from rest_framework.response import Response
+    from rest_framework.serializers import BaseSerializer
+    from rest_framework.views import APIView
+
+    if getattr(APIView, '_phase_timing', False):
+        return
+    APIView.perform_authentication = timed_method(APIView.perform_authentication, 'authentication')
+    APIView.check_permissions = timed_method(APIView.check_permissions, 'permissions')
+    APIView.check_object_permissions = timed_method(APIView.check_object_permissions, 'permissions')
+    APIView.check_throttles = timed_method(APIView.check_throttles, 'throttling')
+    BaseSerializer.data = timed_property(BaseSerializer.data, 'serialization')
+    Response.rendered_content = timed_property(Response.rendered_content, 'rendering')
+    APIView._phase_timing = True
+
+
+def record_query(execute, sql, params, many, context):
+    timer = _current.get()
+    if timer is None:
+        return execute(sql, params, many, context)
+    timer.push('database')
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        timer.pop()
+        timer.query_count += 1
+        if len(timer.queries) < MAX_QUERIES:
+            # Statement text only; parameters may hold user data.
+            timer.queries.append((sql, time.perf_counter() - start))
+
+
+# ---------------------------------------------------------------------------
+# Slow-request stack sampling
+# ---------------------------------------------------------------------------
+
+def format_stack(frame):
+    frames = traceback.extract_stack(frame, limit=MAX_STACK_DEPTH)
+    return tuple(f'{item.filename}:{item.lineno} {item.name}' for item in frames)
+
+
+def sample_slow_requests():
+    threshold = settings.SLOW_REQUEST_MS / 1000
+    interval = settings.SLOW_REQUEST_SAMPLE_INTERVAL_MS / 1000
+    while True:
+        time.sleep(interval)
+        now = time.perf_counter()
+        # Sample under the lock so a finished request's timer is never written
+        # to while its report is being built.
+        with _active_lock:
+            running = [(ident, timer) for ident, timer in _active.items() if now - timer.start >= threshold]
+            if not running:
+                continue
+            frames = sys._current_frames()
+            for ident, timer in running:
+                frame = frames.get(ident)
+                if frame is not None:
+                    timer.samples[format_stack(frame)] += 1
+
+
+def ensure_sampler():
+    global _sampler
+    if _sampler is None and settings.SLOW_REQUEST_MS:
+        with _active_lock:
+            if _sampler is None:
+                _sampler = threading.Thread(target=sample_slow_requests, name='slow-request-sampler', daemon=True)
+                _sampler.start()
+
+
+def slow_request_report(request, view, elapsed, timer, status_code):
+    statements = collections.defaultdict(lambda: [0, 0.0])
+    for sql, duration in timer.queries:
+        statements[sql][0] += 1
+        statements[sql][1] += duration
+    top_sql = sorted(statements.items(), key=lambda item: item[1][1], reverse=True)[:10]
+    return {
+        'view': view,
+        'method': request.method,
+        'path': request.path,
+        'status': status_code,
+        'duration_ms': round(elapsed * 1000, 1),
+        'phases_ms': {name: round(value * 1000, 1) for name, value in timer.totals.items()},
+        'queries': timer.query_count,
+        'top_sql': [
+            {'sql': sql[:500], 'count': count, 'total_ms': round(total * 1000, 1)}
+            for sql, (count, total) in top_sql
+        ],
+        'stack_samples': [
+            {'count': count, 'stack': list(stack)}
+            for stack, count in timer.samples.most_common(5)
+        ],
+    }
+
+
+@contextlib.contextmanager
+def profile_request():
+    """
+    Time the phases of the current request; yields the ``PhaseTimer``.
+    """
+    timer = PhaseTimer()
+    token = _current.set(timer)
+    ident = threading.get_ident()
+    with contextlib.ExitStack() as stack:
+        for alias in connections:
+            stack.enter_context(connections[alias].execute_wrapper(record_query))
+        if settings.SLOW_REQUEST_MS:
+            ensure_sampler()
+            with _active_lock:
+                _active[ident] = timer
+        try:
+            yield timer
+        finally:
+            with _active_lock:
+                _active.pop(ident, None)
+            _current.reset(token)
+
+
+def report_if_slow(request, view, elapsed, timer, status_code):
+    if not settings.SLOW_REQUEST_MS or elapsed * 1000 < settings.SLOW_REQUEST_MS:
+        return None
+    report = slow_request_report(request, view, elapsed, timer, status_code)
+    recent_slow_requests.append(report)
+    logger.warning(
+        "Slow request %s %s (%s): %.0f ms, %d queries, phases %s",
+        request.method, request.path, view, report['duration_ms'], report['queries'], report['phases_ms'],
+        extra={'slow_request': report},
+    )
+    return report
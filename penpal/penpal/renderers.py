@@ -0,0 +1,96 @@
+"""
+JSON renderer and parser backed by orjson.
+
+Output matches DRF's ``JSONRenderer`` with the default settings (compact,
+UTF-8, ``Z`` for UTC datetimes, UUIDs and Decimals as DRF encodes them).
+Anything orjson cannot encode, requests for indented or ASCII-only output
+and non-UTF-8 request bodies fall back to the stock implementation.
+
+orjson is a required dependency; it is imported unconditionally so a build
+without it fails at startup instead of silently serving stdlib JSON.
+
+``RawJSON`` values are embedded as-is: serializer fields use it to pass a
+stored JSON document through without decoding and re-encoding it.
+"""
+import json
+
+import orjson
+from django.conf import settings
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+
+class RawJSON:
+    """
+    Already-serialized JSON text to embed in a response unchanged.
+    """
+    __slots__ = ('text',)
+
+    def __init__(self, text):
+        self.text = text
+
+    def __eq__(self, other):
+        return isinstance(other, RawJSON) and other.text == self.text
+
+    def __repr__(self):
+        return f'RawJSON({self.text[:40]!r})'
+
+
+class RawJSONEncoder(JSONEncoder):
+    """
+    DRF's encoder plus ``RawJSON`` support (decoded, since the stdlib
+    encoder cannot embed text).
+    """
+
+    def default(self, obj):
+        if isinstance(obj, RawJSON):
+            return json.loads(obj.text)
+        return super().default(obj)
+
+
+_drf_default = JSONEncoder().default
+
+
+def _orjson_default(obj):
+    if isinstance(obj, RawJSON):
+        return orjson.Fragment(obj.text)
+    # Decimal, timedelta, QuerySet, lazy strings, ... as DRF encodes them.
+    return _drf_default(obj)
+
+
+ORJSON_OPTIONS = orjson.OPT_UTC_Z | orjson.OPT_NON_STR_KEYS
+
+
+class FastJSONRenderer(JSONRenderer):
+    encoder_class = RawJSONEncoder
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if (data is None or self.ensure_ascii or not self.compact
+                or self.get_indent(accepted_media_type, renderer_context or {})):
+            return super().render(data, accepted_media_type, renderer_context)
+        try:
+            ret = orjson.dumps(data, default=_orjson_default, option=ORJSON_OPTIONS)
+        except (TypeError, orjson.JSONEncodeError):
+            # e.g. integers beyond 64 bits
+            return super().render(data, accepted_media_type, renderer_context)
+        # Escape U+2028/U+2029 like JSONRenderer so output is valid JavaScript.
+        # Their last UTF-8 byte is a cheap single-byte pre-check.
+        if b'\xa8' in ret or b'\xa9' in ret:
+            ret = ret.replace(b'\xe2\x80\xa8', b'\\u2028').replace(b'\xe2\x80\xa9', b'\\u2029')
+        return ret
+
+
+class FastJSONParser(JSONParser):
+    renderer_class = FastJSONRenderer
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        parser_context = parser_context or {}
+        encoding = parser_context.get('encoding', settings.DEFAULT_CHARSET)
+        if encoding.lower().replace('-', '') != 'utf8':
+            return super().parse(stream, media_type, parser_context)
+        try:
+            return orjson.loads(stream.read())
+        except orjson.JSONDecodeError as exc:
+            raise ParseError(f'JSON parse error - {exc}')
@@ -0,0 +1,105 @@
+"""
+Read-replica routing.
+
+Safe-method requests read ``REPLICA_ROUTED_MODELS`` from one of the
+``REPLICA_DATABASES``; every write, and every read outside a routed request
+(management commands, shell, unsafe methods), goes to ``default``.
+
+After a client's own write, ``ReplicaRoutingMiddleware`` hands back a
+last-write timestamp as a cookie and a response header. While a request
+carries a timestamp younger than ``REPLICA_STICKY_SECONDS`` (via the cookie
+or the ``X-Last-Write`` header) its reads stay on the primary, so clients
+read their own writes despite replication lag. Timestamps more than
+``MAX_CLOCK_SKEW`` seconds in the future are ignored, so a forged or skewed
+value cannot pin a client to the primary.
+
+Real replicas receive their schema and data through replication and are
+never migrated. SQLite stand-ins are plain files: ``migrate --database
+replica_0`` gives one the schema, and copying the primary's file gives it
+the data.
+"""
+import random
+import time
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+
+LAST_WRITE_COOKIE = 'penpal_last_write'
+LAST_WRITE_HEADER = 'X-Last-Write'
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+# Allowance for clocks of different web servers issuing timestamps.
+MAX_CLOCK_SKEW = 1.0
+
+_use_replica = ContextVar('use_replica', default=False)
+
+
+class ReplicaRouter:
+    """
+    Database router sending routed-model reads to a replica when allowed.
+    """
+
+    def db_for_read(self, model, **hints):
+        replicas = settings.REPLICA_DATABASES
+        if not replicas or not _use_replica.get():
+            return None
+        if model._meta.label_lower not in settings.REPLICA_ROUTED_MODELS:
+            return None
+        # Reads inside a transaction on the primary must see its writes.
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        return random.choice(replicas)
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same data as the primary.
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db in settings.REPLICA_DATABASES:
+            # Only local SQLite stand-ins; real replicas follow the primary.
+            return connections[db].vendor == 'sqlite'
+        return True
+
+
+class ReplicaRoutingMiddleware:
+    """
+    Enable replica reads for safe requests and track read-your-writes stickiness.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        token = _use_replica.set(
+            request.method in SAFE_METHODS and not self.recently_wrote(request)
+        )
+        try:
+            response = self.get_response(request)
+        finally:
+            _use_replica.reset(token)
+
+        if request.method not in SAFE_METHODS and response.status_code < 400:
+            now = f'{time.time():.3f}'
+            response[LAST_WRITE_HEADER] = now
+            response.set_cookie(
+                LAST_WRITE_COOKIE, now,
+                max_age=settings.REPLICA_STICKY_SECONDS,
+                httponly=True,
+                samesite='Lax',
+            )
+        return response
+
+    def recently_wrote(self, request):
+        value = request.headers.get(LAST_WRITE_HEADER) or request.COOKIES.get(LAST_WRITE_COOKIE)
+        if not value:
+            return False
+        try:
+            last_write = float(value)
+        except ValueError:
+            return False
+        age = time.time() - last_write
+        return -MAX_CLOCK_SKEW <= age < settings.REPLICA_STICKY_SECONDS
@@ -0,0 +1,201 @@
+"""
+Pre-built OpenAPI schema.
+
+drf_yasg introspects every view and serializer to build the schema, so it is
+built once into a versioned artifact (``SCHEMA_ARTIFACT_DIR/openapi-<version>.json``)
+by ``manage.py generate_schema`` at deploy, or on the first request if the
+artifact is missing, and then served from memory.
+
+The version is a digest of the URL configuration and the code version
+(``CODE_VERSION`` when set, otherwise the project's source files), so the
+schema is rebuilt only when one of them changes. ``/api/swagger/<version>.json``
+never changes and is served as immutable; the unversioned URL revalidates
+with its ETag.
+
+drf_yasg (with its YAML and JSON Schema dependencies) is only imported to
+build the artifact or render the UI pages, not at startup.
+"""
+import hashlib
+import os
+import tempfile
+import threading
+from pathlib import Path
+
+import rest_framework
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.http import HttpResponse, HttpResponseRedirect
+from django.urls import URLPattern, URLResolver, get_resolver, reverse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.views.decorators.http import require_safe
+from rest_framework.permissions import AllowAny
+from rest_framework.request import Request
+
+ARTIFACTS_KEPT = 3
+SKIPPED_DIRS = {'__pycache__', 'media', 'staticfiles', 'var', 'node_modules'}
+IMMUTABLE_MAX_AGE = 365 * 24 * 60 * 60
+
+_lock = threading.Lock()
+_loaded = None
+_ui_views = {}
+
+
+def schema_info():
+    from drf_yasg import openapi
+
+    return openapi.Info(
+        title="Penpal API",
+        default_version="v1",
+        description="API documentation for Penpal Backend",
+        terms_of_service="https://www.penpal.com/terms/",
+        contact=openapi.Contact(email="support@penpal.com"),
+        license=openapi.License(name="BSD License"),
+    )
+
+
+def urlconf_fingerprint(patterns=None, prefix=''):
+    """
+    Yield one line per URL pattern: its full route and the view it resolves to.
+    """
+    if patterns is None:
+        patterns = get_resolver().url_patterns
+    for pattern in patterns:
+        route = prefix + str(pattern.pattern)
+        if isinstance(pattern, URLResolver):
+            yield from urlconf_fingerprint(pattern.url_patterns, route)
+        elif isinstance(pattern, URLPattern):
+            callback = pattern.callback
+            view = getattr(callback, 'view_class', None) or getattr(callback, 'cls', None) or callback
+            yield f'{route} {view.__module__}.{view.__qualname__}'
+
+
+def source_digest():
+    digest = hashlib.sha256()
+    for root, dirs, files in os.walk(settings.BASE_DIR):
+        dirs[:] = sorted(name for name in dirs if name not in SKIPPED_DIRS and not name.startswith('.'))
+        for name in sorted(files):
+            if name.endswith('.py'):
+                path = Path(root, name)
+                digest.update(str(path.relative_to(settings.BASE_DIR)).encode())
+                digest.update(path.read_bytes())
+    return digest.hexdigest()
+
+
+def schema_version():
+    import drf_yasg
+
+    digest = hashlib.sha256()
+    digest.update(f'{settings.CODE_VERSION or source_digest()}|{drf_yasg.__version__}|{rest_framework.VERSION}\n'.encode())
+    for line in urlconf_fingerprint():
+        digest.update(line.encode() + b'\n')
+    return digest.hexdigest()[:16]
+
+
+def artifact_path(version):
+    return Path(settings.SCHEMA_ARTIFACT_DIR) / f'openapi-{version}.json'
+
+
+def build_schema():
+    """
+    The public schema as JSON bytes, built for an anonymous GET so views that
+    look at ``self.request`` introspect as they do when served. No ``host``:
+    clients use the one they fetched the schema from.
+    """
+    from drf_yasg.codecs import OpenAPICodecJson
+    from drf_yasg.generators import OpenAPISchemaGenerator
+    from django.test import RequestFactory
+
+    request = Request(RequestFactory().get(reverse('schema-json')))
+    request.user = AnonymousUser()
+    schema = OpenAPISchemaGenerator(schema_info(), url='').get_schema(request=request, public=True)
+    return OpenAPICodecJson(validators=[]).encode(schema)
+
+
+def write_artifact(version, body):
+    path = artifact_path(version)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    # Write-then-rename so concurrent workers never read a partial file.
+    fd, tmp = tempfile.mkstemp(dir=path.parent, prefix='.openapi-')
+    with os.fdopen(fd, 'wb') as handle:
+        handle.write(body)
+    os.replace(tmp, path)
+
+    stale = sorted(path.parent.glob('openapi-*.json'), key=lambda item: item.stat().st_mtime, reverse=True)
+    for old in stale[ARTIFACTS_KEPT:]:
+        old.unlink(missing_ok=True)
+    return path
+
+
+def ensure_artifact(force=False):
+    """
+    Return ``(version, path, built)``, building the artifact if it is missing.
+    """
+    version = schema_version()
+    path = artifact_path(version)
+    if path.exists() and not force:
+        return version, path, False
+    return version, write_artifact(version, build_schema()), True
+
+
+def load_schema():
+    """
+    ``(version, body)`` for this process, read or built once.
+    """
+    global _loaded
+    if _loaded is None:
+        with _lock:
+            if _loaded is None:
+                version, path, _ = ensure_artifact()
+                _loaded = (version, path.read_bytes())
+    return _loaded
+
+
+def schema_response(request, cache_control):
+    version, body = load_schema()
+    etag = f'"{version}"'
+    response = get_conditional_response(request, etag=etag) or HttpResponse(body, content_type='application/json')
+    response['ETag'] = etag
+    patch_cache_control(response, **cache_control)
+    return response
+
+
+@require_safe
+def schema_json(request):
+    """
+    Current OpenAPI schema; revalidates with its ETag after SCHEMA_CACHE_SECONDS.
+    ``Content-Location`` names the immutable versioned URL.
+    GET /api/swagger.json/
+    """
+    response = schema_response(request, {'public': True, 'max_age': settings.SCHEMA_CACHE_SECONDS})
+    response['Content-Location'] = reverse('schema-json-versioned', kwargs={'version': load_schema()[0]})
+    return response
+
+
+@require_safe
+def versioned_schema_json(request, version):
+    """
+    OpenAPI schema for one version; older versions redirect to the current one.
+    GET /api/swagger/<version>.json
+    """
+    current, _ = load_schema()
+    if version != current:
+        return HttpResponseRedirect(reverse('schema-json-versioned', kwargs={'version': current}))
+    return schema_response(request, {'public': True, 'max_age': IMMUTABLE_MAX_AGE, 'immutable': True})
+
+
+def ui_view(renderer):
+    """
+    Swagger UI / ReDoc page, with drf_yasg's view built on the first request.
+    The pages' own ``?format=openapi`` requests are answered from the artifact
+    instead of regenerating the schema.
+    """
+    def view(request, *args, **kwargs):
+        if request.GET.get('format') == 'openapi':
+            return schema_json(request)
+        if renderer not in _ui_views:
+            from drf_yasg.views import get_schema_view
+
+            schema_view = get_schema_view(schema_info(), public=True, permission_classes=[AllowAny])
+            _ui_views[renderer] = schema_view.with_ui(renderer, cache_timeout=0)
+        return _ui_views[renderer](request, *args, **kwargs)
+    return view
@@ -15,6 +15,8 @@ from decouple import config
 
 from datetime import timedelta
 
+from penpal.database import database_settings
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -31,10 +33,17 @@ DEBUG = config('DEBUG', default=True, cast=bool)
 ALLOWED_HOSTS = config('ALLOWED_HOSTS', default='*').split(',')
 
 
+# Optional components. Disabling them (e.g. in production) keeps their imports,
+# app loading and URL patterns out of startup; see `manage.py bench_startup`.
+ADMIN_ENABLED = config('ADMIN_ENABLED', default=True, cast=bool)
+API_DOCS_ENABLED = config('API_DOCS_ENABLED', default=True, cast=bool)
+BROWSABLE_API_ENABLED = config('BROWSABLE_API_ENABLED', default=DEBUG, cast=bool)
+
+
 # Application definition
 
 INSTALLED_APPS = [
-    'django.contrib.admin',
+    *(['django.contrib.admin'] if ADMIN_ENABLED else []),
     'django.contrib.auth',
     'django.contrib.contenttypes',
     'django.contrib.sessions',
@@ -42,21 +51,28 @@ INSTALLED_APPS = [
     'django.contrib.staticfiles',
     'corsheaders',
     "rest_framework",
-    'drf_yasg',
+    *(['drf_yasg'] if API_DOCS_ENABLED else []),
+    'penpal',
     'accounts',
     'document',
+    'audit_log',
+    'tasks',
 ]
 
 MIDDLEWARE = [
+    'penpal.metrics.RequestMetricsMiddleware',
     "corsheaders.middleware.CorsMiddleware",
     'whitenoise.middleware.WhiteNoiseMiddleware',
+    'penpal.compression.CompressionMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'penpal.routers.ReplicaRoutingMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'penpal.throttling.RateLimitHeadersMiddleware',
 ]
 
 ROOT_URLCONF = 'penpal.urls'
@@ -82,13 +98,53 @@ WSGI_APPLICATION = 'penpal.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
+# Backend, pooling and persistent connections are configured from the
+# environment; see penpal/database.py for the supported variables.
+
 DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
-    }
+    'default': database_settings(config('DATABASE_URL', default=''), BASE_DIR / 'db.sqlite3'),
 }
 
+# Read replicas (comma-separated URLs). Safe-method reads of the models below
+# are routed to a replica; see penpal/routers.py.
+REPLICA_DATABASES = []
+for index, url in enumerate(filter(None, config('DATABASE_REPLICA_URLS', default='').split(','))):
+    alias = f'replica_{index}'
+    DATABASES[alias] = database_settings(url.strip(), BASE_DIR / f'{alias}.sqlite3')
+    DATABASES[alias]['TEST'] = {'MIRROR': 'default'}
+    REPLICA_DATABASES.append(alias)
+
+# Change stamps are read with the rows they validate, so a lagging replica
+# never pairs a new stamp with old rows.
+REPLICA_ROUTED_MODELS = ('document.document', 'document.tag', 'document.comment', 'document.changestamp')
+
+# How long a client's reads stay on the primary after its own write.
+REPLICA_STICKY_SECONDS = config('REPLICA_STICKY_SECONDS', default=5, cast=int)
+
+DATABASE_ROUTERS = ['penpal.routers.ReplicaRouter']
+
+
+# Cache
+# Throttle counters and other shared state live here. Set REDIS_URL in
+# production so every worker process sees the same counters (the ``redis``
+# client is a project dependency); ``check --deploy`` warns when it is unset.
+
+REDIS_URL = config('REDIS_URL', default='')
+
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -136,6 +192,84 @@ MEDIA_ROOT = os.path.join(BASE_DIR, "media")
 
 APPEND_SLASH = False
 
+# Soft-deleted rows older than this are hard-deleted by `manage.py purge_soft_deleted`.
+SOFT_DELETE_RETENTION_DAYS = config('SOFT_DELETE_RETENTION_DAYS', default=30, cast=int)
+
+# Document change feed (Server-Sent Events, served under ASGI).
+# The in-process broker only reaches subscribers in the same worker process;
+# with REDIS_URL set, events go through Redis pub/sub to every worker.
+DOCUMENT_EVENT_BROKER = config(
+    'DOCUMENT_EVENT_BROKER',
+    default='document.events.RedisBroker' if REDIS_URL else 'document.events.InProcessBroker',
+)
+DOCUMENT_EVENT_QUEUE_SIZE = config('DOCUMENT_EVENT_QUEUE_SIZE', default=100, cast=int)
+DOCUMENT_EVENT_HEARTBEAT = config('DOCUMENT_EVENT_HEARTBEAT', default=15, cast=int)
+DOCUMENT_EVENT_STREAM_MAX_AGE = config('DOCUMENT_EVENT_STREAM_MAX_AGE', default=300, cast=int)
+DOCUMENT_EVENT_RETRY_MS = 3000
+
+# Collaborative editing sessions (document/collab.py), held in memory per process.
+COLLAB_CHECKPOINT_SECONDS = config('COLLAB_CHECKPOINT_SECONDS', default=10, cast=int)
+COLLAB_CHECKPOINT_OPS = config('COLLAB_CHECKPOINT_OPS', default=200, cast=int)
+COLLAB_IDLE_SECONDS = config('COLLAB_IDLE_SECONDS', default=300, cast=int)
+COLLAB_HISTORY_LIMIT = config('COLLAB_HISTORY_LIMIT', default=1000, cast=int)
+
+# Background tasks (tasks/queue.py), queued in the database and run by
+# `manage.py run_tasks`. With TASKS_ALWAYS_EAGER they run in the web process
+# when the enqueueing transaction commits, so no worker is needed in development.
+# A task running longer than TASK_LEASE_SECONDS is handed to another worker.
+TASKS_ALWAYS_EAGER = config('TASKS_ALWAYS_EAGER', default=DEBUG, cast=bool)
+TASK_WORKER_PROCESSES = config('TASK_WORKER_PROCESSES', default=2, cast=int)
+TASK_POLL_INTERVAL = config('TASK_POLL_INTERVAL', default=1.0, cast=float)
+TASK_LEASE_SECONDS = config('TASK_LEASE_SECONDS', default=600, cast=int)
+
+# Public feed (document/feed.py, /api/documents/feed/): pages of
+# PUBLIC_FEED_PAGE_SIZE documents, precomputed for the newest
+# PUBLIC_FEED_MAX_ITEMS of each feed and kept in the cache for
+# PUBLIC_FEED_CACHE_TIMEOUT seconds; responses may be cached downstream for
+# PUBLIC_FEED_MAX_AGE seconds.
+PUBLIC_FEED_PAGE_SIZE = config('PUBLIC_FEED_PAGE_SIZE', default=20, cast=int)
+PUBLIC_FEED_MAX_ITEMS = config('PUBLIC_FEED_MAX_ITEMS', default=200, cast=int)
+PUBLIC_FEED_CACHE_TIMEOUT = config('PUBLIC_FEED_CACHE_TIMEOUT', default=3600, cast=int)
+PUBLIC_FEED_MAX_AGE = config('PUBLIC_FEED_MAX_AGE', default=30, cast=int)
+
+# Response compression (penpal/compression.py). Smaller bodies go out as-is;
+# compressed bodies of responses with an ETag are cached, COMPRESSION_CACHE_TIMEOUT=0
+# turns that off. Bodies above COMPRESSION_CACHE_MAX_SIZE bytes are not cached.
+COMPRESSION_MIN_SIZE = config('COMPRESSION_MIN_SIZE', default=1024, cast=int)
+COMPRESSION_CACHE_TIMEOUT = config('COMPRESSION_CACHE_TIMEOUT', default=300, cast=int)
+COMPRESSION_CACHE_MAX_SIZE = config('COMPRESSION_CACHE_MAX_SIZE', default=4 * 1024 * 1024, cast=int)
+
+# Pre-built OpenAPI schema (penpal/schema.py, `manage.py generate_schema`).
+# CODE_VERSION (e.g. the deployed commit) versions the schema; without it the
+# project's source files are hashed at the first schema request.
+CODE_VERSION = config('CODE_VERSION', default='')
+SCHEMA_ARTIFACT_DIR = config('SCHEMA_ARTIFACT_DIR', default=str(BASE_DIR / 'var' / 'schema'))
+SCHEMA_CACHE_SECONDS = config('SCHEMA_CACHE_SECONDS', default=60, cast=int)
+
+# Readiness checks (/api/health/ready/) are cached per process for
+# HEALTH_CACHE_SECONDS. A database slower than HEALTH_DB_SLOW_MS, more than
+# HEALTH_MAX_IN_FLIGHT concurrent requests or a due task waiting longer than
+# HEALTH_MAX_TASK_AGE seconds (0 = no limit) report "degraded";
+# less than HEALTH_MIN_FREE_DISK_MB free on the media volume fails the check.
+HEALTH_CACHE_SECONDS = config('HEALTH_CACHE_SECONDS', default=5, cast=int)
+HEALTH_DB_SLOW_MS = config('HEALTH_DB_SLOW_MS', default=200, cast=int)
+HEALTH_MAX_IN_FLIGHT = config('HEALTH_MAX_IN_FLIGHT', default=0, cast=int)
+HEALTH_MAX_TASK_AGE = config('HEALTH_MAX_TASK_AGE', default=300, cast=int)
+HEALTH_MIN_FREE_DISK_MB = config('HEALTH_MIN_FREE_DISK_MB', default=500, cast=int)
+
+# Prometheus metrics and slow-request reports (/api/metrics/...) require
+# "Authorization: Bearer <METRICS_TOKEN>" or a staff session; without a token
+# they are only open when DEBUG is on.
+METRICS_TOKEN = config('METRICS_TOKEN', default='')
+
+# Per-phase request timing (penpal/profiling.py), off unless enabled. Requests
+# slower than SLOW_REQUEST_MS (0 = off) get stack samples every
+# SLOW_REQUEST_SAMPLE_INTERVAL_MS and a report logged to "penpal.slow_requests"
+# and served, under the metrics access rules, by /api/metrics/slow-requests/.
+REQUEST_PHASE_TIMING = config('REQUEST_PHASE_TIMING', default=False, cast=bool)
+SLOW_REQUEST_MS = config('SLOW_REQUEST_MS', default=1000, cast=int)
+SLOW_REQUEST_SAMPLE_INTERVAL_MS = config('SLOW_REQUEST_SAMPLE_INTERVAL_MS', default=20, cast=int)
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
@@ -168,6 +302,22 @@ CORS_ALLOW_HEADERS = (
     "user-agent",
     "x-csrftoken",
     "x-requested-with",
+    "x-last-write",
+    "if-match",
+    "if-none-match",
+    "if-modified-since",
+    "if-unmodified-since",
+)
+
+CORS_EXPOSE_HEADERS = (
+    "ratelimit-limit",
+    "ratelimit-remaining",
+    "ratelimit-reset",
+    "ratelimit-policy",
+    "retry-after",
+    "x-last-write",
+    "etag",
+    "last-modified",
 )
 
 CSRF_TRUSTED_ORIGINS = [
@@ -183,18 +333,34 @@ REST_FRAMEWORK = {
         "rest_framework_simplejwt.authentication.JWTAuthentication",
         "rest_framework.authentication.SessionAuthentication",
     ),
+    # orjson-backed; the browsable API is a development aid only.
     "DEFAULT_RENDERER_CLASSES": (
-        "rest_framework.renderers.JSONRenderer",
-        "rest_framework.renderers.BrowsableAPIRenderer",
+        "penpal.renderers.FastJSONRenderer",
+    ) + (("rest_framework.renderers.BrowsableAPIRenderer",) if BROWSABLE_API_ENABLED else ()),
+    "DEFAULT_PARSER_CLASSES": (
+        "penpal.renderers.FastJSONParser",
+        "rest_framework.parsers.FormParser",
+        "rest_framework.parsers.MultiPartParser",
     ),
     'DEFAULT_FILTER_BACKENDS': (
         'django_filters.rest_framework.DjangoFilterBackend',
         'rest_framework.filters.SearchFilter',
         'rest_framework.filters.OrderingFilter',
     ),
+    "DEFAULT_THROTTLE_CLASSES": (
+        "penpal.throttling.AnonRateThrottle",
+        "penpal.throttling.UserRateThrottle",
+        "penpal.throttling.SearchRateThrottle",
+        "penpal.throttling.WriteRateThrottle",
+        "penpal.throttling.ScopedRateThrottle",
+    ),
     "DEFAULT_THROTTLE_RATES": {
-        "anon": "40/minute",
-        "user": "100/minute",
+        "anon": config('THROTTLE_RATE_ANON', default="40/minute"),
+        "user": config('THROTTLE_RATE_USER', default="100/minute"),
+        "search": config('THROTTLE_RATE_SEARCH', default="30/minute"),
+        "writes": config('THROTTLE_RATE_WRITES', default="60/minute"),
+        "login": config('THROTTLE_RATE_LOGIN', default="10/minute"),
+        "collab": config('THROTTLE_RATE_COLLAB', default="600/minute"),
     },
     "DEFAULT_PAGINATION_CLASS": "rest_framework.pagination.PageNumberPagination",
     "PAGE_SIZE": 20
@@ -0,0 +1,576 @@
+import datetime
+import decimal
+import gzip
+import io
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from pathlib import Path
+from unittest import mock
+
+import brotli
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.cache.backends.redis import RedisCache
+from django.core.management import CommandError, call_command
+from django.http import HttpResponse, StreamingHttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from rest_framework.throttling import SimpleRateThrottle
+
+from document.models import Document
+from document.serilaizers import DocumentSerializer
+
+from . import compression, profiling, schema
+from .checks import check_shared_cache
+from .management.commands import bench_startup
+from .metrics import PHASE_LATENCY, QUERY_COUNT
+from .renderers import FastJSONParser, FastJSONRenderer, RawJSON
+from .throttling import SlidingWindowRateThrottle
+
+
+class RendererTests(SimpleTestCase):
+    def render(self, data, media_type=None, renderer=None):
+        return (renderer or FastJSONRenderer()).render(data, media_type)
+
+    def test_output_matches_drf(self):
+        data = {
+            'when': datetime.datetime(2025, 1, 2, 3, 4, 5, 600000, tzinfo=datetime.UTC),
+            'day': datetime.date(2025, 1, 2),
+            'id': uuid.UUID('12345678-1234-5678-1234-567812345678'),
+            'price': decimal.Decimal('1.50'),
+            'text': 'café   line',
+            'nested': [1, None, True, {'x': 1.5}],
+        }
+        self.assertEqual(self.render(data), JSONRenderer().render(data))
+
+    def test_raw_json_is_embedded_unchanged(self):
+        raw = '{"b":1,  "a":[1, 2]}'
+        self.assertEqual(self.render({'body': RawJSON(raw)}), b'{"body":' + raw.encode() + b'}')
+
+    def test_raw_json_is_decoded_on_fallback(self):
+        data = {'body': RawJSON('{"b":1,"a":[1,2]}')}
+        self.assertEqual(json.loads(self.render(data, 'application/json; indent=2')), {'body': {'b': 1, 'a': [1, 2]}})
+
+    def test_indented_output_falls_back(self):
+        data = {'a': [1, 2]}
+        media_type = 'application/json; indent=2'
+        self.assertEqual(self.render(data, media_type), JSONRenderer().render(data, media_type))
+
+    def test_ascii_output_falls_back(self):
+        renderer = type('AsciiRenderer', (FastJSONRenderer,), {'ensure_ascii': True})()
+        self.assertEqual(self.render({'text': 'café'}, renderer=renderer), b'{"text":"caf\\u00e9"}')
+
+    def test_unencodable_values_fall_back(self):
+        data = {'big': 2 ** 70}
+        self.assertEqual(self.render(data), JSONRenderer().render(data))
+
+    def test_none_renders_empty(self):
+        self.assertEqual(self.render(None), b'')
+
+
+class ParserTests(SimpleTestCase):
+    def parse(self, body, encoding='utf-8'):
+        return FastJSONParser().parse(io.BytesIO(body), parser_context={'encoding': encoding})
+
+    def test_parses_utf8(self):
+        self.assertEqual(self.parse('{"text":"café"}'.encode()), {'text': 'café'})
+
+    def test_malformed_body_is_a_parse_error(self):
+        with self.assertRaises(ParseError):
+            self.parse(b'{"text":')
+
+    def test_other_encodings_fall_back(self):
+        body = '{"text":"café"}'.encode('latin-1')
+        self.assertEqual(self.parse(body, 'latin-1'), {'text': 'café'})
+        self.assertEqual(
+            self.parse(body, 'latin-1'),
+            JSONParser().parse(io.BytesIO(body), parser_context={'encoding': 'latin-1'}),
+        )
+
+
+class StoredJSONPassthroughTests(TestCase):
+    def test_compressed_body_is_served_without_decoding(self):
+        cache.clear()
+        user = User.objects.create_user('writer')
+        blocks = [{'type': 'paragraph', 'content': [{'type': 'text', 'text': f'line {i}', 'styles': {}}], 'children': []}
+                  for i in range(200)]
+        document = Document.objects.create(author=user, title='Long', content='<p>x</p>',
+                                           editor_type='blocknote', block_note_content=blocks)
+        stored = DocumentSerializer(Document.objects.get(pk=document.pk)).data['block_note_content']
+        self.assertIsInstance(stored, RawJSON)
+        self.client.force_login(user)
+        response = self.client.get(reverse('document-list-create'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['results'][0]['block_note_content'], blocks)
+
+
+class MetricsAccessTests(TestCase):
+    endpoints = ('metrics', 'metrics-slow-requests')
+
+    def get(self, name, **headers):
+        return self.client.get(reverse(name), headers=headers)
+
+    @override_settings(METRICS_TOKEN='', DEBUG=False)
+    def test_denied_without_a_token(self):
+        for name in self.endpoints:
+            self.assertEqual(self.get(name).status_code, 403, name)
+
+    @override_settings(METRICS_TOKEN='secret')
+    def test_token_is_required_when_set(self):
+        for name in self.endpoints:
+            self.assertEqual(self.get(name).status_code, 403, name)
+            self.assertEqual(self.get(name, Authorization='Bearer wrong').status_code, 403, name)
+            self.assertEqual(self.get(name, Authorization='Bearer secret').status_code, 200, name)
+
+    @override_settings(METRICS_TOKEN='secret')
+    def test_staff_sessions_are_allowed(self):
+        user = User.objects.create_user('viewer')
+        self.client.force_login(user)
+        self.assertEqual(self.get('metrics').status_code, 403)
+        user.is_staff = True
+        user.save()
+        for name in self.endpoints:
+            self.assertEqual(self.get(name).status_code, 200, name)
+
+    @override_settings(METRICS_TOKEN='', DEBUG=True)
+    def test_open_under_debug_without_a_token(self):
+        response = self.get('metrics')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b'penpal_http_requests_total', response.content)
+
+
+class PhaseTimerTests(SimpleTestCase):
+    def test_nested_phases_are_exclusive(self):
+        clock = iter([0.0, 1.0, 3.0, 4.0, 6.0, 10.0])
+        with mock.patch('penpal.profiling.time.perf_counter', lambda: next(clock)):
+            timer = profiling.PhaseTimer()
+            timer.push('serialization')
+            timer.push('database')
+            timer.pop()
+            timer.pop()
+            self.assertEqual(timer.finish(), 10.0)
+        self.assertEqual(timer.totals['serialization'], 4.0)
+        self.assertEqual(timer.totals['database'], 1.0)
+        self.assertEqual(timer.totals['other'], 5.0)
+
+    def test_phases_outside_a_request_are_free(self):
+        with profiling.phase('rendering'):
+            pass
+
+
+@override_settings(SLOW_REQUEST_MS=0)
+class ProfileRequestTests(TestCase):
+    def test_statements_are_counted_without_parameters(self):
+        with profiling.profile_request() as timer:
+            list(User.objects.filter(username='secret-value'))
+        self.assertEqual(timer.query_count, 1)
+        sql, duration = timer.queries[0]
+        self.assertIn('auth_user', sql)
+        self.assertNotIn('secret-value', sql)
+        self.assertGreater(timer.totals['database'], 0)
+
+    def test_slow_requests_are_reported(self):
+        request = mock.Mock(method='GET', path='/api/documents/docs/')
+        with profiling.profile_request() as timer:
+            list(User.objects.all())
+            list(User.objects.all())
+        timer.finish()
+        self.assertIsNone(profiling.report_if_slow(request, 'view', 5.0, timer, 200))
+        with override_settings(SLOW_REQUEST_MS=100), self.assertLogs('penpal.slow_requests', 'WARNING'):
+            report = profiling.report_if_slow(request, 'view', 5.0, timer, 200)
+        self.assertEqual(report['duration_ms'], 5000.0)
+        self.assertEqual(report['queries'], 2)
+        self.assertEqual(report['top_sql'][0]['count'], 2)
+        self.assertIs(profiling.recent_slow_requests[-1], report)
+
+    @override_settings(SLOW_REQUEST_MS=20, SLOW_REQUEST_SAMPLE_INTERVAL_MS=5)
+    def test_long_running_requests_are_sampled(self):
+        with profiling.profile_request() as timer:
+            deadline = time.perf_counter() + 0.2
+            while not timer.samples and time.perf_counter() < deadline:
+                time.sleep(0.01)
+        self.assertTrue(any('test_long_running_requests_are_sampled' in frame
+                            for stack in timer.samples for frame in stack))
+
+
+@override_settings(REQUEST_PHASE_TIMING=True, SLOW_REQUEST_MS=0)
+class RequestPhaseTimingTests(TestCase):
+    def test_api_requests_are_split_into_phases(self):
+        profiling.install()
+        cache.clear()
+        user = User.objects.create_user('timed')
+        self.client.force_login(user)
+        view = 'document-list-create'
+        before = QUERY_COUNT.samples()
+        self.assertEqual(self.client.get(reverse(view)).status_code, 200)
+        phases = {labels[1] for labels in PHASE_LATENCY._values if labels[0] == view}
+        self.assertEqual(phases, set(profiling.PHASES))
+        self.assertNotEqual(QUERY_COUNT.samples(), before)
+
+
+class FixedKeyThrottle(SlidingWindowRateThrottle):
+    rate = '10/min'
+
+    def get_cache_key(self, request, view):
+        return 'throttle_test'
+
+
+class SlidingWindowTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        self.now = 0.0
+
+    def allow(self):
+        throttle = FixedKeyThrottle()
+        throttle.timer = lambda: self.now
+        request = mock.Mock(spec=['method'])
+        return throttle.allow_request(request, None), request.ratelimit
+
+    def test_limit_within_a_window(self):
+        self.now = 30.0
+        states = [self.allow() for _ in range(11)]
+        self.assertEqual([allowed for allowed, _ in states], [True] * 10 + [False])
+        self.assertEqual([state['remaining'] for _, state in states[:3]], [9, 8, 7])
+        self.assertEqual(states[-1][1], {'limit': 10, 'remaining': 0, 'reset': 30, 'window': 60})
+
+    def test_previous_window_is_weighted_by_overlap(self):
+        self.now = 30.0
+        for _ in range(10):
+            self.allow()
+        # Half-way through the next window the previous one counts for 5.
+        self.now = 90.0
+        self.assertEqual([self.allow()[0] for _ in range(6)], [True] * 5 + [False])
+        # A window later only the 5 new requests are left, at a quarter weight.
+        self.now = 165.0
+        allowed, state = self.allow()
+        self.assertTrue(allowed)
+        self.assertEqual(state['remaining'], 10 - 2 - 1)
+
+    def test_counters_are_shared_through_the_cache(self):
+        self.now = 30.0
+        for _ in range(10):
+            self.allow()
+        self.assertEqual(cache.get('throttle_test:0'), 10)
+        # Another worker reading the same cache sees the spent window.
+        other = FixedKeyThrottle()
+        other.timer = lambda: 45.0
+        self.assertFalse(other.allow_request(mock.Mock(spec=['method']), None))
+
+
+class RateLimitHeaderTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.url = reverse('document-list-create')
+
+    def test_headers_follow_the_most_restrictive_throttle(self):
+        with mock.patch.dict(SimpleRateThrottle.THROTTLE_RATES, {'anon': '3/minute', 'user': '100/minute'}):
+            responses = [self.client.get(self.url) for _ in range(4)]
+        self.assertEqual([response.status_code for response in responses], [200, 200, 200, 429])
+        self.assertEqual([response['RateLimit-Remaining'] for response in responses], ['2', '1', '0', '0'])
+        self.assertEqual(responses[0]['RateLimit-Limit'], '3')
+        self.assertEqual(responses[0]['RateLimit-Policy'], '3;w=60')
+        self.assertIn('Retry-After', responses[-1])
+        self.assertLessEqual(int(responses[0]['RateLimit-Reset']), 60)
+
+    def test_search_and_write_limits_apply_only_to_their_requests(self):
+        self.client.force_login(User.objects.create_user('searcher'))
+        with mock.patch.dict(SimpleRateThrottle.THROTTLE_RATES, {'search': '1/minute', 'writes': '1/minute'}):
+            self.assertEqual(self.client.get(self.url, {'search': 'x'}).status_code, 200)
+            self.assertEqual(self.client.get(self.url, {'search': 'x'}).status_code, 429)
+            self.assertEqual(self.client.get(self.url).status_code, 200)
+            data = {'title': 'Throttled', 'content': '<p>x</p>'}
+            self.assertEqual(self.client.post(self.url, data, content_type='application/json').status_code, 201)
+            data['title'] = 'Throttled again'
+            self.assertEqual(self.client.post(self.url, data, content_type='application/json').status_code, 429)
+
+    def test_unthrottled_responses_have_no_headers(self):
+        self.assertNotIn('RateLimit-Limit', self.client.get(reverse('health-live')))
+
+
+class SharedCacheCheckTests(SimpleTestCase):
+    def test_process_local_cache_is_reported(self):
+        with override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}):
+            self.assertEqual([error.id for error in check_shared_cache(None)], ['penpal.W001'])
+        redis = {'default': {'BACKEND': 'django.core.cache.backends.redis.RedisCache', 'LOCATION': 'redis://redis:6379/0'}}
+        with override_settings(CACHES=redis):
+            self.assertEqual(check_shared_cache(None), [])
+
+    def test_redis_client_is_installed(self):
+        # Builds the client (importing ``redis``) without connecting.
+        client = RedisCache('redis://localhost:6379/0', {})._cache
+        self.assertEqual(client._client.__module__.split('.')[0], 'redis')
+
+
+class NegotiationTests(SimpleTestCase):
+    def test_brotli_is_preferred(self):
+        self.assertEqual(compression.available_encodings()[0], 'br')
+        self.assertEqual(compression.negotiate('gzip, deflate, br'), 'br')
+        self.assertEqual(compression.negotiate('*'), 'br')
+
+    def test_client_quality_wins(self):
+        self.assertEqual(compression.negotiate('br;q=0.5, gzip'), 'gzip')
+        self.assertNotEqual(compression.negotiate('*, br;q=0'), 'br')
+
+    def test_nothing_acceptable(self):
+        for header in ('', 'identity', 'deflate', 'gzip;q=0', 'gzip;q=oops'):
+            self.assertIsNone(compression.negotiate(header), header)
+
+
+@override_settings(COMPRESSION_MIN_SIZE=100)
+class CompressionMiddlewareTests(SimpleTestCase):
+    body = json.dumps([{'title': f'Document {i}', 'body': 'text ' * 20} for i in range(20)]).encode()
+
+    def setUp(self):
+        cache.clear()
+
+    def process(self, response, accept='br'):
+        request = RequestFactory().get('/', HTTP_ACCEPT_ENCODING=accept)
+        middleware = compression.CompressionMiddleware(lambda request: response)
+        return middleware(request)
+
+    def test_each_encoding_round_trips(self):
+        decoders = {'br': brotli.decompress, 'gzip': gzip.decompress}
+        if 'zstd' in compression.available_encodings():
+            decoders['zstd'] = compression.zstd.decompress
+        for encoding, decode in decoders.items():
+            response = self.process(HttpResponse(self.body, content_type='application/json'), encoding)
+            self.assertEqual(response['Content-Encoding'], encoding)
+            self.assertEqual(response['Vary'], 'Accept-Encoding')
+            self.assertEqual(int(response['Content-Length']), len(response.content))
+            self.assertEqual(decode(response.content), self.body)
+
+    def test_small_bodies_are_sent_as_is(self):
+        response = self.process(HttpResponse(b'{"ok":true}', content_type='application/json'))
+        self.assertFalse(response.has_header('Content-Encoding'))
+        self.assertFalse(response.has_header('Vary'))
+
+    def test_uncompressible_responses_are_left_alone(self):
+        for response in (HttpResponse(self.body, content_type='image/png'),
+                         HttpResponse(self.body, content_type='application/json', headers={'Cache-Control': 'no-transform'})):
+            self.assertFalse(self.process(response).has_header('Content-Encoding'))
+
+    def test_event_streams_are_not_compressed(self):
+        chunks = [b'event: update\ndata: {}\n\n'] * 50
+        response = self.process(StreamingHttpResponse(iter(chunks), content_type='text/event-stream'))
+        self.assertFalse(response.has_header('Content-Encoding'))
+        self.assertEqual(list(response.streaming_content), chunks)
+
+    def test_other_streams_are_compressed_chunk_by_chunk(self):
+        chunks = [b'line %d\n' % i for i in range(100)]
+        response = self.process(StreamingHttpResponse(iter(chunks), content_type='text/csv'), 'gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertFalse(response.has_header('Content-Length'))
+        self.assertEqual(gzip.decompress(b''.join(response.streaming_content)), b''.join(chunks))
+
+    def test_bodies_with_an_etag_are_compressed_once(self):
+        with mock.patch('penpal.compression.compress_body', wraps=compression.compress_body) as compress:
+            for _ in range(3):
+                response = self.process(HttpResponse(self.body, content_type='application/json', headers={'ETag': '"v1"'}))
+                self.assertEqual(response['ETag'], '"v1-br"')
+        self.assertEqual(compress.call_count, 1)
+
+
+@override_settings(COMPRESSION_MIN_SIZE=0)
+class CompressedValidatorTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('compressed')
+        self.client.force_login(self.user)
+        self.document = Document.objects.create(author=self.user, title='Compressed', content='<p>body</p>')
+
+    def test_suffixed_etag_revalidates_the_list(self):
+        url = reverse('document-list-create')
+        response = self.client.get(url, HTTP_ACCEPT_ENCODING='br')
+        self.assertEqual(response['Content-Encoding'], 'br')
+        etag = response['ETag']
+        self.assertTrue(etag.endswith('-br"'), etag)
+        self.assertEqual(json.loads(brotli.decompress(response.content))['count'], 1)
+
+        response = self.client.get(url, HTTP_ACCEPT_ENCODING='br', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+        # Another encoding of the same representation is still fresh.
+        response = self.client.get(url, HTTP_ACCEPT_ENCODING='gzip', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+
+    def test_suffixed_etag_satisfies_if_match(self):
+        url = reverse('document-retrieve-update-destroy', args=[self.document.pk])
+        etag = self.client.get(url, HTTP_ACCEPT_ENCODING='gzip')['ETag']
+        self.assertTrue(etag.endswith('-gzip"'), etag)
+        response = self.client.patch(url, {'title': 'Renamed'}, content_type='application/json', HTTP_IF_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        response = self.client.patch(url, {'title': 'Renamed again'}, content_type='application/json', HTTP_IF_MATCH=etag)
+        self.assertEqual(response.status_code, 412)
+
+
+class SchemaArtifactTests(TestCase):
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        self.directory = Path(directory)
+        overrides = override_settings(SCHEMA_ARTIFACT_DIR=directory, CODE_VERSION='release-1')
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+        # A stand-in build that shows which code version it was made for;
+        # SchemaBuildTests builds the real one.
+        fake_build = mock.patch.object(
+            schema, 'build_schema', side_effect=lambda: json.dumps({'code': settings.CODE_VERSION}).encode(),
+        )
+        for patcher in (mock.patch.object(schema, '_loaded', None), fake_build):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def generate(self, **options):
+        out = io.StringIO()
+        call_command('generate_schema', stdout=out, **options)
+        return out.getvalue()
+
+    def test_generate_schema_builds_once_per_version(self):
+        self.assertIn('Built schema', self.generate())
+        self.assertIn('is up to date', self.generate())
+        self.assertIn('Built schema', self.generate(force=True))
+        self.assertEqual(schema.build_schema.call_count, 2)
+        with override_settings(CODE_VERSION='release-2'):
+            self.assertIn('Built schema', self.generate())
+        self.assertEqual(len(list(self.directory.glob('openapi-*.json'))), 2)
+
+    def test_old_artifacts_are_pruned(self):
+        for release in range(schema.ARTIFACTS_KEPT + 2):
+            with override_settings(CODE_VERSION=f'release-{release}'):
+                self.generate()
+        self.assertEqual(len(list(self.directory.glob('openapi-*.json'))), schema.ARTIFACTS_KEPT)
+
+    def test_version_follows_the_url_configuration(self):
+        version = schema.schema_version()
+        self.assertEqual(schema.schema_version(), version)
+        with mock.patch.object(schema, 'urlconf_fingerprint', return_value=['api/extra/ some.View']):
+            self.assertNotEqual(schema.schema_version(), version)
+
+    def test_schema_revalidates_with_its_etag(self):
+        response = self.client.get(reverse('schema-json'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(json.loads(response.content), {'code': 'release-1'})
+        version = schema.schema_version()
+        self.assertEqual(response['ETag'], f'"{version}"')
+        self.assertEqual(response['Content-Location'], reverse('schema-json-versioned', args=[version]))
+        self.assertIn(f'max-age={settings.SCHEMA_CACHE_SECONDS}', response['Cache-Control'])
+
+        response = self.client.get(reverse('schema-json'), HTTP_IF_NONE_MATCH=f'"{version}"')
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b'')
+        self.assertEqual(schema.build_schema.call_count, 1)
+
+    def test_versioned_schema_is_immutable_and_old_versions_redirect(self):
+        version = schema.load_schema()[0]
+        response = self.client.get(reverse('schema-json-versioned', args=[version]))
+        self.assertIn('immutable', response['Cache-Control'])
+        response = self.client.get(reverse('schema-json-versioned', args=['0' * 16]))
+        self.assertRedirects(response, reverse('schema-json-versioned', args=[version]),
+                             fetch_redirect_response=False)
+
+    def test_new_code_version_is_served_after_a_restart(self):
+        first = self.client.get(reverse('schema-json'))['ETag']
+        with override_settings(CODE_VERSION='release-2'), mock.patch.object(schema, '_loaded', None):
+            response = self.client.get(reverse('schema-json'), HTTP_IF_NONE_MATCH=first)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(json.loads(response.content), {'code': 'release-2'})
+
+    def test_ui_schema_requests_use_the_artifact(self):
+        response = self.client.get(reverse('schema-swagger-ui'), {'format': 'openapi'})
+        self.assertEqual(json.loads(response.content), {'code': 'release-1'})
+        self.assertEqual(schema.build_schema.call_count, 1)
+
+    def test_command_skips_when_docs_are_disabled(self):
+        with override_settings(API_DOCS_ENABLED=False):
+            self.assertIn('API_DOCS_ENABLED is off', self.generate())
+        self.assertEqual(list(self.directory.iterdir()), [])
+
+
+class SchemaBuildTests(SimpleTestCase):
+    def test_built_schema_documents_the_api(self):
+        document = json.loads(schema.build_schema())
+        self.assertEqual(document['info']['title'], 'Penpal API')
+        self.assertNotIn('host', document)
+        self.assertEqual(document['basePath'], '/api')
+        self.assertIn('/documents/docs/', document['paths'])
+
+
+# Loads the project in a fresh interpreter, as bench_startup does, and
+# reports what startup imported and routed.
+STARTUP_PROBE = r'''
+import json, sys
+import django
+django.setup()
+from django.apps import apps
+from django.core.handlers.wsgi import WSGIHandler
+from django.urls import get_resolver
+WSGIHandler()
+print(json.dumps({
+    'apps': [config.name for config in apps.get_app_configs()],
+    'modules': sorted(sys.modules),
+    'routes': [str(pattern.pattern) for pattern in get_resolver().url_patterns],
+}))
+'''
+
+
+class OptionalComponentStartupTests(SimpleTestCase):
+    def start(self, enabled):
+        env = {**os.environ, 'ADMIN_ENABLED': str(enabled), 'API_DOCS_ENABLED': str(enabled)}
+        completed = subprocess.run([sys.executable, '-c', STARTUP_PROBE], cwd=settings.BASE_DIR, env=env,
+                                   capture_output=True, text=True, check=True)
+        return json.loads(completed.stdout.strip().splitlines()[-1])
+
+    def test_disabled_components_stay_out_of_startup(self):
+        started = self.start(False)
+        self.assertNotIn('django.contrib.admin', started['apps'])
+        self.assertNotIn('drf_yasg', started['apps'])
+        for module in ('drf_yasg', 'penpal.schema', 'document.admin', 'tasks.admin', 'audit_log.admin'):
+            self.assertNotIn(module, started['modules'])
+        optional = [route for route in started['routes'] if route.startswith(('admin/', 'api/swagger', 'api/redoc'))]
+        self.assertEqual(optional, [])
+
+    def test_enabled_docs_defer_schema_generation_to_the_first_request(self):
+        started = self.start(True)
+        self.assertIn('django.contrib.admin', started['apps'])
+        self.assertIn('document.admin', started['modules'])
+        self.assertIn('drf_yasg', started['apps'])
+        for module in ('drf_yasg.generators', 'drf_yasg.openapi', 'drf_yasg.views', 'drf_yasg.codecs'):
+            self.assertNotIn(module, started['modules'])
+        self.assertIn('admin/', started['routes'])
+        self.assertIn('api/swagger.json/', started['routes'])
+
+
+class BenchStartupTests(SimpleTestCase):
+    def test_importtime_rows_skip_the_header_and_packages(self):
+        stderr = (
+            'import time: self [us] | cumulative | imported package\n'
+            'import time:       120 |        340 |   yaml.reader\n'
+            'not an import line\n'
+            'import time:      2000 |       5000 | drf_yasg\n'
+        )
+        self.assertEqual(bench_startup.parse_importtime(stderr), [('yaml.reader', 120, 340), ('drf_yasg', 2000, 5000)])
+
+    def test_reports_each_phase_with_overrides(self):
+        out = io.StringIO()
+        call_command('bench_startup', repeat=1, imports=0, json=True,
+                     set=['ADMIN_ENABLED=False', 'API_DOCS_ENABLED=False'], stdout=out)
+        result = json.loads(out.getvalue())
+        self.assertEqual(result['overrides'], ['ADMIN_ENABLED=False', 'API_DOCS_ENABLED=False'])
+        self.assertEqual(set(result['median_ms']), {*bench_startup.PHASES, 'process'})
+        self.assertTrue(all(value >= 0 for value in result['median_ms'].values()))
+
+    def test_overrides_must_be_assignments(self):
+        with self.assertRaisesMessage(CommandError, '--set expects NAME=VALUE'):
+            call_command('bench_startup', repeat=1, imports=0, set=['ADMIN_ENABLED'], stdout=io.StringIO())
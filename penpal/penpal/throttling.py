@@ -0,0 +1,172 @@
+"""
+Throttling for the Penpal API.
+
+DRF's stock throttles keep a list of request timestamps per key, so memory and
+CPU grow with the configured rate. The throttles here use a sliding-window
+counter instead: two integer counters per key (current and previous window),
+weighted by how far we are into the current window. Counters live in the
+default cache, so with a shared backend (Redis, set via ``REDIS_URL``) limits
+hold across processes and containers.
+
+Every throttle that runs records its state on the request, and
+``RateLimitHeadersMiddleware`` turns the most restrictive one into standard
+``RateLimit-*`` response headers.
+"""
+import math
+
+from rest_framework import throttling
+from rest_framework.filters import SearchFilter
+from rest_framework.permissions import SAFE_METHODS
+
+
+RATELIMIT_ATTR = 'ratelimit'
+
+
+class SlidingWindowRateThrottle(throttling.SimpleRateThrottle):
+    """
+    Fixed-memory sliding-window counter.
+
+    The estimated request count is ``previous * (1 - elapsed / window) + current``,
+    which approximates a true sliding log without storing per-request history.
+    """
+
+    def allow_request(self, request, view):
+        if self.rate is None:
+            return True
+
+        self.key = self.get_cache_key(request, view)
+        if self.key is None:
+            return True
+
+        self.now = self.timer()
+        window = int(self.now // self.duration)
+        self.elapsed = self.now - window * self.duration
+        current_key = f'{self.key}:{window}'
+        previous_key = f'{self.key}:{window - 1}'
+
+        counts = self.cache.get_many([current_key, previous_key])
+        self.previous = counts.get(previous_key, 0)
+        self.current = counts.get(current_key, 0)
+
+        if self.estimate() >= self.num_requests:
+            self.record(request)
+            return self.throttle_failure()
+
+        self.current = self.increment(current_key)
+        self.record(request)
+        return self.throttle_success()
+
+    def throttle_success(self):
+        return True
+
+    def estimate(self):
+        weight = 1 - self.elapsed / self.duration
+        return self.previous * weight + self.current
+
+    def increment(self, key):
+        # Counters must outlive their own window so they can be read back as
+        # the "previous" window.
+        timeout = self.duration * 2
+        if self.cache.add(key, 1, timeout):
+            return 1
+        try:
+            return self.cache.incr(key)
+        except ValueError:
+            # Expired between add() and incr().
+            self.cache.set(key, 1, timeout)
+            return 1
+
+    def remaining(self):
+        return max(0, self.num_requests - math.ceil(self.estimate()))
+
+    def reset(self):
+        """
+        Seconds until the current window rolls over.
+        """
+        return max(1, math.ceil(self.duration - self.elapsed))
+
+    def wait(self):
+        """
+        Seconds until the weighted estimate drops below the limit.
+        """
+        if self.current >= self.num_requests or not self.previous:
+            return self.duration - self.elapsed
+        available = (self.num_requests - self.current) / self.previous
+        return max(0.0, self.duration * (1 - available) - self.elapsed)
+
+    def record(self, request):
+        """
+        Keep the most restrictive throttle state on the underlying HttpRequest.
+        """
+        http_request = getattr(request, '_request', request)
+        state = {
+            'limit': self.num_requests,
+            'remaining': self.remaining(),
+            'reset': self.reset(),
+            'window': self.duration,
+        }
+        existing = getattr(http_request, RATELIMIT_ATTR, None)
+        if existing is None or state['remaining'] < existing['remaining']:
+            setattr(http_request, RATELIMIT_ATTR, state)
+
+
+class AnonRateThrottle(SlidingWindowRateThrottle, throttling.AnonRateThrottle):
+    """
+    Limits anonymous callers by IP address.
+    """
+
+
+class UserRateThrottle(SlidingWindowRateThrottle, throttling.UserRateThrottle):
+    """
+    Limits authenticated callers by user id (falls back to IP address).
+    """
+
+
+class ScopedRateThrottle(throttling.ScopedRateThrottle, SlidingWindowRateThrottle):
+    """
+    Applies the rate named by a view's ``throttle_scope`` (e.g. ``login``).
+    """
+
+
+class SearchRateThrottle(UserRateThrottle):
+    """
+    Extra limit on full-text search requests (``?search=``).
+    """
+    scope = 'search'
+
+    def get_cache_key(self, request, view):
+        if not request.query_params.get(SearchFilter.search_param):
+            return None
+        return super().get_cache_key(request, view)
+
+
+class WriteRateThrottle(UserRateThrottle):
+    """
+    Extra limit on unsafe methods (POST, PUT, PATCH, DELETE).
+    """
+    scope = 'writes'
+
+    def get_cache_key(self, request, view):
+        if request.method in SAFE_METHODS:
+            return None
+        return super().get_cache_key(request, view)
+
+
+class RateLimitHeadersMiddleware:
+    """
+    Emit ``RateLimit-Limit``, ``RateLimit-Remaining``, ``RateLimit-Reset`` and
+    ``RateLimit-Policy`` for requests that passed through a throttle.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        state = getattr(request, RATELIMIT_ATTR, None)
+        if state is not None:
+            response['RateLimit-Limit'] = str(state['limit'])
+            response['RateLimit-Remaining'] = str(state['remaining'])
+            response['RateLimit-Reset'] = str(state['reset'])
+            response['RateLimit-Policy'] = f"{state['limit']};w={state['window']}"
+        return response
@@ -14,45 +14,35 @@ Including another URLconf
     1. Import the include() function: from django.urls import include, path
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
-from django.contrib import admin
 from django.urls import path, include
 from django.conf import settings
-from django.conf.urls.static import static
 
-from drf_yasg import openapi
-from drf_yasg.views import get_schema_view
-from rest_framework import permissions
-from .health_check import health_check
+from .health_check import health_check, liveness, readiness_check
+from .metrics import metrics, slow_requests
+from .schema import schema_json, ui_view, versioned_schema_json
 
 
-# Swagger schema view
-schema_view = get_schema_view(
-    openapi.Info(
-        title="Penpal API",
-        default_version="v1",
-        description="API documentation for Penpal Backend",
-        terms_of_service="https://www.penpal.com/terms/",
-        contact=openapi.Contact(email="support@penpal.com"),
-        license=openapi.License(name="BSD License"),
-    ),
-    public=True,
-    permission_classes=[permissions.AllowAny],
-)
-
-# Optional: for SWAGGER_SETTINGS["DEFAULT_INFO"]
-api_info = openapi.Info(
-    title="Penpal API",
-    default_version="v1",
-    description="Core API endpoints for Penpal",
-)
 urlpatterns = [
-    path('admin/', admin.site.urls),
     path('api/health/', health_check, name='health-check'),
-    path('api/swagger/', schema_view.with_ui("swagger", cache_timeout=0), name="schema-swagger-ui"),
-    path('api/redoc/', schema_view.with_ui("redoc", cache_timeout=0), name="schema-redoc"),
-    path('api/swagger.json/', schema_view.without_ui(cache_timeout=0), name="schema-json"),
+    path('api/health/live/', liveness, name='health-live'),
+    path('api/health/ready/', readiness_check, name='health-ready'),
+    path('api/metrics/', metrics, name='metrics'),
+    path('api/metrics/slow-requests/', slow_requests, name='metrics-slow-requests'),
     path('api/users/', include("accounts.urls")),
     path('api/documents/', include("document.urls"))
 ]
 
+# Optional components, off in production by setting ADMIN_ENABLED /
+# API_DOCS_ENABLED to False; the admin is only imported when enabled.
+if settings.ADMIN_ENABLED:
+    from django.contrib import admin
+
+    urlpatterns.insert(0, path('admin/', admin.site.urls))
 
+if settings.API_DOCS_ENABLED:
+    urlpatterns += [
+        path('api/swagger/', ui_view("swagger"), name="schema-swagger-ui"),
+        path('api/redoc/', ui_view("redoc"), name="schema-redoc"),
+        path('api/swagger.json/', schema_json, name="schema-json"),
+        path('api/swagger/<str:version>.json', versioned_schema_json, name="schema-json-versioned"),
+    ]
@@ -0,0 +1,11 @@
+from django.contrib import admin
+
+from .models import Task
+
+
+@admin.register(Task)
+class TaskAdmin(admin.ModelAdmin):
+    list_display = ('id', 'name', 'status', 'priority', 'attempts', 'run_after', 'locked_by')
+    list_filter = ('status', 'name')
+    search_fields = ('name', 'dedup_key')
+    ordering = ('-priority', 'run_after')
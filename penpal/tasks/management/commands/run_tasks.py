@@ -0,0 +1,114 @@
+import os
+import signal
+import socket
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+
+import django
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from tasks.queue import claim, complete, execute, fail, reclaim_expired, registry, split_failed
+
+
+def init_process():
+    # Ctrl-C reaches the whole process group; only the parent handles it.
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    # Pool processes may be spawned rather than forked; load Django either way.
+    django.setup()
+
+
+class Command(BaseCommand):
+    help = (
+        "Run queued tasks in a pool of worker processes until stopped "
+        "(SIGINT/SIGTERM finish the running tasks first)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--processes', type=int, default=settings.TASK_WORKER_PROCESSES,
+            help="Pool processes, i.e. tasks or batches run at once.",
+        )
+        parser.add_argument(
+            '--poll-interval', type=float, default=settings.TASK_POLL_INTERVAL,
+            help="Seconds to sleep when the queue is empty.",
+        )
+        parser.add_argument('--once', action='store_true', help="Exit once no task is due.")
+
+    def handle(self, *args, **options):
+        processes = options['processes']
+        worker = f'{socket.gethostname()}:{os.getpid()}'
+        self.stopping = self.broken = False
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+
+        self.stdout.write(f"Worker {worker}: {processes} processes, {len(registry)} task types")
+        # Forked pool processes must not share the parent's connections.
+        connections.close_all()
+        running = {}
+        next_reclaim = 0
+        with ProcessPoolExecutor(processes, initializer=init_process) as pool:
+            while not self.stopping:
+                if time.monotonic() >= next_reclaim:
+                    reclaim_expired()
+                    next_reclaim = time.monotonic() + settings.TASK_LEASE_SECONDS / 4
+
+                for batch in self.claim_batches(worker, processes - len(running)):
+                    calls = [(task.args, task.kwargs) for task in batch]
+                    try:
+                        running[pool.submit(execute, batch[0].name, calls)] = batch
+                    except BrokenProcessPool as e:
+                        fail(batch, f'{type(e).__name__}: {e}')
+                        self.broken = self.stopping = True
+
+                if not running:
+                    if options['once']:
+                        break
+                    time.sleep(options['poll_interval'])
+                    continue
+                done, _ = wait(running, timeout=options['poll_interval'], return_when=FIRST_COMPLETED)
+                for future in done:
+                    self.finish(running.pop(future), future)
+
+            for future in wait(running).done:
+                self.finish(running.pop(future), future)
+        if self.broken:
+            # Exit non-zero so the supervisor starts a fresh worker.
+            raise CommandError("A pool process died unexpectedly; restart the worker.")
+
+    def stop(self, signum, frame):
+        self.stdout.write("Stopping after the running tasks finish...")
+        self.stopping = True
+
+    def claim_batches(self, worker, slots):
+        """
+        Claim up to ``slots`` units of work; a batch task's unit is topped up
+        with more queued items of the same task.
+        """
+        if slots <= 0:
+            return []
+        batches = []
+        for task in claim(worker, slots):
+            handler = registry.get(task.name)
+            batch = [task]
+            if handler is not None and handler.batch_size and handler.batch_size > 1:
+                batch += claim(worker, handler.batch_size - 1, name=task.name)
+            batches.append(batch)
+        return batches
+
+    def finish(self, batch, future):
+        try:
+            result = future.result()
+        except Exception as e:
+            # The pool process died (e.g. killed for memory); retry the work.
+            result = f'{type(e).__name__}: {e}', None
+            self.broken = self.stopping = isinstance(e, BrokenProcessPool)
+        if result is None:
+            complete(batch)
+            return
+        error, items = result
+        succeeded, failed = split_failed(batch, items)
+        complete(succeeded)
+        fail(failed, error)
@@ -0,0 +1,59 @@
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import models
+from django.utils import timezone
+
+
+class Task(models.Model):
+    """
+    One queued call of a registered task handler; see tasks/queue.py.
+
+    Rows are deleted when their task succeeds, so the table only holds
+    pending, running and failed work.
+    """
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    FAILED = 'failed'
+
+    name = models.CharField(max_length=100)
+    args = models.JSONField(default=list, blank=True, encoder=DjangoJSONEncoder)
+    kwargs = models.JSONField(default=dict, blank=True, encoder=DjangoJSONEncoder)
+    priority = models.SmallIntegerField(default=0, help_text="Higher runs first.")
+    status = models.CharField(
+        max_length=10,
+        choices=[
+            (QUEUED, 'Queued'),
+            (RUNNING, 'Running'),
+            (FAILED, 'Failed'),
+        ],
+        default=QUEUED
+    )
+    dedup_key = models.CharField(
+        max_length=200, null=True, blank=True,
+        help_text="At most one queued task per key; enqueueing a duplicate is a no-op.",
+    )
+    attempts = models.PositiveSmallIntegerField(default=0)
+    max_attempts = models.PositiveSmallIntegerField(default=5)
+    run_after = models.DateTimeField(default=timezone.now)
+    locked_by = models.CharField(max_length=100, blank=True)
+    locked_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            # Claim order: highest priority, then oldest due.
+            models.Index(fields=['-priority', 'run_after'], condition=models.Q(status='queued'),
+                         name='tasks_ready_idx'),
+            models.Index(fields=['locked_at'], condition=models.Q(status='running'),
+                         name='tasks_running_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['dedup_key'], condition=models.Q(status='queued'),
+                                    name='tasks_dedup_key_queued_unique'),
+        ]
+        db_table = 'tasks'
+
+    def __str__(self):
+        return f"{self.name} #{self.pk} ({self.status})"
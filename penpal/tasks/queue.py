@@ -0,0 +1,270 @@
+"""
+Database-backed task queue.
+
+Handlers are registered with ``@task`` in an app's ``tasks.py`` (discovered
+when the app registry loads) and queued with ``handler.enqueue(...)``. The
+queued row is written in the caller's transaction, so work enqueued by a
+save that rolls back never runs, and nothing runs before the data it reads
+is committed. ``manage.py run_tasks`` claims queued rows and runs them in a
+process pool.
+
+- Priorities: higher ``priority`` is claimed first; among equals, the task
+  due longest.
+- Retries: a failing task is retried after ``backoff * 2 ** (attempt - 1)``
+  seconds (capped at ``MAX_BACKOFF``, with jitter) until ``max_attempts``,
+  then kept as ``failed`` with its traceback.
+- Deduplication: at most one *queued* task per ``dedup_key``; enqueueing a
+  duplicate is a no-op. A task that is already running does not count, so
+  a change made while it runs is picked up by the next one.
+- Batching: a handler declared with ``batch_size`` takes a single list
+  argument; each ``enqueue(item)`` contributes one item and the worker hands
+  up to ``batch_size`` queued items of that task to one call. A handler that
+  raises ``BatchItemsFailed(items)`` fails only those items' tasks; the rest
+  of the batch completes.
+
+With ``TASKS_ALWAYS_EAGER`` (the default under DEBUG) nothing is queued:
+handlers run in-process once the enqueueing transaction commits.
+
+A task still running after ``TASK_LEASE_SECONDS`` is assumed to belong to a
+dead worker and is queued again, so handlers must be idempotent.
+"""
+import json
+import logging
+import random
+import traceback
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import IntegrityError, close_old_connections, transaction
+from django.db.models import Count, F, Min, Q
+from django.utils import timezone
+
+from .models import Task
+
+
+logger = logging.getLogger('penpal.tasks')
+
+MAX_BACKOFF = 60 * 60
+
+registry = {}
+
+
+class BatchItemsFailed(Exception):
+    """
+    Raised by a batch handler after processing every item, naming the ones
+    that failed.
+    """
+
+    def __init__(self, items, message=''):
+        self.items = list(items)
+        super().__init__(message or f"{len(self.items)} item(s) failed: {self.items}")
+
+
+class TaskHandler:
+    def __init__(self, func, name, priority, max_attempts, backoff, batch_size):
+        self.func = func
+        self.name = name
+        self.priority = priority
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.batch_size = batch_size
+        self.__doc__ = func.__doc__
+
+    def __call__(self, *args, **kwargs):
+        return self.func(*args, **kwargs)
+
+    def __repr__(self):
+        return f'<task {self.name}>'
+
+    def enqueue(self, *args, dedup_key=None, priority=None, delay=None, **kwargs):
+        """
+        Queue a call. ``delay`` (seconds or timedelta) postpones it. Returns the
+        ``Task`` row, or None when run eagerly or deduplicated.
+        """
+        if self.batch_size and (len(args) != 1 or kwargs):
+            raise TypeError(f"Batch task {self.name} is enqueued with exactly one item.")
+        # Handlers always see JSON types, eager or not.
+        args, kwargs = json.loads(json.dumps([args, kwargs], cls=DjangoJSONEncoder))
+
+        if settings.TASKS_ALWAYS_EAGER:
+            transaction.on_commit(lambda: run_eagerly(self, args, kwargs))
+            return None
+
+        if isinstance(delay, (int, float)):
+            delay = timedelta(seconds=delay)
+        fields = {
+            'name': self.name,
+            'args': args,
+            'kwargs': kwargs,
+            'priority': self.priority if priority is None else priority,
+            'max_attempts': self.max_attempts,
+            'run_after': timezone.now() + (delay or timedelta()),
+        }
+        if dedup_key is None:
+            return Task.objects.create(**fields)
+        try:
+            with transaction.atomic():
+                return Task.objects.create(dedup_key=dedup_key, **fields)
+        except IntegrityError:
+            # An identical call is already waiting.
+            return None
+
+
+def task(func=None, *, name=None, priority=0, max_attempts=5, backoff=10, batch_size=None):
+    """
+    Register ``func`` as a task handler. Usable bare (``@task``) or with options.
+    """
+    def register(func):
+        handler = TaskHandler(
+            func, name or f'{func.__module__}.{func.__qualname__}',
+            priority, max_attempts, backoff, batch_size,
+        )
+        registry[handler.name] = handler
+        return handler
+    return register(func) if func is not None else register
+
+
+def call(handler, calls):
+    """
+    Run ``handler`` for a list of ``(args, kwargs)`` calls: one call for a
+    batch task, one call per item otherwise.
+    """
+    if handler.batch_size:
+        handler.func([args[0] for args, _ in calls])
+    else:
+        for args, kwargs in calls:
+            handler.func(*args, **kwargs)
+
+
+def run_eagerly(handler, args, kwargs):
+    try:
+        call(handler, [(args, kwargs)])
+    except Exception:
+        logger.exception("Task %s failed", handler.name)
+
+
+# ---------------------------------------------------------------------------
+# Worker side
+# ---------------------------------------------------------------------------
+
+def claim(worker, limit, name=None):
+    """
+    Mark up to ``limit`` due tasks as running for ``worker`` and return them.
+
+    The conditional UPDATE only takes rows that are still queued, so
+    concurrent workers never claim the same task.
+    """
+    now = timezone.now()
+    ready = Task.objects.filter(status=Task.QUEUED, run_after__lte=now)
+    if name is not None:
+        ready = ready.filter(name=name)
+    ids = list(ready.order_by('-priority', 'run_after', 'pk').values_list('pk', flat=True)[:limit])
+    if not ids:
+        return []
+    token = f'{worker}/{uuid.uuid4().hex[:8]}'
+    Task.objects.filter(pk__in=ids, status=Task.QUEUED).update(
+        status=Task.RUNNING, locked_by=token, locked_at=now, attempts=F('attempts') + 1,
+    )
+    return list(Task.objects.filter(pk__in=ids, locked_by=token).order_by('-priority', 'run_after', 'pk'))
+
+
+def requeue(task, **fields):
+    """
+    Put ``task`` back in the queue; dropped if an identical task is already queued.
+    """
+    try:
+        with transaction.atomic():
+            Task.objects.filter(pk=task.pk).update(status=Task.QUEUED, locked_by='', locked_at=None, **fields)
+    except IntegrityError:
+        Task.objects.filter(pk=task.pk).delete()
+
+
+def reclaim_expired():
+    """
+    Requeue tasks whose worker has held them longer than TASK_LEASE_SECONDS.
+    """
+    cutoff = timezone.now() - timedelta(seconds=settings.TASK_LEASE_SECONDS)
+    expired = list(Task.objects.filter(status=Task.RUNNING, locked_at__lt=cutoff))
+    for task in expired:
+        logger.warning("Task %s #%s lease expired (worker %s); requeueing", task.name, task.pk, task.locked_by)
+        requeue(task, last_error=f'Lease expired on {task.locked_by}')
+    return len(expired)
+
+
+def complete(tasks):
+    Task.objects.filter(pk__in=[task.pk for task in tasks]).delete()
+
+
+def retry_delay(backoff, attempts):
+    delay = min(backoff * 2 ** (attempts - 1), MAX_BACKOFF)
+    return timedelta(seconds=delay * random.uniform(0.8, 1.2))
+
+
+def fail(tasks, error):
+    """
+    Schedule a retry for each task, or mark it failed when out of attempts.
+    """
+    now = timezone.now()
+    for task in tasks:
+        handler = registry.get(task.name)
+        if handler is None or task.attempts >= task.max_attempts:
+            Task.objects.filter(pk=task.pk).update(
+                status=Task.FAILED, locked_by='', locked_at=None, last_error=error,
+            )
+            logger.error("Task %s #%s failed after %d attempts:\n%s", task.name, task.pk, task.attempts, error)
+        else:
+            requeue(task, last_error=error, run_after=now + retry_delay(handler.backoff, task.attempts))
+            logger.warning("Task %s #%s failed (attempt %d); retrying", task.name, task.pk, task.attempts)
+
+
+def split_failed(batch, items):
+    """
+    Split a claimed batch into ``(succeeded, failed)`` tasks; ``items`` are
+    the failed batch items, or None when the whole batch failed.
+    """
+    if items is None:
+        return [], batch
+    keys = {json.dumps(item, sort_keys=True) for item in items}
+    failed = [task for task in batch if json.dumps(task.args[0], sort_keys=True) in keys]
+    return [task for task in batch if task not in failed], failed
+
+
+def execute(name, calls):
+    """
+    Run one claimed task or batch in a pool process. Returns None on success,
+    or ``(traceback, items)`` where ``items`` are the failed batch items (None
+    when all of the work failed).
+    """
+    close_old_connections()
+    try:
+        handler = registry.get(name)
+        if handler is None:
+            raise LookupError(f"No task handler registered as {name!r}.")
+        call(handler, calls)
+    except BatchItemsFailed as e:
+        return traceback.format_exc(), e.items
+    except Exception:
+        return traceback.format_exc(), None
+    finally:
+        close_old_connections()
+    return None
+
+
+def queue_stats():
+    """
+    Queue depth for the readiness check: due, scheduled, running and failed
+    tasks, and how long the oldest due task has waited.
+    """
+    now = timezone.now()
+    row = Task.objects.aggregate(
+        ready=Count('pk', filter=Q(status=Task.QUEUED, run_after__lte=now)),
+        scheduled=Count('pk', filter=Q(status=Task.QUEUED, run_after__gt=now)),
+        running=Count('pk', filter=Q(status=Task.RUNNING)),
+        failed=Count('pk', filter=Q(status=Task.FAILED)),
+        oldest=Min('run_after', filter=Q(status=Task.QUEUED, run_after__lte=now)),
+    )
+    oldest = row.pop('oldest')
+    row['oldest_ready_seconds'] = round((now - oldest).total_seconds(), 1) if oldest else 0
+    return row